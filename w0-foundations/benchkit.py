@@ -0,0 +1,98 @@
+"""
+Benchmark kit shared by the workshop demos.
+
+- time_it():   the one timing helper for demo output (replaces the copies
+               that used to live in each script). perf_counter_ns based,
+               reports wall and CPU time.
+- @scenario:   marks a zero-argument demo function as a benchmark scenario
+               that `benchmark.py` can discover, warm up and repeat.
+- measure():   run a callable once and return wall / CPU nanoseconds,
+               including CPU used by child processes (process pools).
+
+Demo scripts import it with their chapter-relative path, e.g.:
+
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+    from benchkit import scenario, time_it
+"""
+import os
+import time
+from typing import Any, NamedTuple
+
+try:
+    import psutil
+except ImportError:  # CPU time of live pool workers is then not counted
+    psutil = None
+
+# Scenarios registered by @scenario, keyed by "<module>::<name>"
+SCENARIOS = {}
+
+
+class Timing(NamedTuple):
+    elapsed: float   # wall seconds
+    cpu: float       # CPU seconds (this process + children)
+    result: Any      # return value of the timed function
+
+
+# =============================================================================
+# Measurement
+# =============================================================================
+def tree_cpu_ns():
+    """CPU ns used so far by this process, its live children and reaped children."""
+    total = time.process_time_ns()
+    times = os.times()
+    total += int((times.children_user + times.children_system) * 1e9)
+    if psutil is not None:
+        for child in psutil.Process().children(recursive=True):
+            try:
+                cpu = child.cpu_times()
+                total += int((cpu.user + cpu.system) * 1e9)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+    return total
+
+
+def measure(func, *args, **kwargs):
+    """
+    Run func once.
+
+    Returns:
+        tuple: (wall_ns, cpu_ns, result)
+    """
+    cpu_start = tree_cpu_ns()
+    start = time.perf_counter_ns()
+    result = func(*args, **kwargs)
+    wall_ns = time.perf_counter_ns() - start
+    return wall_ns, max(0, tree_cpu_ns() - cpu_start), result
+
+
+def time_it(title, func_to_run, *args):
+    """Helper function to time and print the execution of a function."""
+    print(f"--- {title} ---")
+    wall_ns, cpu_ns, result = measure(func_to_run, *args)
+    elapsed = wall_ns / 1e9
+    print(f"Time: {elapsed:.4f} seconds (CPU {cpu_ns / 1e9:.4f}s)\n")
+    return Timing(elapsed, cpu_ns / 1e9, result)
+
+
+# =============================================================================
+# Scenario registry
+# =============================================================================
+def scenario(name=None, setup=None, teardown=None, warmup=1, repeat=3):
+    """
+    Register a demo function as a benchmark scenario.
+
+    Args:
+        name: Scenario name (default: function name)
+        setup: Optional untimed callable; its return value (a tuple) is
+               passed as the function's arguments
+        teardown: Optional untimed callable, called with the same arguments
+                  after the last run
+        warmup: Untimed runs before measuring
+        repeat: Timed runs
+    """
+    def decorator(func):
+        key = f"{func.__module__}::{name or func.__name__}"
+        SCENARIOS[key] = {'name': name or func.__name__, 'func': func, 'setup': setup,
+                          'teardown': teardown, 'warmup': warmup, 'repeat': repeat}
+        return func
+    return decorator
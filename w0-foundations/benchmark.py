@@ -0,0 +1,348 @@
+"""
+Benchmark Harness: every demo scenario, repeatable, comparable across releases
+
+Finds the functions marked with `@benchkit.scenario` in every script under
+w0-foundations (by parsing the source, nothing is imported up front) and runs
+each one in a fresh interpreter, so peak RSS belongs to that scenario only:
+
+- warmup runs (untimed), then repeat runs timed with perf_counter_ns
+- wall time, CPU time (process + children) and peak memory per scenario,
+  kept as two metrics: peak RSS (this process or its largest reaped child)
+  and peak PSS of the process tree sampled by MemorySampler, so live pool
+  workers count too
+- JSON results tagged with host info and the git SHA
+- comparison against a stored baseline; regressions exit with status 1
+
+操作說明：
+    uv run python w0-foundations/benchmark.py list
+    uv run python w0-foundations/benchmark.py run                          (all scenarios)
+    uv run python w0-foundations/benchmark.py run tiny_tasks --repeat 5    (filter by substring)
+    uv run python w0-foundations/benchmark.py run --save-baseline          (store as the baseline)
+    uv run python w0-foundations/benchmark.py compare OLD.json NEW.json
+"""
+import ast
+import datetime
+import importlib
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+
+import benchkit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "ch2_native_tools" / "multi_processing"))
+from memory_sampler import MemorySampler
+
+ROOT = Path(__file__).resolve().parent
+RESULTS_DIR = ROOT / "bench_results"
+BASELINE = RESULTS_DIR / "baseline.json"
+DEFAULT_THRESHOLD = 0.10    # flag a regression when 10% slower (or larger) than baseline
+SCENARIO_TIMEOUT = 900      # seconds before a scenario run is abandoned
+SAMPLER_HZ = 10             # tree memory samples per second (~1 ms each, counted in CPU time)
+
+app = typer.Typer(add_completion=False, help="Run and compare the w0-foundations benchmark scenarios.")
+
+
+# =============================================================================
+# Discovery
+# =============================================================================
+def _is_scenario_decorator(node):
+    target = node.func if isinstance(node, ast.Call) else node
+    if isinstance(target, ast.Attribute):
+        return target.attr == 'scenario'
+    return isinstance(target, ast.Name) and target.id == 'scenario'
+
+
+def _scenario_name(func_node, decorator):
+    if isinstance(decorator, ast.Call):
+        for kw in decorator.keywords:
+            if kw.arg == 'name' and isinstance(kw.value, ast.Constant):
+                return kw.value.value
+        if decorator.args and isinstance(decorator.args[0], ast.Constant):
+            return decorator.args[0].value
+    return func_node.name
+
+
+def discover(patterns=()):
+    """
+    Scenario ids ("<path relative to w0-foundations>::<name>") found in the source.
+
+    Args:
+        patterns: Keep ids containing any of these substrings (default: all)
+    """
+    ids = []
+    for path in sorted(ROOT.rglob("*.py")):
+        if path.name in ("benchkit.py", "benchmark.py") or ".venv" in path.parts:
+            continue
+        tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+        rel = path.relative_to(ROOT).as_posix()
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.FunctionDef):
+                continue
+            for decorator in node.decorator_list:
+                if _is_scenario_decorator(decorator):
+                    ids.append(f"{rel}::{_scenario_name(node, decorator)}")
+    if patterns:
+        ids = [i for i in ids if any(p in i for p in patterns)]
+    return ids
+
+
+# =============================================================================
+# Running (child side: one scenario per interpreter)
+# =============================================================================
+def _load_scenario(scenario_id):
+    rel, name = scenario_id.split("::")
+    path = ROOT / rel
+    # Scripts import their siblings by plain name, so their directory goes on sys.path
+    sys.path.insert(0, str(path.parent))
+    module = importlib.import_module(path.stem)
+    return benchkit.SCENARIOS[f"{module.__name__}::{name}"]
+
+
+def _peak_rss_bytes(who):
+    return resource.getrusage(who).ru_maxrss * 1024  # KiB on Linux
+
+
+def run_scenario(spec, warmup=None, repeat=None):
+    """
+    Run one registered scenario in this process.
+
+    Returns:
+        dict: warmup, repeat, wall_ns and cpu_ns lists, peak RSS of this
+              process and of its largest reaped child, and peak PSS of the
+              whole process tree while the scenario ran (bytes)
+
+    RUSAGE_CHILDREN only covers children that have exited and been waited
+    for: pool workers kept alive (pool_registry.get_pool) are only seen by
+    the tree sampler.
+    """
+    warmup = spec['warmup'] if warmup is None else warmup
+    repeat = spec['repeat'] if repeat is None else repeat
+    args = spec['setup']() if spec['setup'] else ()
+    sampler = MemorySampler(hz=SAMPLER_HZ)
+    try:
+        with sampler:
+            for _ in range(warmup):
+                spec['func'](*args)
+            wall_ns, cpu_ns = [], []
+            for _ in range(repeat):
+                wall, cpu, _ = benchkit.measure(spec['func'], *args)
+                wall_ns.append(wall)
+                cpu_ns.append(cpu)
+    finally:
+        if spec['teardown']:
+            spec['teardown'](*args)
+    return {'warmup': warmup, 'repeat': repeat, 'wall_ns': wall_ns, 'cpu_ns': cpu_ns,
+            'peak_rss_bytes': _peak_rss_bytes(resource.RUSAGE_SELF),
+            'peak_rss_children_bytes': _peak_rss_bytes(resource.RUSAGE_CHILDREN),
+            'peak_tree_bytes': sampler.peak('pss').bytes}
+
+
+@app.command("child", hidden=True)
+def child(scenario_id: str, out: Path, warmup: Optional[int] = None, repeat: Optional[int] = None):
+    """Internal: run one scenario and write its record to OUT."""
+    record = run_scenario(_load_scenario(scenario_id), warmup, repeat)
+    out.write_text(json.dumps(record))
+
+
+# =============================================================================
+# Running (parent side)
+# =============================================================================
+def _summarize(record):
+    wall = [ns / 1e9 for ns in record['wall_ns']]
+    cpu = [ns / 1e9 for ns in record['cpu_ns']]
+    record.update(
+        wall_median_s=statistics.median(wall),
+        wall_min_s=min(wall),
+        wall_stdev_s=statistics.stdev(wall) if len(wall) > 1 else 0.0,
+        cpu_median_s=statistics.median(cpu),
+        peak_rss_mb=max(record['peak_rss_bytes'], record['peak_rss_children_bytes']) / 2**20,
+        # PSS and RSS count shared pages differently: never mix them in one number
+        peak_pss_mb=record['peak_tree_bytes'] / 2**20 if 'peak_tree_bytes' in record else None,
+    )
+    return record
+
+
+def run_isolated(scenario_id, warmup=None, repeat=None, verbose=False):
+    """
+    Run one scenario in a fresh interpreter.
+
+    Returns:
+        dict: the scenario record with summary statistics, or {'error': ...}
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out = Path(tmpdir) / "record.json"
+        cmd = [sys.executable, str(Path(__file__).resolve()), "child", scenario_id, str(out)]
+        if warmup is not None:
+            cmd += ["--warmup", str(warmup)]
+        if repeat is not None:
+            cmd += ["--repeat", str(repeat)]
+        try:
+            proc = subprocess.run(cmd, stdout=None if verbose else subprocess.DEVNULL,
+                                  stderr=None if verbose else subprocess.PIPE,
+                                  text=True, timeout=SCENARIO_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            return {'error': f'timed out after {SCENARIO_TIMEOUT}s'}
+        if proc.returncode != 0 or not out.exists():
+            lines = (proc.stderr or '').strip().splitlines() or [f'exit status {proc.returncode}']
+            return {'error': lines[-1][:120]}
+        return _summarize(json.loads(out.read_text()))
+
+
+def _git_sha():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return sha + ("-dirty" if dirty else "")
+
+
+def host_info():
+    """Where and on what the results were measured."""
+    return {
+        'hostname': platform.node(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'git_sha': _git_sha(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+# =============================================================================
+# Comparison
+# =============================================================================
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare median wall time, peak RSS and peak tree PSS of the scenarios
+    present in both runs. Each memory metric is only compared with itself;
+    the PSS ratio is None when either run lacks it (older results).
+
+    Returns:
+        list: dicts with id, wall, RSS and PSS ratios (current / baseline) and
+              status ('regression', 'improved' or 'ok')
+    """
+    rows = []
+    for scenario_id, cur in current['results'].items():
+        base = baseline['results'].get(scenario_id)
+        if base is None or 'error' in base or 'error' in cur:
+            continue
+        wall_ratio = cur['wall_median_s'] / max(base['wall_median_s'], 1e-9)
+        rss_ratio = cur['peak_rss_mb'] / max(base['peak_rss_mb'], 1e-9)
+        pss_ratio = None
+        if cur.get('peak_pss_mb') is not None and base.get('peak_pss_mb') is not None:
+            pss_ratio = cur['peak_pss_mb'] / max(base['peak_pss_mb'], 1e-9)
+        if wall_ratio > 1 + threshold or max(rss_ratio, pss_ratio or 0.0) > 1 + threshold:
+            status = 'regression'
+        elif wall_ratio < 1 - threshold:
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append({'id': scenario_id, 'wall_ratio': wall_ratio, 'rss_ratio': rss_ratio,
+                     'pss_ratio': pss_ratio, 'status': status})
+    return rows
+
+
+def print_comparison(rows, threshold):
+    if not rows:
+        print("\nNo scenarios in common with the baseline.")
+        return 0
+    width = max([len(r['id']) for r in rows] + [8])
+    print(f"\nCompared with baseline (threshold {threshold:.0%}):")
+    print(f"  {'scenario':<{width}} {'wall':>7} {'RSS':>7} {'PSS':>7}  status")
+    for r in rows:
+        pss = f"{r['pss_ratio']:>6.2f}x" if r['pss_ratio'] is not None else f"{'-':>7}"
+        print(f"  {r['id']:<{width}} {r['wall_ratio']:>6.2f}x {r['rss_ratio']:>6.2f}x {pss}  {r['status']}")
+    n_reg = sum(r['status'] == 'regression' for r in rows)
+    print(f"\n{n_reg} regression(s) in {len(rows)} compared scenario(s).")
+    return n_reg
+
+
+def _load(path):
+    return json.loads(Path(path).read_text())
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+@app.command("list")
+def list_scenarios(patterns: List[str] = typer.Argument(None, help="Substring filters")):
+    """List the discovered scenarios."""
+    for scenario_id in discover(patterns or ()):
+        print(scenario_id)
+
+
+@app.command()
+def run(patterns: List[str] = typer.Argument(None, help="Only scenarios whose id contains one of these"),
+        warmup: Optional[int] = typer.Option(None, help="Override each scenario's warmup runs"),
+        repeat: Optional[int] = typer.Option(None, help="Override each scenario's timed runs"),
+        output: Optional[Path] = typer.Option(None, help="Results file (default: bench_results/<time>-<sha>.json)"),
+        baseline: Path = typer.Option(BASELINE, help="Baseline to compare against (skipped if missing)"),
+        threshold: float = typer.Option(DEFAULT_THRESHOLD, help="Relative slowdown that counts as a regression"),
+        save_baseline: bool = typer.Option(False, help="Also store these results as the baseline"),
+        verbose: bool = typer.Option(False, help="Show the scenarios' own output")):
+    """Run scenarios, write JSON results and compare them with the baseline."""
+    ids = discover(patterns or ())
+    if not ids:
+        print("No scenarios matched.")
+        raise typer.Exit(1)
+
+    meta = host_info()
+    results = {}
+    print(f"Running {len(ids)} scenario(s) on {meta['hostname']} ({meta['cpu_count']} CPUs), "
+          f"git {meta['git_sha'] or 'unknown'}\n")
+    width = max(len(i) for i in ids)
+    print(f"  {'scenario':<{width}} {'median':>9} {'min':>9} {'CPU':>9} {'peak RSS':>11} {'tree PSS':>11}")
+    for scenario_id in ids:
+        r = results[scenario_id] = run_isolated(scenario_id, warmup, repeat, verbose)
+        if 'error' in r:
+            print(f"  {scenario_id:<{width}} FAILED: {r['error']}")
+        else:
+            print(f"  {scenario_id:<{width}} {r['wall_median_s']:>8.4f}s {r['wall_min_s']:>8.4f}s "
+                  f"{r['cpu_median_s']:>8.4f}s {r['peak_rss_mb']:>8.1f} MB {r['peak_pss_mb']:>8.1f} MB")
+
+    report = {'meta': meta, 'results': results}
+    if output is None:
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = RESULTS_DIR / f"{stamp}-{(meta['git_sha'] or 'nogit')[:7]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults written to {output}")
+
+    n_reg = 0
+    if baseline.exists() and baseline.resolve() != output.resolve():
+        n_reg = print_comparison(compare_results(_load(baseline), report, threshold), threshold)
+    if save_baseline:
+        baseline.parent.mkdir(parents=True, exist_ok=True)
+        baseline.write_text(json.dumps(report, indent=2))
+        print(f"Baseline saved to {baseline}")
+    if n_reg or any('error' in r for r in results.values()):
+        raise typer.Exit(1)
+
+
+@app.command()
+def compare(baseline: Path, current: Path,
+            threshold: float = typer.Option(DEFAULT_THRESHOLD, help="Relative slowdown that counts as a regression")):
+    """Compare two results files; exit status 1 on any regression."""
+    base, cur = _load(baseline), _load(current)
+    print(f"baseline: git {base['meta']['git_sha']} on {base['meta']['hostname']} ({base['meta']['timestamp']})")
+    print(f"current:  git {cur['meta']['git_sha']} on {cur['meta']['hostname']} ({cur['meta']['timestamp']})")
+    if print_comparison(compare_results(base, cur, threshold), threshold):
+        raise typer.Exit(1)
+
+
+if __name__ == '__main__':
+    app()
@@ -0,0 +1,200 @@
+"""
+Ch1.2 (helper) - asyncio I/O Engine: Bounded Concurrency Without Threads
+
+`bound_example.simulate_io_operation` and `gil_limit_example.io_bound_task`
+wait on I/O either one at a time or with one OS thread per task. An event
+loop can keep tens of thousands of waits in flight on a single thread:
+
+- bounded concurrency: `concurrency` worker coroutines pull from the input,
+  so at most that many operations are in flight (and input is consumed lazily)
+- per-attempt timeout, retry with exponential backoff + jitter
+- results stream: `stream_bounded()` yields each TaskResult as it completes
+
+操作說明：
+    uv run python ch1_basics/async_io_engine.py                   (benchmark: asyncio vs threads)
+    uv run python ch1_basics/async_io_engine.py 100 10000 100000  (choose the concurrency levels)
+"""
+import asyncio
+import json
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, NamedTuple
+
+# =============================================================================
+# Configuration
+# =============================================================================
+DEFAULT_CONCURRENCY = 1_000
+DEFAULT_BACKOFF = 0.1       # first retry delay (seconds), doubled per attempt
+MAX_BACKOFF = 5.0
+BENCH_LEVELS = (100, 10_000, 100_000)
+BENCH_WAIT = 1.0            # seconds each simulated request waits
+BENCH_TIMEOUT = 300         # seconds before a benchmark run is abandoned
+
+
+class TaskResult(NamedTuple):
+    index: int          # position in the input
+    value: Any          # return value (None on failure)
+    error: Any          # last exception (None on success)
+    attempts: int
+    elapsed: float      # seconds from first attempt to completion
+
+
+# =============================================================================
+# Engine
+# =============================================================================
+async def call_with_retry(func, arg, timeout=None, retries=0,
+                          backoff=DEFAULT_BACKOFF, retry_on=(Exception,)):
+    """
+    Await func(arg) with a per-attempt timeout, retrying failures.
+
+    Returns:
+        tuple: (value, error, attempts); error is None on success
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await asyncio.wait_for(func(arg), timeout), None, attempt
+        except retry_on as e:
+            if attempt > retries:
+                return None, e, attempt
+            delay = min(backoff * 2 ** (attempt - 1), MAX_BACKOFF)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+
+async def stream_bounded(func, args, concurrency=DEFAULT_CONCURRENCY, **retry_kwargs):
+    """
+    Run `await func(arg)` for every arg, at most `concurrency` at a time.
+
+    Yields:
+        TaskResult: in completion order
+    """
+    queue = asyncio.Queue()
+    items = enumerate(args)
+    done = object()
+
+    async def worker():
+        for index, arg in items:  # shared iterator: each item is taken once
+            start = time.perf_counter()
+            value, error, attempts = await call_with_retry(func, arg, **retry_kwargs)
+            await queue.put(TaskResult(index, value, error, attempts, time.perf_counter() - start))
+        await queue.put(done)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        remaining = len(workers)
+        while remaining:
+            result = await queue.get()
+            if result is done:
+                remaining -= 1
+            else:
+                yield result
+    finally:
+        for w in workers:
+            w.cancel()
+
+
+async def gather_bounded(func, args, concurrency=DEFAULT_CONCURRENCY, **retry_kwargs):
+    """Collect stream_bounded() results in input order."""
+    results = []
+    async for result in stream_bounded(func, args, concurrency, **retry_kwargs):
+        results.append(result)
+    return sorted(results, key=lambda r: r.index)
+
+
+def run_io_tasks(func, args, concurrency=DEFAULT_CONCURRENCY, **retry_kwargs):
+    """Synchronous entry point: run gather_bounded() on a fresh event loop."""
+    return asyncio.run(gather_bounded(func, args, concurrency, **retry_kwargs))
+
+
+async def async_io_operation(duration=0.5):
+    """asyncio version of bound_example.simulate_io_operation."""
+    await asyncio.sleep(duration)
+    return "Operation completed"
+
+
+# =============================================================================
+# Benchmark: asyncio vs ThreadPoolExecutor
+# =============================================================================
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def _bench_asyncio(n):
+    peak_threads = threading.active_count()
+
+    async def sampled_operation(duration):
+        # Sampled inside each task, while the loop (and anything it started) is running
+        nonlocal peak_threads
+        peak_threads = max(peak_threads, threading.active_count())
+        return await async_io_operation(duration)
+
+    start = time.perf_counter()
+    results = run_io_tasks(sampled_operation, [BENCH_WAIT] * n, concurrency=n)
+    elapsed = time.perf_counter() - start
+    assert all(r.error is None for r in results)
+    return elapsed, peak_threads
+
+
+def _bench_threads(n):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n) as executor:
+        futures = [executor.submit(time.sleep, BENCH_WAIT) for _ in range(n)]
+        peak_threads = threading.active_count()
+        for f in futures:
+            f.result()
+    return time.perf_counter() - start, peak_threads
+
+
+def _bench_child(backend, n):
+    """Runs in a fresh interpreter so peak RSS belongs to this run only."""
+    bench = _bench_asyncio if backend == 'asyncio' else _bench_threads
+    elapsed, threads = bench(n)
+    print(json.dumps({'wall': elapsed, 'peak_rss_mb': _peak_rss_mb(), 'threads': threads}))
+
+
+def bench(backend, n):
+    """
+    Benchmark one backend at n concurrent waits in a subprocess.
+
+    Returns:
+        dict: wall (s), peak_rss_mb, threads, or error
+    """
+    try:
+        proc = subprocess.run([sys.executable, __file__, '--child', backend, str(n)],
+                              capture_output=True, text=True, timeout=BENCH_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return {'error': f'timed out after {BENCH_TIMEOUT}s'}
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines() or ['unknown error']
+        return {'error': lines[-1][:60]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        _bench_child(sys.argv[2], int(sys.argv[3]))
+        return
+
+    levels = [int(a) for a in sys.argv[1:]] or list(BENCH_LEVELS)
+    print("=" * 70)
+    print(f"asyncio vs ThreadPoolExecutor: N concurrent waits of {BENCH_WAIT}s each")
+    print("=" * 70)
+    print(f"  {'N':>8}  {'backend':<8} {'wall':>9} {'peak RSS':>11} {'threads':>8}")
+    for n in levels:
+        for backend in ('asyncio', 'threads'):
+            r = bench(backend, n)
+            if 'error' in r:
+                print(f"  {n:>8,}  {backend:<8} FAILED: {r['error']}")
+            else:
+                print(f"  {n:>8,}  {backend:<8} {r['wall']:>8.2f}s {r['peak_rss_mb']:>8.1f} MB {r['threads']:>8,}")
+    print("\nasyncio keeps every wait on one thread; the pool needs one OS thread per in-flight wait.")
+
+
+if __name__ == '__main__':
+    main()
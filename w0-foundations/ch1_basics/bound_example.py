@@ -7,9 +7,23 @@ Ch1.1 - 效能瓶頸：CPU-bound vs I/O-bound
 
     2. 用 cProfile 分析 I/O:
         uv run python -m cProfile ch1_basics/bound_example.py io
+
+    3. 比較質數引擎 (trial division vs segmented sieve):
+        uv run python ch1_basics/bound_example.py cpu --engine sieve
+
+    4. I/O 改用 asyncio (單一執行緒, bounded concurrency):
+        uv run python ch1_basics/bound_example.py io-async
 """
+import asyncio
 import time
 import sys 
+from pathlib import Path
+
+import prime_engine
+from async_io_engine import async_io_operation, run_io_tasks, stream_bounded
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from benchkit import scenario
 
 # =============================================================================
 # example functions
@@ -25,8 +39,10 @@ def is_prime(n):
             return False
     return True
 
-def find_primes(max_number):
-    return [n for n in range(max_number) if is_prime(n)]
+def find_primes(max_number, engine='trial'):
+    if engine == 'trial':
+        return [n for n in range(max_number) if is_prime(n)]
+    return prime_engine.find_primes(max_number, engine=engine)
 
 
 # I/O-bound: time sleep -> simulate network request 
@@ -37,14 +53,14 @@ def simulate_io_operation(duration=0.5):
 # =============================================================================
 # Demo 1: CPU-bound Task
 # =============================================================================
-def demo_cpu_bound():
+def demo_cpu_bound(engine='trial'):
     print("=" * 60)
-    print("Demo 1: CPU-bound - 尋找質數")
+    print(f"Demo 1: CPU-bound - 尋找質數 (engine: {engine})")
     print("=" * 60)
     print("Running computation...\n")
     start = time.time()
     # 使用 1,000,000 讓 cProfile 有足夠時間分析
-    primes = find_primes(N) 
+    primes = find_primes(N, engine=engine) 
     elapsed = time.time() - start
     print(f"Found {len(primes):,} primes")
     print(f"Time: {elapsed:.2f} seconds\n")
@@ -66,23 +82,68 @@ def demo_io_bound():
     print(f"\nCompleted {n_requests} requests")
     print(f"Time: {elapsed:.2f} seconds\n")
 
+# =============================================================================
+# Demo 3: I/O-bound Task with asyncio
+# =============================================================================
+async def _stream_requests(n_requests):
+    async for result in stream_bounded(async_io_operation, [0.5] * n_requests,
+                                       concurrency=n_requests, timeout=2.0, retries=2):
+        print(f"  Request {result.index+1}/{n_requests} done ({result.elapsed:.2f}s)")
+
+def demo_io_async():
+    print("=" * 60)
+    print("Demo 3: I/O-bound - asyncio (1 thread, all requests in flight)")
+    print("=" * 60)
+    print("Running I/O operations...\n")
+    start = time.time()
+    n_requests = 5
+    asyncio.run(_stream_requests(n_requests))
+    elapsed = time.time() - start
+    print(f"\nCompleted {n_requests} requests")
+    print(f"Time: {elapsed:.2f} seconds\n")
+
+# =============================================================================
+# Benchmark scenarios (see benchmark.py)
+# =============================================================================
+BENCH_N = 200_000  # smaller than N so the trial engine can be repeated
+
+@scenario()
+def cpu_trial():
+    find_primes(BENCH_N, engine='trial')
+
+@scenario()
+def cpu_sieve():
+    find_primes(N, engine='sieve')
+
+@scenario()
+def io_sequential():
+    for _ in range(5):
+        simulate_io_operation(0.5)
+
+@scenario()
+def io_async():
+    run_io_tasks(async_io_operation, [0.5] * 5, concurrency=5)
+
 # =============================================================================
 # Main 
 # =============================================================================
 def main():
-    if len(sys.argv) < 2:
-        print("錯誤：請提供一個參數 'cpu' 或 'io'")
-        print("範例: python bound_example.py cpu")
+    engine, args = prime_engine.pop_engine_arg(sys.argv[1:])
+    if len(args) < 1:
+        print("錯誤：請提供一個參數 'cpu'、'io' 或 'io-async'")
+        print("範例: python bound_example.py cpu [--engine sieve|trial]")
         sys.exit(1) 
 
-    task_type = sys.argv[1]
+    task_type = args[0]
 
     if task_type == 'cpu':
-        demo_cpu_bound()
+        demo_cpu_bound(engine)
     elif task_type == 'io':
         demo_io_bound()
+    elif task_type == 'io-async':
+        demo_io_async()
     else:
-        print(f"錯誤：未知的參數 '{task_type}'。請使用 'cpu' 或 'io'")
+        print(f"錯誤：未知的參數 '{task_type}'。請使用 'cpu'、'io' 或 'io-async'")
         sys.exit(1)
 
 if __name__ == '__main__':
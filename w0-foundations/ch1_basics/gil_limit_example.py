@@ -4,10 +4,22 @@ Ch1.2 - The Effect of the GIL (Global Interpreter Lock)
 操作說明：
 1. 執行 CPU demo: uv run python ch1_basics/gil_limit_example.py cpu
 2. 執行 I/O demo: uv run python ch1_basics/gil_limit_example.py io
+3. 執行 mixed demo: uv run python ch1_basics/gil_limit_example.py mixed
 """
+import asyncio
 import time
 import sys
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# pool_registry lives with the Ch2 multiprocessing examples
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "ch2_native_tools" / "multi_processing"))
+from pool_registry import get_pool
+from async_io_engine import run_io_tasks
+from hybrid_executor import HybridExecutor
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from benchkit import scenario
 
 # =============================================================================
 # example functions
@@ -35,6 +47,26 @@ def io_bound_task(duration=0.5):
     print(f"  I/O-bound task done in {elapsed:.2f}s")
     return elapsed
 
+# 3. The same wait as a coroutine (for the asyncio runner)
+async def async_io_bound_task(duration=0.5):
+    print(f"  Running async I/O-bound task (waiting {duration}s)...")
+    start_t = time.time()
+    await asyncio.sleep(duration)
+    elapsed = time.time() - start_t
+    print(f"  Async I/O-bound task done in {elapsed:.2f}s")
+    return elapsed
+
+# 4. A NumPy task (BLAS releases the GIL while it multiplies)
+def numpy_task(n=1500):
+    import numpy as np
+    print(f"  Running NumPy task ({n}x{n} matmul)...")
+    start_t = time.time()
+    a = np.ones((n, n))
+    a @ a
+    elapsed = time.time() - start_t
+    print(f"  NumPy task done in {elapsed:.2f}s")
+    return elapsed
+
 # =============================================================================
 # Helper function for map()
 # =============================================================================
@@ -60,11 +92,22 @@ def run_with_threads(tasks):
     with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
         return list(executor.map(run_task_helper, tasks))
 
+def run_with_asyncio(durations, concurrency=100):
+    """Runs the waits as coroutines on one thread, at most `concurrency` at a time."""
+    return run_io_tasks(async_io_bound_task, durations, concurrency=concurrency)
+
 def run_with_processes(tasks):
-    """Runs a list of functions in a process pool."""
+    """Runs a list of functions in a process pool (kept warm across calls)."""
     # Use the helper function instead of lambda
-    with ProcessPoolExecutor(max_workers=len(tasks)) as executor:
-        return list(executor.map(run_task_helper, tasks))
+    executor = get_pool(len(tasks), preload=())
+    return list(executor.map(run_task_helper, tasks))
+
+def run_with_hybrid(tasks, executor=None):
+    """Runs each function on threads or processes, chosen by its measured GIL holding."""
+    if executor is not None:
+        return [f.result() for f in [executor.submit(task) for task in tasks]]
+    with HybridExecutor(max_workers=len(tasks)) as executor:
+        return run_with_hybrid(tasks, executor)
 
 # =============================================================================
 # Demo 1: CPU-bound Comparison
@@ -138,6 +181,15 @@ def demo_io_gil():
     run_with_threads(tasks_io)
     t_thread_io = time.time() - start
     print(f"\nTotal time: {t_thread_io:.2f} seconds\n")
+
+    # 3. Alternative: asyncio (no thread per task)
+    print("=" * 60)
+    print("Demo 6: asyncio event loop (I/O-bound, 1 thread)")
+    print("=" * 60)
+    start = time.time()
+    run_with_asyncio([0.5] * len(tasks_io))
+    t_async_io = time.time() - start
+    print(f"\nTotal time: {t_async_io:.2f} seconds\n")
     
     # --- Summary ---
     print("=" * 60)
@@ -145,13 +197,75 @@ def demo_io_gil():
     print("=" * 60)
     print(f"  Sequential:       {t_seq_io:.2f}s")
     print(f"  Multi-Threading:  {t_thread_io:.2f}s  <-- SPEEDUP (GIL released)")
+    print(f"  asyncio:          {t_async_io:.2f}s  <-- SAME SPEEDUP, one thread (see async_io_engine.py)")
+
+# =============================================================================
+# Demo 3: Mixed batch (pure Python + NumPy + I/O)
+# =============================================================================
+def demo_mixed_gil():
+    print("\nCh1.2 - Routing a mixed batch: threads, processes, or both")
+
+    # Pure Python holds the GIL, NumPy and sleep release it.
+    # Neither pool alone is right for all of them.
+    tasks_mixed = [cpu_bound_task, numpy_task, io_bound_task] * 2
+
+    print("=" * 60)
+    print("Demo 7: ThreadPoolExecutor (mixed)")
+    print("=" * 60)
+    start = time.time()
+    run_with_threads(tasks_mixed)
+    t_thread_mixed = time.time() - start
+    print(f"\nTotal time: {t_thread_mixed:.2f} seconds\n")
+
+    print("=" * 60)
+    print("Demo 8: ProcessPoolExecutor (mixed)")
+    print("=" * 60)
+    start = time.time()
+    run_with_processes(tasks_mixed)
+    t_proc_mixed = time.time() - start
+    print(f"\nTotal time: {t_proc_mixed:.2f} seconds\n")
+
+    # The first batch measures each function, the second uses the cached routes
+    with HybridExecutor(max_workers=len(tasks_mixed)) as executor:
+        timings = []
+        for run in ("profiling", "cached routes"):
+            print("=" * 60)
+            print(f"Demo 9: HybridExecutor (mixed, {run})")
+            print("=" * 60)
+            start = time.time()
+            run_with_hybrid(tasks_mixed, executor)
+            timings.append(time.time() - start)
+            print(f"\nTotal time: {timings[-1]:.2f} seconds\n")
+        decisions = executor.format_decisions()
+
+    # --- Summary ---
+    print("=" * 60)
+    print("Mixed Summary")
+    print("=" * 60)
+    print(f"  Multi-Threading:  {t_thread_mixed:.2f}s  <-- Python loops serialize on the GIL")
+    print(f"  Multi-Processing: {t_proc_mixed:.2f}s  <-- every task pays a process round trip")
+    print(f"  Hybrid, 1st run:  {timings[0]:.2f}s  <-- includes measuring each function")
+    print(f"  Hybrid, 2nd run:  {timings[1]:.2f}s  <-- each function on its own pool")
+    print("\nRouting decisions (see hybrid_executor.py):")
+    print(decisions)
+
+# =============================================================================
+# Benchmark scenarios (see benchmark.py)
+# =============================================================================
+@scenario()
+def io_threads():
+    run_with_threads([io_bound_task] * 4)
+
+@scenario()
+def io_asyncio():
+    run_with_asyncio([0.5] * 4)
 
 # =============================================================================
 # Main 
 # =============================================================================
 def main():
     if len(sys.argv) < 2:
-        print("錯誤：請提供一個參數 'cpu' 或 'io'")
+        print("錯誤：請提供一個參數 'cpu'、'io' 或 'mixed'")
         print("範例: python gil_limit_example.py cpu")
         sys.exit(1) 
 
@@ -161,8 +275,10 @@ def main():
         demo_cpu_gil()
     elif task_type == 'io':
         demo_io_gil()
+    elif task_type == 'mixed':
+        demo_mixed_gil()
     else:
-        print(f"錯誤：未知的參數 '{task_type}'。請使用 'cpu' 或 'io'")
+        print(f"錯誤：未知的參數 '{task_type}'。請使用 'cpu'、'io' 或 'mixed'")
         sys.exit(1)
 
 if __name__ == '__main__':
@@ -0,0 +1,264 @@
+"""
+Ch1.2 (helper) - Hybrid Executor: Threads or Processes, Measured per Function
+
+`gil_limit_example.py` makes you pick `run_with_threads` or
+`run_with_processes` by hand. Real batches mix both kinds of work: NumPy
+calls and I/O release the GIL (threads are enough and cost nothing), pure
+Python loops hold it (only processes run them in parallel).
+
+`HybridExecutor` decides per function. The first `profile_calls` calls of
+each function run on a thread while a pure-Python "ticker" thread competes
+for the GIL, and both measure CPU time against wall time:
+
+    call share   = call CPU / call wall      (how much the call computes)
+    ticker share = ticker CPU / ticker wall  (how often the GIL was free)
+
+    GIL-held fraction g = (1 - ticker share) / call share
+
+A pure Python loop shares the GIL with the ticker (g ~ 1), NumPy lets the
+ticker run alongside (g ~ 0). Functions that mostly wait (call share low),
+finish in a few milliseconds, or cannot be pickled stay on threads; the rest
+go to the warm process pool when g > threshold. The decision is cached per
+function, so later calls are routed without measuring.
+
+On a single core every call competes for the CPU, not just the GIL, and
+processes cannot add parallelism: everything runs on threads there.
+
+操作說明：
+uv run python ch1_basics/hybrid_executor.py     (mixed batch: threads vs processes vs hybrid)
+"""
+import os
+import pickle
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import NamedTuple
+
+# pool_registry lives with the Ch2 multiprocessing examples
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "ch2_native_tools" / "multi_processing"))
+from pool_registry import get_pool
+
+# --- Routing Configuration ---
+PROFILE_CALLS = 2          # measured calls per function before deciding
+GIL_THRESHOLD = 0.5        # route to processes above this GIL-held fraction
+MIN_CPU_SHARE = 0.2        # below this the call mostly waits (I/O): threads
+MIN_PROCESS_SECONDS = 0.005  # shorter calls cannot pay for pickling + IPC
+TICK_BATCH = 1000          # pure-Python iterations between ticker stop checks
+
+
+class Profile(NamedTuple):
+    wall: float            # seconds, measured under ticker contention
+    cpu_share: float       # call CPU / call wall
+    ticker_share: float    # ticker CPU / ticker wall
+    gil_fraction: float    # estimated share of the call's CPU time holding the GIL
+
+
+class Decision(NamedTuple):
+    backend: str           # 'thread' or 'process'
+    gil_fraction: float
+    cpu_share: float
+    wall: float
+    reason: str
+
+
+def function_key(fn):
+    return f"{getattr(fn, '__module__', '?')}.{getattr(fn, '__qualname__', repr(fn))}"
+
+
+def profile_call(fn, *args, **kwargs):
+    """
+    Run fn(*args, **kwargs) on the calling thread against a GIL ticker.
+
+    Returns:
+        tuple: (result, Profile)
+    """
+    stop = threading.Event()
+    ticker = {}
+
+    def tick():
+        wall0, cpu0 = time.perf_counter(), time.thread_time()
+        while not stop.is_set():
+            for _ in range(TICK_BATCH):
+                pass
+        ticker['cpu'] = time.thread_time() - cpu0
+        ticker['wall'] = time.perf_counter() - wall0
+
+    thread = threading.Thread(target=tick, name="gil-ticker", daemon=True)
+    thread.start()
+    wall0, cpu0 = time.perf_counter(), time.thread_time()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        cpu = time.thread_time() - cpu0
+        wall = time.perf_counter() - wall0
+        stop.set()
+        thread.join()
+
+    cpu_share = cpu / wall if wall else 0.0
+    ticker_share = ticker['cpu'] / ticker['wall'] if ticker['wall'] else 1.0
+    gil = (1.0 - ticker_share) / cpu_share if cpu_share > 0.01 else 0.0
+    return result, Profile(wall, cpu_share, ticker_share, min(max(gil, 0.0), 1.0))
+
+
+class HybridExecutor(Executor):
+    """
+    concurrent.futures Executor that routes each function to threads or processes.
+
+    Usage:
+        with HybridExecutor(max_workers=4) as executor:
+            futures = [executor.submit(task, x) for task, x in work]
+            print(executor.format_decisions())
+    """
+
+    def __init__(self, max_workers=None, profile_calls=PROFILE_CALLS, threshold=GIL_THRESHOLD):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.profile_calls = profile_calls
+        self.threshold = threshold
+        self.multicore = (os.cpu_count() or 1) > 1
+        self.decisions = {}
+        self._profiles = {}
+        self._threads = ThreadPoolExecutor(self.max_workers, thread_name_prefix="hybrid")
+        # One profiled call at a time: two tickers (or two profiled calls) would skew each other
+        self._profile_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    # --- Routing ---
+    def submit(self, fn, /, *args, **kwargs):
+        decision = self.decisions.get(function_key(fn))
+        if decision is None:
+            return self._threads.submit(self._run_profiled, fn, args, kwargs)
+        if decision.backend == 'process':
+            return get_pool(self.max_workers, preload=()).submit(fn, *args, **kwargs)
+        return self._threads.submit(fn, *args, **kwargs)
+
+    def _run_profiled(self, fn, args, kwargs):
+        key = function_key(fn)
+        if not self.multicore:
+            with self._lock:
+                self._decide(key, fn, [])
+        if key not in self.decisions:
+            with self._profile_lock:
+                # Checked again under the lock: calls queued behind the profiled ones find
+                # the decision made and are routed by it, not run here on a thread
+                if key not in self.decisions:
+                    result, profile = profile_call(fn, *args, **kwargs)
+                    with self._lock:
+                        profiles = self._profiles.setdefault(key, [])
+                        profiles.append(profile)
+                        if len(profiles) >= self.profile_calls:
+                            self._decide(key, fn, profiles)
+                    return result
+        return self._run_decided(key, fn, args, kwargs)
+
+    def _run_decided(self, key, fn, args, kwargs):
+        """Run a call submitted before its decision existed on the backend decided since."""
+        if self.decisions[key].backend == 'process':
+            return get_pool(self.max_workers, preload=()).submit(fn, *args, **kwargs).result()
+        return fn(*args, **kwargs)
+
+    def _decide(self, key, fn, profiles):
+        if key in self.decisions:
+            return
+        if not profiles:
+            self.decisions[key] = Decision('thread', 0.0, 0.0, 0.0, "single core")
+            return
+        gil = statistics.median(p.gil_fraction for p in profiles)
+        cpu_share = statistics.median(p.cpu_share for p in profiles)
+        wall = statistics.median(p.wall for p in profiles)
+        if cpu_share < MIN_CPU_SHARE:
+            backend, reason = 'thread', "mostly waiting (I/O)"
+        elif gil <= self.threshold:
+            backend, reason = 'thread', "releases the GIL"
+        elif wall < MIN_PROCESS_SECONDS:
+            backend, reason = 'thread', "too short for a process round trip"
+        elif not _picklable(fn):
+            backend, reason = 'thread', "cannot be pickled"
+        else:
+            backend, reason = 'process', "holds the GIL"
+        self.decisions[key] = Decision(backend, gil, cpu_share, wall, reason)
+
+    # --- Lifecycle ---
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        # The process pool is shared (pool_registry) and stays warm for other callers
+        self._threads.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def format_decisions(self):
+        lines = [f"  {'function':<32} {'backend':<8} {'GIL held':>9} {'CPU share':>10}  reason"]
+        for key, d in sorted(self.decisions.items()):
+            lines.append(f"  {key.rsplit('.', 1)[-1]:<32} {d.backend:<8} {d.gil_fraction:>9.0%} "
+                         f"{d.cpu_share:>10.0%}  {d.reason}")
+        return "\n".join(lines)
+
+
+def _picklable(fn):
+    try:
+        pickle.dumps(fn)
+        return True
+    except Exception:
+        return False
+
+
+# =============================================================================
+# Main: a mixed batch on threads, processes and the hybrid executor
+# =============================================================================
+def python_loop(n=3_000_000):
+    """Pure Python: holds the GIL."""
+    total = 0
+    for i in range(n):
+        total += i
+    return total
+
+
+def numpy_matmul(n=700):
+    """BLAS: releases the GIL."""
+    import numpy as np
+    a = np.ones((n, n))
+    return float((a @ a).sum())
+
+
+def io_wait(seconds=0.2):
+    """I/O: releases the GIL while waiting."""
+    time.sleep(seconds)
+    return seconds
+
+
+def _run_batch(executor, batch):
+    futures = [executor.submit(fn) for fn in batch]
+    wait(futures)
+    return [f.result() for f in futures]
+
+
+def main():
+    max_workers = min(4, os.cpu_count() or 1)
+    batch = [python_loop, numpy_matmul, io_wait] * 4
+    print("=" * 60)
+    print(f"Mixed batch: {len(batch)} tasks (Python loops, NumPy matmuls, I/O waits), "
+          f"{max_workers} workers, {os.cpu_count()} cores")
+    print("=" * 60)
+
+    get_pool(max_workers, preload=()).submit(io_wait, 0).result()  # warm the process pool
+    with ThreadPoolExecutor(max_workers) as threads:
+        start = time.perf_counter()
+        _run_batch(threads, batch)
+        print(f"  threads only:    {time.perf_counter() - start:6.2f}s")
+
+    start = time.perf_counter()
+    _run_batch(get_pool(max_workers, preload=()), batch)
+    print(f"  processes only:  {time.perf_counter() - start:6.2f}s")
+
+    with HybridExecutor(max_workers) as hybrid:
+        start = time.perf_counter()
+        _run_batch(hybrid, batch)
+        print(f"  hybrid, 1st run: {time.perf_counter() - start:6.2f}s  (includes profiling)")
+        start = time.perf_counter()
+        _run_batch(hybrid, batch)
+        print(f"  hybrid, 2nd run: {time.perf_counter() - start:6.2f}s  (decisions cached)")
+        print("\nRouting decisions:")
+        print(hybrid.format_decisions())
+
+
+if __name__ == '__main__':
+    main()
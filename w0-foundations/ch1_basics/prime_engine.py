@@ -0,0 +1,257 @@
+"""
+Ch1.1 (helper) - Prime Engine: Segmented Sieve vs Trial Division
+
+Shared prime-number engine used by the CPU-bound demos
+(`bound_example.py`, `load_balancing_example.py`).
+
+- trial: per-number trial division in pure Python (the original demo code)
+- sieve: NumPy segmented Sieve of Eratosthenes. Only odd numbers are stored,
+         each segment fits in cache, and large ranges are split across a
+         process pool. Memory per segment is bounded by SEGMENT_SIZE.
+
+操作說明：
+    uv run python ch1_basics/prime_engine.py 1_000_000_000
+    uv run python ch1_basics/prime_engine.py 1_000_000 --engine trial
+"""
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# =============================================================================
+# Configuration
+# =============================================================================
+ENGINES = ('trial', 'sieve')
+DEFAULT_ENGINE = 'trial'
+
+SEGMENT_SIZE = 1 << 19           # odd numbers per segment (512 KiB of bools, ~L2 sized)
+PARALLEL_THRESHOLD = 20_000_000  # below this range size, sieve inline (no pool)
+TASKS_PER_WORKER = 4             # blocks per worker, smooths out uneven finish times
+
+
+# =============================================================================
+# Trial division (original implementation)
+# =============================================================================
+def is_prime(n):
+    if n < 2:
+        return False
+    for i in range(2, int(n**0.5) + 1):
+        if n % i == 0:
+            return False
+    return True
+
+
+def trial_count_in_range(start, end):
+    """Count primes in [start, end) by trial division."""
+    return sum(1 for n in range(start, end) if is_prime(n))
+
+
+def trial_primes_in_range(start, end):
+    """List primes in [start, end) by trial division."""
+    return [n for n in range(start, end) if is_prime(n)]
+
+
+# =============================================================================
+# Segmented sieve
+# =============================================================================
+def base_primes(limit):
+    """Odd primes <= limit (simple sieve, only used up to sqrt(N))."""
+    if limit < 3:
+        return np.empty(0, dtype=np.int64)
+    sieve = np.ones(limit + 1, dtype=bool)
+    sieve[:2] = False
+    sieve[4::2] = False
+    for p in range(3, math.isqrt(limit) + 1, 2):
+        if sieve[p]:
+            sieve[p * p::2 * p] = False
+    primes = np.flatnonzero(sieve).astype(np.int64)
+    return primes[1:]  # drop 2, segments only hold odd numbers
+
+
+def _sieve_segment(lo, hi, primes):
+    """
+    Sieve the odd numbers of [lo, hi), lo even.
+
+    Args:
+        primes: Odd base primes as a Python list (cheaper to iterate than ndarray)
+
+    Returns a bool array where index i stands for the number lo + 2*i + 1.
+    """
+    seg = np.ones((hi - lo) // 2, dtype=bool)
+    limit = math.isqrt(hi - 1)
+    for p in primes:
+        if p > limit:
+            break
+        # first odd multiple of p in the segment, never below p*p
+        m = max(p * p, -(-(lo + 1) // p) * p)
+        if m % 2 == 0:
+            m += p
+        seg[(m - lo - 1) // 2::p] = False
+    if lo == 0:
+        seg[0] = False  # 1 is not prime
+    return seg
+
+
+def _segments(start, end, segment_size):
+    """Yield even-aligned (lo, hi) segments covering [start, end)."""
+    lo = start - (start % 2)
+    span = 2 * segment_size
+    while lo < end:
+        hi = min(lo + span, end + (end % 2))
+        yield lo, hi
+        lo = hi
+
+
+def _segment_bounds(lo, start, end):
+    """Index range of the segment starting at lo that falls in [start, end)."""
+    first = max(0, (start - lo) // 2)
+    last = (end - lo) // 2
+    return first, last
+
+
+def _sieve_count_block(args):
+    """Worker: count primes in [start, end) one segment at a time."""
+    start, end, primes, segment_size = args
+    primes = primes.tolist()
+    count = 1 if start <= 2 < end else 0
+    for lo, hi in _segments(start, end, segment_size):
+        seg = _sieve_segment(lo, hi, primes)
+        first, last = _segment_bounds(lo, start, end)
+        count += int(np.count_nonzero(seg[first:last]))
+    return count
+
+
+def _sieve_list_block(args):
+    """Worker: collect primes in [start, end) one segment at a time."""
+    start, end, primes, segment_size = args
+    primes = primes.tolist()
+    parts = [np.array([2], dtype=np.int64)] if start <= 2 < end else []
+    for lo, hi in _segments(start, end, segment_size):
+        seg = _sieve_segment(lo, hi, primes)
+        first, last = _segment_bounds(lo, start, end)
+        idx = np.flatnonzero(seg[first:last]) + first
+        parts.append(lo + 2 * idx.astype(np.int64) + 1)
+    if not parts:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(parts)
+
+
+def _split_blocks(start, end, n_blocks, segment_size):
+    """Split [start, end) into up to n_blocks segment-aligned blocks."""
+    span = 2 * segment_size
+    n_segments = -(-(end - start) // span)
+    per_block = max(1, -(-n_segments // n_blocks))
+    blocks = []
+    lo = start
+    while lo < end:
+        hi = min(lo - (lo % 2) + per_block * span, end)
+        blocks.append((lo, hi))
+        lo = hi
+    return blocks
+
+
+def _run_sieve(worker_fn, start, end, n_workers, segment_size):
+    """Build base primes once, then sieve [start, end) inline or in a pool."""
+    start = max(start, 0)
+    if end <= start:
+        return []
+    primes = base_primes(math.isqrt(end - 1))
+    n_workers = n_workers or os.cpu_count() or 1
+    if n_workers == 1 or end - start < PARALLEL_THRESHOLD:
+        return [worker_fn((start, end, primes, segment_size))]
+
+    blocks = _split_blocks(start, end, n_workers * TASKS_PER_WORKER, segment_size)
+    tasks = [(lo, hi, primes, segment_size) for lo, hi in blocks]
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(worker_fn, tasks))
+
+
+def sieve_count_in_range(start, end, n_workers=None, segment_size=SEGMENT_SIZE):
+    """Count primes in [start, end) with the segmented sieve."""
+    return sum(_run_sieve(_sieve_count_block, start, end, n_workers, segment_size))
+
+
+def sieve_primes_in_range(start, end, n_workers=None, segment_size=SEGMENT_SIZE):
+    """Primes in [start, end) as an int64 array, using the segmented sieve."""
+    parts = _run_sieve(_sieve_list_block, start, end, n_workers, segment_size)
+    if not parts:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(parts)
+
+
+# =============================================================================
+# Public API
+# =============================================================================
+def count_primes_in_range(start, end, engine=DEFAULT_ENGINE, n_workers=None):
+    """Count primes in [start, end) with the chosen engine."""
+    if engine == 'sieve':
+        return sieve_count_in_range(start, end, n_workers=n_workers)
+    if engine == 'trial':
+        return trial_count_in_range(start, end)
+    raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+
+
+def primes_in_range(start, end, engine=DEFAULT_ENGINE, n_workers=None):
+    """List primes in [start, end) with the chosen engine."""
+    if engine == 'sieve':
+        return sieve_primes_in_range(start, end, n_workers=n_workers).tolist()
+    if engine == 'trial':
+        return trial_primes_in_range(start, end)
+    raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+
+
+def count_primes(max_number, engine=DEFAULT_ENGINE, n_workers=None):
+    """Count primes below max_number."""
+    return count_primes_in_range(0, max_number, engine=engine, n_workers=n_workers)
+
+
+def find_primes(max_number, engine=DEFAULT_ENGINE, n_workers=None):
+    """List primes below max_number."""
+    return primes_in_range(0, max_number, engine=engine, n_workers=n_workers)
+
+
+def pop_engine_arg(argv, default=DEFAULT_ENGINE):
+    """
+    Remove `--engine NAME` / `--engine=NAME` from argv.
+
+    Returns:
+        tuple: (engine, remaining argv)
+    """
+    engine = default
+    rest = []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--engine':
+            engine = next(args, '')
+        elif arg.startswith('--engine='):
+            engine = arg.split('=', 1)[1]
+        else:
+            rest.append(arg)
+    if engine not in ENGINES:
+        print(f"錯誤：未知的 engine '{engine}'。請使用 {' 或 '.join(ENGINES)}")
+        sys.exit(1)
+    return engine, rest
+
+
+# =============================================================================
+# Main
+# =============================================================================
+def main():
+    engine, args = pop_engine_arg(sys.argv[1:], default='sieve')
+    max_number = int(args[0]) if args else 1_000_000_000
+
+    print("=" * 60)
+    print(f"Prime Engine: count primes below {max_number:,} ({engine})")
+    print("=" * 60)
+    start = time.perf_counter()
+    count = count_primes(max_number, engine=engine)
+    elapsed = time.perf_counter() - start
+    print(f"Found {count:,} primes")
+    print(f"Time: {elapsed:.2f} seconds")
+
+
+if __name__ == '__main__':
+    main()
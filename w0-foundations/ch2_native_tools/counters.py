@@ -0,0 +1,315 @@
+"""
+Ch2.1 (helper) - Contention-free Counters
+
+`race_condition_example.safe_increment` is correct, but every increment
+takes ONE global lock, so adding threads only adds contention. This module
+collects counter implementations that stay exact while sharing less:
+
+Threads:
+- LockedCounter:      one lock, every increment (the original fix)
+- StripedCounter:     N locks; each thread is assigned one stripe (round robin)
+- ThreadLocalCounter: each thread owns a private cell, summed on read
+- BatchedCounter:     thread-local pending count, flushed under a lock
+                      every `batch` increments (and at flush())
+
+Processes:
+- SharedValueCounter:     one multiprocessing.Value, locked on every increment
+- ProcessPartialCounter:  one slot per process in a shared array; each
+                          process writes only its own slot, no lock at all
+
+Note: under the GIL, threads never run Python bytecode in parallel, so for
+threads the gain is removing lock traffic, not true scaling. The process
+variants are the ones that scale with cores.
+
+操作說明：
+uv run python ch2_native_tools/counters.py
+"""
+import itertools
+import multiprocessing as mp
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from benchkit import scenario
+
+# --- Benchmark Configuration ---
+N_INCREMENTS = 200_000
+THREAD_COUNTS = (1, 2, 4, 8)
+PROCESS_COUNTS = (1, 2, 4)
+N_STRIPES = 16
+BATCH_SIZE = 1_024
+
+
+# =============================================================================
+# Thread counters
+# =============================================================================
+class LockedCounter:
+    """Single lock around every increment."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def increment(self, n=1):
+        with self._lock:
+            self._value += n
+
+    def value(self):
+        with self._lock:
+            return self._value
+
+
+class StripedCounter:
+    """
+    Lock striping: threads spread over n_stripes independent locks.
+
+    Each thread gets its stripe once, round robin. Hashing get_ident() does
+    not spread: thread idents are aligned pointers, so ident % n_stripes is
+    the same stripe for every thread.
+    """
+
+    def __init__(self, n_stripes=N_STRIPES):
+        self._locks = [threading.Lock() for _ in range(n_stripes)]
+        self._values = [0] * n_stripes
+        self._local = threading.local()
+        self._next = itertools.count()  # next() is atomic under the GIL
+        self._used = set()
+
+    def _stripe(self):
+        i = getattr(self._local, 'stripe', None)
+        if i is None:
+            i = self._local.stripe = next(self._next) % len(self._locks)
+            self._used.add(i)
+        return i
+
+    def increment(self, n=1):
+        i = self._stripe()
+        with self._locks[i]:
+            self._values[i] += n
+
+    def stripes_used(self):
+        """Number of distinct stripes the writer threads were assigned."""
+        return len(self._used)
+
+    def value(self):
+        total = 0
+        for i, lock in enumerate(self._locks):
+            with lock:
+                total += self._values[i]
+        return total
+
+
+class ThreadLocalCounter:
+    """
+    Each thread increments its own cell; value() sums every cell.
+
+    Exact once the writer threads have been joined. A lock is only taken
+    the first time a thread touches the counter (to register its cell).
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._cells = []
+        self._lock = threading.Lock()
+
+    def _cell(self):
+        cell = getattr(self._local, 'cell', None)
+        if cell is None:
+            cell = self._local.cell = [0]
+            with self._lock:
+                self._cells.append(cell)
+        return cell
+
+    def increment(self, n=1):
+        self._cell()[0] += n
+
+    def value(self):
+        with self._lock:
+            return sum(cell[0] for cell in self._cells)
+
+
+class BatchedCounter:
+    """
+    Thread-local pending count, added to the shared total every `batch` increments.
+
+    Call flush() at the end of each writer thread so nothing is left pending.
+    """
+
+    def __init__(self, batch=BATCH_SIZE):
+        self.batch = batch
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def increment(self, n=1):
+        pending = getattr(self._local, 'pending', 0) + n
+        if pending >= self.batch:
+            with self._lock:
+                self._value += pending
+            pending = 0
+        self._local.pending = pending
+
+    def flush(self):
+        pending = getattr(self._local, 'pending', 0)
+        if pending:
+            with self._lock:
+                self._value += pending
+            self._local.pending = 0
+
+    def value(self):
+        with self._lock:
+            return self._value
+
+
+THREAD_COUNTERS = {
+    'locked': LockedCounter,
+    'striped': StripedCounter,
+    'thread-local': ThreadLocalCounter,
+    'batched': BatchedCounter,
+}
+
+
+# =============================================================================
+# Process counters
+# =============================================================================
+class SharedValueCounter:
+    """One shared int64, locked on every increment (process version of LockedCounter)."""
+
+    def __init__(self, n_processes=None):
+        self._value = mp.Value('q', 0)
+
+    def increment(self, n=1, slot=None):
+        with self._value.get_lock():
+            self._value.value += n
+
+    def value(self):
+        with self._value.get_lock():
+            return self._value.value
+
+
+class ProcessPartialCounter:
+    """
+    One int64 slot per process; process `slot` only ever writes its own slot.
+
+    Increments are lock-free (no other process writes the slot); value()
+    sums every slot and is exact once the writers have finished.
+    """
+
+    def __init__(self, n_processes):
+        self._slots = mp.Array('q', n_processes, lock=False)
+
+    def increment(self, n=1, slot=0):
+        self._slots[slot] += n
+
+    def value(self):
+        return sum(self._slots)
+
+
+PROCESS_COUNTERS = {
+    'mp.Value': SharedValueCounter,
+    'per-process': ProcessPartialCounter,
+}
+
+
+# =============================================================================
+# Contention benchmark
+# =============================================================================
+def _thread_worker(counter, n_increments):
+    increment = counter.increment
+    for _ in range(n_increments):
+        increment()
+    if hasattr(counter, 'flush'):
+        counter.flush()
+
+
+def bench_threads(name, n_threads, n_increments=N_INCREMENTS):
+    """
+    Run n_threads writers on a fresh counter.
+
+    Returns:
+        dict: exact (bool), elapsed seconds, updates per second
+    """
+    counter = THREAD_COUNTERS[name]()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        futures = [executor.submit(_thread_worker, counter, n_increments) for _ in range(n_threads)]
+        for f in futures:
+            f.result()
+    elapsed = time.perf_counter() - start
+    total = n_threads * n_increments
+    result = {'exact': counter.value() == total, 'elapsed': elapsed, 'rate': total / elapsed}
+    if hasattr(counter, 'stripes_used'):
+        result['stripes'] = counter.stripes_used()
+    return result
+
+
+def _process_worker(counter, slot, n_increments):
+    increment = counter.increment
+    for _ in range(n_increments):
+        increment(1, slot)
+
+
+def bench_processes(name, n_processes, n_increments=N_INCREMENTS):
+    """Same as bench_threads, with n_processes writer processes."""
+    counter = PROCESS_COUNTERS[name](n_processes)
+    procs = [mp.Process(target=_process_worker, args=(counter, slot, n_increments))
+             for slot in range(n_processes)]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+    total = n_processes * n_increments
+    return {'exact': counter.value() == total, 'elapsed': elapsed, 'rate': total / elapsed}
+
+
+def print_sweep(title, names, counts, bench, unit):
+    print("=" * 60)
+    print(title)
+    print("=" * 60)
+    print(f"  {'counter':<14}" + "".join(f"{f'{n} {unit}':>14}" for n in counts) + "   exact")
+    for name in names:
+        results = [bench(name, n) for n in counts]
+        rates = "".join(f"{r['rate'] / 1e6:>10.2f} M/s" for r in results)
+        print(f"  {name:<14}{rates}   {all(r['exact'] for r in results)}")
+        if 'stripes' in results[0]:
+            stripes = "".join(f"{r['stripes']:>14}" for r in results)
+            print(f"  {'  stripes used':<14}{stripes}")
+    print()
+
+
+# =============================================================================
+# Benchmark scenarios (see benchmark.py)
+# =============================================================================
+@scenario()
+def threads_locked():
+    bench_threads('locked', 4)
+
+@scenario()
+def threads_thread_local():
+    bench_threads('thread-local', 4)
+
+@scenario()
+def processes_shared_value():
+    bench_processes('mp.Value', 4)
+
+@scenario()
+def processes_per_process():
+    bench_processes('per-process', 4)
+
+
+# =============================================================================
+# Main
+# =============================================================================
+def main():
+    print(f"Each writer performs {N_INCREMENTS:,} increments (updates per second, higher is better)\n")
+    print_sweep("Thread counters", THREAD_COUNTERS, THREAD_COUNTS, bench_threads, "thr")
+    print_sweep("Process counters", PROCESS_COUNTERS, PROCESS_COUNTS, bench_processes, "proc")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+Ch2.2c (helper) - Adaptive Batching: Auto-tuned chunksize for Tiny Tasks
+
+The fix for `tiny_tasks_example.py`. `executor.map(func, items)` defaults to
+chunksize=1, so every trivial call pays a full pickle + IPC round trip.
+`AdaptiveBatchExecutor` measures before it dispatches:
+
+1. Run a small sample of the items inline and time the per-item cost
+2. Time a no-op round trip to the pool (per-batch dispatch overhead)
+3. Pick the smallest chunksize that keeps overhead / batch work under
+   `target_overhead`, and estimate the parallel time with that plan
+4. If the pool cannot beat the inline loop, just run inline
+
+Batch kernels (`map_batches`) take a whole NumPy slice per call, so the
+per-call overhead is paid once per batch instead of once per element.
+
+操作說明：
+uv run python ch2_native_tools/multi_processing/adaptive_map.py
+"""
+import math
+import os
+import time
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# --- Tuning Configuration ---
+TARGET_OVERHEAD = 0.05     # dispatch overhead as a fraction of each batch's work
+SAMPLE_SECONDS = 0.005     # stop sampling once this much work has been timed
+MAX_SAMPLE = 1024          # never sample more than this many items/elements
+BATCHES_PER_WORKER = 4     # keep at least this many batches per worker for balance
+POOL_STARTUP_SECONDS = 0.05  # assumed cost of starting the pool, before it exists
+PING_ROUNDS = 5
+
+
+def _noop(payload=None):
+    return None
+
+
+def _apply_kernel(kernel, batch):
+    return kernel(batch)
+
+
+class AdaptiveBatchExecutor:
+    """
+    Process pool whose map() decides chunksize (or inline) from measurements.
+
+    Usage:
+        with AdaptiveBatchExecutor(max_workers=4) as executor:
+            results = executor.map(tiny_task, range(20_000))
+            doubled = executor.map_batches(double_batch, array)  # double_batch(a) -> a * 2
+            print(executor.last_plan)
+    """
+
+    def __init__(self, max_workers=None, target_overhead=TARGET_OVERHEAD):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # More workers than cores do not run in parallel, so plan with the smaller number
+        self.parallelism = min(self.max_workers, os.cpu_count() or 1)
+        self.target_overhead = target_overhead
+        self.last_plan = None
+        self._pool = None
+        self._dispatch_seconds = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+        return False
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    # --- Measurements ---
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._pool.submit(_noop).result()  # start the workers
+        return self._pool
+
+    def _round_trip(self, payload=None):
+        """Median seconds for one submit -> result round trip."""
+        pool = self._get_pool()
+        times = []
+        for _ in range(PING_ROUNDS):
+            start = time.perf_counter()
+            pool.submit(_noop, payload).result()
+            times.append(time.perf_counter() - start)
+        return sorted(times)[len(times) // 2]
+
+    def dispatch_seconds(self):
+        """Per-batch overhead of the pool (measured once, then cached)."""
+        if self._dispatch_seconds is None:
+            self._dispatch_seconds = self._round_trip()
+        return self._dispatch_seconds
+
+    @staticmethod
+    def _sample(run, n):
+        """
+        Time run(k) on a doubling sample size until SAMPLE_SECONDS is reached.
+
+        Returns:
+            tuple: (items sampled, seconds per item, list of sample outputs)
+        """
+        done, elapsed, k, outputs = 0, 0.0, 1, []
+        while done < n and done < MAX_SAMPLE and elapsed < SAMPLE_SECONDS:
+            k = min(k, n - done, MAX_SAMPLE - done)
+            start = time.perf_counter()
+            outputs.append(run(done, done + k))
+            elapsed += time.perf_counter() - start
+            done += k
+            k *= 2
+        return done, elapsed / max(done, 1), outputs
+
+    def _plan(self, n_rest, per_item, transfer_per_item=0.0):
+        """
+        Choose 'inline' or 'pool' + batch size for n_rest remaining items.
+
+        Parallel estimate: startup + (n * (compute + transfer) + n_batches * dispatch) / workers
+        """
+        sequential = n_rest * per_item
+        startup = 0.0 if self._pool is not None else POOL_STARTUP_SECONDS
+        plan = {'mode': 'inline', 'n_items': n_rest, 'per_item_s': per_item,
+                'transfer_per_item_s': transfer_per_item, 'chunksize': n_rest,
+                'dispatch_s': self._dispatch_seconds, 'est_sequential_s': sequential,
+                'est_parallel_s': None}
+        if n_rest == 0 or self.parallelism == 1 or sequential < startup:
+            return plan
+
+        dispatch = self.dispatch_seconds()
+        wanted = math.ceil(dispatch / (self.target_overhead * max(per_item, 1e-9)))
+        balanced = math.ceil(n_rest / (self.parallelism * BATCHES_PER_WORKER))
+        chunksize = max(1, min(wanted, balanced))
+        n_batches = math.ceil(n_rest / chunksize)
+        parallel = startup + (n_rest * (per_item + transfer_per_item)
+                              + n_batches * dispatch) / self.parallelism
+        plan.update(dispatch_s=dispatch, est_parallel_s=parallel)
+        if parallel < sequential:
+            plan.update(mode='pool', chunksize=chunksize)
+        return plan
+
+    # --- Public API ---
+    def map(self, func, items):
+        """Ordered [func(x) for x in items], inline or in tuned chunks."""
+        if not isinstance(items, Sequence):
+            items = list(items)
+        n_sampled, per_item, outputs = self._sample(
+            lambda lo, hi: [func(x) for x in items[lo:hi]], len(items))
+        results = [r for batch in outputs for r in batch]
+        rest = items[n_sampled:]
+
+        plan = self._plan(len(rest), per_item)
+        plan['n_sampled'] = n_sampled
+        self.last_plan = plan
+        if plan['mode'] == 'inline':
+            results += [func(x) for x in rest]
+        else:
+            results.extend(self._get_pool().map(func, rest, chunksize=plan['chunksize']))
+        return results
+
+    def map_batches(self, kernel, array):
+        """
+        Apply a batch kernel (ndarray slice -> ndarray) over array's first axis.
+
+        Returns:
+            ndarray: Concatenated kernel outputs, in order
+        """
+        n = len(array)
+        n_sampled, per_elem, outputs = self._sample(lambda lo, hi: kernel(array[lo:hi]), n)
+        rest = array[n_sampled:]
+
+        transfer = 0.0
+        if len(rest) and self.parallelism > 1 and n * per_elem >= POOL_STARTUP_SECONDS:
+            # Batches are pickled into the worker: measure the cost per element
+            probe = array[:MAX_SAMPLE]
+            transfer = max(0.0, self._round_trip(probe) - self.dispatch_seconds()) / len(probe)
+
+        plan = self._plan(len(rest), per_elem, transfer)
+        plan['n_sampled'] = n_sampled
+        self.last_plan = plan
+        if plan['mode'] == 'inline':
+            outputs.append(kernel(rest))
+        else:
+            size = plan['chunksize']
+            futures = [self._get_pool().submit(_apply_kernel, kernel, rest[lo:lo + size])
+                       for lo in range(0, len(rest), size)]
+            outputs.extend(f.result() for f in futures)
+        return np.concatenate(outputs) if outputs else kernel(array[:0])
+
+
+def format_plan(plan):
+    """One-line description of an adaptive map plan."""
+    text = (f"mode={plan['mode']}, sampled={plan['n_sampled']:,}, "
+            f"per-item={plan['per_item_s'] * 1e6:.3f}us")
+    if plan['dispatch_s'] is not None:
+        text += f", dispatch={plan['dispatch_s'] * 1e3:.3f}ms"
+    if plan['mode'] == 'pool':
+        text += f", chunksize={plan['chunksize']:,}"
+    if plan['est_parallel_s'] is not None:
+        text += (f", est. sequential={plan['est_sequential_s']:.4f}s"
+                 f" vs parallel={plan['est_parallel_s']:.4f}s")
+    return text
+
+
+# =============================================================================
+# Main: quick self-check
+# =============================================================================
+def _slow_square(x):
+    return sum(i * i for i in range(2_000)) + x
+
+
+def main():
+    with AdaptiveBatchExecutor(max_workers=4) as executor:
+        for title, func, items in [("tiny (abs)", abs, range(20_000)),
+                                   ("heavier (~100us each)", _slow_square, range(20_000))]:
+            start = time.perf_counter()
+            executor.map(func, items)
+            print(f"{title:<24} {time.perf_counter() - start:.4f}s  [{format_plan(executor.last_plan)}]")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,12 +7,28 @@ highest range will take the longest, causing other workers to sit idle.
 
 操作說明：
 uv run python ch2_native_tools/multi_processing/load_balancing_example.py
+uv run python ch2_native_tools/multi_processing/load_balancing_example.py --engine sieve
+
+修正版 (cost-aware scheduling, 見 range_scheduler.py)：
+uv run python ch2_native_tools/multi_processing/load_balancing_example.py --strategy guided
+    --strategy static|cost|guided|queue
 """
 import time
-from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
 import sys
 import os
 
+import range_scheduler
+from pool_registry import get_pool
+
+# prime_engine lives with the Ch1 examples
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "ch1_basics"))
+import prime_engine
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from benchkit import scenario
+
 # --- Demo Configuration ---
 N_WORKERS = 4
 MAX_NUMBER = 1_400_000 # The total range to search for primes
@@ -22,22 +38,26 @@ def find_primes_in_range(args):
     """
     Finds all primes within a given (start, end) range.
     """
-    start_range, end_range, start_time = args
+    start_range, end_range, start_time, engine = args
     pid = os.getpid()
     
     print(f"  [PID: {pid}] Worker starting task: find_primes(from {start_range:,} to {end_range:,})...")
     
-    primes_count = 0
-    for n in range(start_range, end_range):
-        if n < 2:
-            continue
-        is_prime = True
-        for i in range(2, int(n**0.5) + 1):
-            if n % i == 0:
-                is_prime = False
-                break
-        if is_prime:
-            primes_count += 1
+    if engine == 'sieve':
+        # Already inside a worker process: sieve this range without a nested pool
+        primes_count = prime_engine.count_primes_in_range(start_range, end_range, engine='sieve', n_workers=1)
+    else:
+        primes_count = 0
+        for n in range(start_range, end_range):
+            if n < 2:
+                continue
+            is_prime = True
+            for i in range(2, int(n**0.5) + 1):
+                if n % i == 0:
+                    is_prime = False
+                    break
+            if is_prime:
+                primes_count += 1
             
     elapsed_total = time.time() - start_time
     # Added separator line to make this print statement stand out
@@ -45,16 +65,65 @@ def find_primes_in_range(args):
     return primes_count
 
 # --- Execution Runner ---
-def run_multiprocessing(tasks):
+def run_multiprocessing(tasks, engine='trial'):
     """Runs the prime search tasks using a process pool."""
     start_time = time.time()
     # Package the start time with each task for timestamping
-    tasks_with_time = [(start, end, start_time) for start, end in tasks]
-    with ProcessPoolExecutor(max_workers=N_WORKERS) as executor:
-        return list(executor.map(find_primes_in_range, tasks_with_time))
+    tasks_with_time = [(start, end, start_time, engine) for start, end in tasks]
+    executor = get_pool(N_WORKERS, preload=('numpy',))
+    return list(executor.map(find_primes_in_range, tasks_with_time))
+
+# --- Solution: Cost-aware Scheduling ---
+def demo_scheduled(strategy, engine):
+    """Runs the same prime search through range_scheduler and prints the worker timeline."""
+    print("=" * 60)
+    print(f"Demo: Load Balancing with the '{strategy}' Range Scheduler")
+    print("=" * 60)
+
+    task_fn = partial(prime_engine.count_primes_in_range, engine=engine, n_workers=1)
+    run = range_scheduler.schedule_range(task_fn, 0, MAX_NUMBER, N_WORKERS, strategy)
+
+    print(f"Total range to search: 0 to {MAX_NUMBER:,}")
+    print(f"Strategy '{strategy}' produced {len(run['chunks'])} chunks for {N_WORKERS} workers")
+    print(f"Found {sum(run['results']):,} primes (engine: {engine})\n")
+
+    print("--- Worker Timeline ('#' busy, '.' idle) ---")
+    range_scheduler.print_timeline(run['timeline'])
+
+    print("\n--- Summary ---")
+    print(f"max/mean worker busy time: {run['timeline']['imbalance']:.2f} (1.00 = perfectly balanced)")
+    print("Chunks are sized by estimated cost (~sqrt(n) per number) or handed out")
+    print("dynamically, so no single worker is left holding the most expensive range.")
+
+# --- Benchmark scenarios (see benchmark.py) ---
+def _bench_scheduled(strategy):
+    task_fn = partial(prime_engine.count_primes_in_range, engine='trial', n_workers=1)
+    range_scheduler.schedule_range(task_fn, 0, MAX_NUMBER, N_WORKERS, strategy)
+
+@scenario(warmup=0)
+def scheduled_static():
+    _bench_scheduled('static')
+
+@scenario(warmup=0)
+def scheduled_cost():
+    _bench_scheduled('cost')
+
+@scenario(warmup=0)
+def scheduled_guided():
+    _bench_scheduled('guided')
+
+@scenario(warmup=0)
+def scheduled_queue():
+    _bench_scheduled('queue')
 
 # --- Main Demo ---
 def main():
+    engine, args = prime_engine.pop_engine_arg(sys.argv[1:])
+    strategy, _ = range_scheduler.pop_strategy_arg(args)
+    if strategy is not None:
+        demo_scheduled(strategy, engine)
+        return
+
     print("=" * 60)
     print("Demo: Poor Load Balancing by Splitting a Single Problem")
     print("=" * 60)
@@ -74,9 +143,9 @@ def main():
     print("")
 
     # --- Run the demo ---
-    print(f"--- Running {len(workloads)} chunks (Multiprocessing with {N_WORKERS} workers) ---")
+    print(f"--- Running {len(workloads)} chunks (Multiprocessing with {N_WORKERS} workers, engine: {engine}) ---")
     start = time.time()
-    run_multiprocessing(workloads)
+    run_multiprocessing(workloads, engine)
     elapsed_multi = time.time() - start
     print(f"\nTotal Time: {elapsed_multi:.2f} seconds\n")
     
@@ -0,0 +1,208 @@
+"""
+Ch2.2b (helper) - Memory Budget: Shared Datasets + Admission Control
+
+The fix for `memory_overhead_example.py`, in two parts:
+
+1. Shared read-only dataset
+   The data is written ONCE to a `.npy` file and every worker opens it with
+   `np.load(path, mmap_mode='r')`. The pages live in the OS page cache and
+   are shared by all processes, so N workers cost ~1 copy, not N copies.
+
+2. Admission control
+   `MemoryBudgetExecutor` wraps a ProcessPoolExecutor. Each submit declares
+   how much memory the task will need; if the projected total
+   (baseline + running/queued reservations + new task) would exceed the
+   budget, the task waits for memory to be released, or is refused with
+   `MemoryBudgetExceeded` (when block=False, or if it could never fit).
+
+操作說明：
+uv run python ch2_native_tools/multi_processing/memory_budget.py
+"""
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import psutil
+
+# --- Configuration ---
+WRITE_CHUNK_ELEMENTS = 16_000_000  # elements written per step when creating a dataset (128 MB of float64)
+READ_CHUNK_ELEMENTS = 16_000_000   # elements scanned per step by workers
+
+GB = 1024 ** 3
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """Raised when a task's projected memory does not fit in the budget."""
+
+
+# =============================================================================
+# Shared read-only dataset
+# =============================================================================
+def create_memmap_dataset(path, n_elements, dtype=np.float64, seed=0):
+    """
+    Write a random dataset to `path` (.npy) without holding it all in RAM.
+
+    Returns:
+        str: The dataset path, which is all a worker needs to open it
+    """
+    rng = np.random.default_rng(seed)
+    data = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(n_elements,))
+    for lo in range(0, n_elements, WRITE_CHUNK_ELEMENTS):
+        hi = min(lo + WRITE_CHUNK_ELEMENTS, n_elements)
+        data[lo:hi] = rng.random(hi - lo)
+    data.flush()
+    del data
+    return str(path)
+
+
+def open_readonly(path):
+    """Attach to a dataset read-only; pages are shared through the page cache."""
+    return np.load(path, mmap_mode='r')
+
+
+def chunked_mean(path):
+    """Worker-side reduction that touches every page without copying the data."""
+    data = open_readonly(path)
+    total = 0.0
+    for lo in range(0, len(data), READ_CHUNK_ELEMENTS):
+        total += float(np.sum(data[lo:lo + READ_CHUNK_ELEMENTS]))
+    return total / len(data)
+
+
+# =============================================================================
+# Admission control
+# =============================================================================
+def process_tree_memory(process=None, metric='rss'):
+    """
+    Bytes used by a process and all its children.
+
+    metric='rss' double-counts shared pages; 'pss' splits them between the
+    processes that map them, 'uss' counts only private pages (Linux only).
+    """
+    process = process or psutil.Process(os.getpid())
+    total = 0
+    for proc in [process] + process.children(recursive=True):
+        try:
+            if metric == 'rss':
+                total += proc.memory_info().rss
+            else:
+                total += getattr(proc.memory_full_info(), metric)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return total
+
+
+class MemoryBudgetExecutor:
+    """
+    ProcessPoolExecutor that only admits tasks whose memory fits the budget.
+
+    Usage:
+        with MemoryBudgetExecutor(max_workers=4, budget_bytes=2 * GB) as executor:
+            future = executor.submit(fn, path, mem_bytes=64 * 1024 ** 2)
+
+    The projection is baseline_bytes + reserved + mem_bytes, where reserved is
+    the sum of mem_bytes of every task submitted and not yet finished.
+    """
+
+    def __init__(self, max_workers, budget_bytes, baseline_bytes=None):
+        self.max_workers = max_workers
+        self.budget_bytes = budget_bytes
+        # Memory that is already in use before any task runs (main process, shared data)
+        self.baseline_bytes = process_tree_memory() if baseline_bytes is None else baseline_bytes
+        self.reserved_bytes = 0
+        self.peak_projected_bytes = self.baseline_bytes
+        self.n_waited = 0
+        self.n_refused = 0
+        self._cond = threading.Condition()
+        self._pool = ProcessPoolExecutor(max_workers=max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+        return False
+
+    def projected_bytes(self, mem_bytes=0):
+        """Memory in use if a task needing mem_bytes were admitted now."""
+        return self.baseline_bytes + self.reserved_bytes + mem_bytes
+
+    def _release(self, mem_bytes):
+        with self._cond:
+            self.reserved_bytes -= mem_bytes
+            self._cond.notify_all()
+
+    def submit(self, fn, *args, mem_bytes=0, block=True, timeout=None, **kwargs):
+        """
+        Submit fn(*args, **kwargs) once mem_bytes fits in the budget.
+
+        Args:
+            mem_bytes: Memory the task will allocate while it runs
+            block: Wait for running tasks to free memory (True) or refuse now (False)
+            timeout: Seconds to wait before refusing (block=True only)
+
+        Raises:
+            MemoryBudgetExceeded: The task does not fit (now, or ever)
+        """
+        with self._cond:
+            if self.baseline_bytes + mem_bytes > self.budget_bytes:
+                self.n_refused += 1
+                raise MemoryBudgetExceeded(
+                    f"Task needs {mem_bytes / GB:.2f} GB; budget {self.budget_bytes / GB:.2f} GB "
+                    f"minus baseline {self.baseline_bytes / GB:.2f} GB can never fit it")
+            if self.projected_bytes(mem_bytes) > self.budget_bytes:
+                if not block:
+                    self.n_refused += 1
+                    raise MemoryBudgetExceeded(
+                        f"Projected {self.projected_bytes(mem_bytes) / GB:.2f} GB "
+                        f"exceeds budget {self.budget_bytes / GB:.2f} GB")
+                self.n_waited += 1
+                fits = self._cond.wait_for(
+                    lambda: self.projected_bytes(mem_bytes) <= self.budget_bytes, timeout)
+                if not fits:
+                    self.n_refused += 1
+                    raise MemoryBudgetExceeded(
+                        f"Timed out after {timeout}s waiting for {mem_bytes / GB:.2f} GB")
+            self.reserved_bytes += mem_bytes
+            self.peak_projected_bytes = max(self.peak_projected_bytes, self.projected_bytes())
+
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(mem_bytes)
+            raise
+        future.add_done_callback(lambda _: self._release(mem_bytes))
+        return future
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def report(self):
+        """One-line admission summary."""
+        return (f"budget {self.budget_bytes / GB:.2f} GB, "
+                f"peak projected {self.peak_projected_bytes / GB:.2f} GB, "
+                f"{self.n_waited} task(s) waited, {self.n_refused} refused")
+
+
+# =============================================================================
+# Main: quick self-check
+# =============================================================================
+def main():
+    n_elements = 25_000_000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = create_memmap_dataset(os.path.join(tmpdir, 'data.npy'), n_elements)
+        start = time.perf_counter()
+        with MemoryBudgetExecutor(max_workers=4, budget_bytes=2 * GB) as executor:
+            futures = [executor.submit(chunked_mean, path, mem_bytes=READ_CHUNK_ELEMENTS * 8)
+                       for _ in range(8)]
+            means = [f.result() for f in futures]
+            print(f"8 tasks over one shared {n_elements * 8 / GB:.2f} GB file: "
+                  f"mean={means[0]:.4f} in {time.perf_counter() - start:.2f}s")
+            print(f"Admission: {executor.report()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,37 +7,51 @@ refactored for clarity and reliability.
 
 操作說明：
 uv run python ch2_native_tools/multi_processing/memory_overhead_advanced_example.py
+
+修正版 (shared np.memmap + memory budget, 見 memory_budget.py)：
+uv run python ch2_native_tools/multi_processing/memory_overhead_example.py memmap
+
+Memory is sampled in the background at 50 Hz (RSS / USS / PSS, 見 memory_sampler.py)；
+加上 --csv timeline.csv 可匯出每個 process 的記憶體時間序列。
 """
 import time
 import numpy as np
 from concurrent.futures import ProcessPoolExecutor, as_completed
 import psutil
 import os
+import sys
+import tempfile
+from pathlib import Path
+
+from memory_budget import (GB, READ_CHUNK_ELEMENTS, MemoryBudgetExecutor, MemoryBudgetExceeded,
+                           create_memmap_dataset, open_readonly, process_tree_memory)
+from memory_sampler import MemorySampler
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from benchkit import time_it
 
 # --- Demo Configuration ---
 N_WORKERS = 2
 DATA_SIZE_GB = 1.0
+FLOAT64_BYTES = np.dtype(np.float64).itemsize  # GB is binary (GiB): 1 GB = GB // 8 elements
 WORKER_HOLD_TIME = 5      # How long each worker holds memory (seconds)
-MONITOR_WARM_UP_TIME = 2  # How long main waits before starting to monitor (seconds)
-MONITOR_DURATION = 3      # How long the monitoring lasts (seconds)
+SAMPLE_HZ = 50            # Background memory samples per second
+CSV_PATH = None           # Set with --csv PATH to export the memory timeline
+MEMORY_BUDGET_GB = 1.5    # Admission budget for the memmap demo (fits ~1 copy, not N)
 
-def print_total_memory(main_process, stage=""):
+def print_total_memory(main_process, stage="", metric="rss"):
     """
     Helper function to calculate and print the total memory usage of the 
     main process and all its children.
+
+    metric='rss' counts shared (memmap) pages once per process; use 'pss'
+    to split them between the processes that share them.
     """
-    total_rss = main_process.memory_info().rss
     children = main_process.children(recursive=True)
-    for child in children:
-        try:
-            total_rss += child.memory_info().rss
-        except psutil.NoSuchProcess:
-            continue
-            
-    total_rss_gb = total_rss / (1024 ** 3)
+    total_gb = process_tree_memory(main_process, metric) / GB
     # Changed "workers" to "child processes" for accuracy, as it includes the manager process.
-    print(f"[{stage}] Total Memory (Main + {len(children)} child processes): {total_rss_gb:.2f} GB")
-    return total_rss_gb
+    print(f"[{stage}] Total Memory {metric.upper()} (Main + {len(children)} child processes): {total_gb:.2f} GB")
+    return total_gb
 
 def process_data_in_memory(data_size_gb, sleep_duration):
     """
@@ -46,47 +60,123 @@ def process_data_in_memory(data_size_gb, sleep_duration):
     worker_pid = os.getpid()
     print(f"  Worker (PID: {worker_pid}) starting, will allocate {data_size_gb:.2f} GB...")
     # This allocation itself takes time
-    worker_data = np.random.rand(int(data_size_gb * 125_000_000))
+    worker_data = np.random.rand(int(data_size_gb * GB) // FLOAT64_BYTES)
     print(f"  Worker (PID: {worker_pid}) memory allocated, now holding for {sleep_duration}s...")
     time.sleep(sleep_duration) 
     print(f"  Worker (PID: {worker_pid}) finished.")
     return True
 
-def time_it(title, func_to_run, *args):
-    """Helper function to time and print the execution of a function."""
-    print(f"--- {title} ---")
-    start = time.time()
-    result = func_to_run(*args)
-    elapsed = time.time() - start
-    print(f"\nFinished in {elapsed:.2f} seconds.")
-    return result
+def process_data_memmap(path, sleep_duration):
+    """
+    Worker function that attaches to the shared dataset read-only and holds it.
+    """
+    worker_pid = os.getpid()
+    print(f"  Worker (PID: {worker_pid}) attaching to shared dataset {os.path.basename(path)} (read-only)...")
+    worker_data = open_readonly(path)
+    # Touch every page so the data is really resident, one chunk at a time
+    total = 0.0
+    for lo in range(0, len(worker_data), READ_CHUNK_ELEMENTS):
+        total += float(np.sum(worker_data[lo:lo + READ_CHUNK_ELEMENTS]))
+    print(f"  Worker (PID: {worker_pid}) data mapped (mean={total / len(worker_data):.4f}), now holding for {sleep_duration}s...")
+    time.sleep(sleep_duration)
+    print(f"  Worker (PID: {worker_pid}) finished.")
+    return True
+
+def monitor_memory(sampler, futures, metric="rss"):
+    """
+    Waits for futures while `sampler` polls the process tree in the background.
+    Returns the peak memory measured (GB) for `metric`.
+    """
+    print(f"\n--- Sampling memory at {SAMPLE_HZ} Hz in the background while workers run... ---")
+    for future in as_completed(futures):
+        future.result()
+    return sampler.peak(metric).bytes / GB
+
+def report_memory(sampler, metric):
+    """Prints peak RSS / USS / PSS and time-to-peak, and exports the timeline if requested."""
+    print(f"\n--- Memory timeline ({metric.upper()} is the headline number) ---")
+    print(sampler.format_summary())
+    if CSV_PATH:
+        print(f"Timeline written to {sampler.to_csv(CSV_PATH)}")
 
 def run_and_monitor_multiprocessing(main_process, data_size_gb):
     """
     Handles the logic of running multiprocessing tasks while monitoring memory.
     Returns the peak memory measured.
     """
-    peak_memory = 0
-    with ProcessPoolExecutor(max_workers=N_WORKERS) as executor:
-        futures = [executor.submit(process_data_in_memory, data_size_gb, WORKER_HOLD_TIME) for _ in range(N_WORKERS)]
-        
-        print(f"\n--- Main process waiting {MONITOR_WARM_UP_TIME}s for workers to start and allocate memory... ---")
-        time.sleep(MONITOR_WARM_UP_TIME)
-
-        print(f"\n--- Starting memory monitor for {MONITOR_DURATION}s... ---")
-        for i in range(MONITOR_DURATION):
-            current_memory = print_total_memory(main_process, f"Monitoring {i+1}/{MONITOR_DURATION}")
-            if current_memory > peak_memory:
-                peak_memory = current_memory
-            time.sleep(1)
-        
-        print("\n--- Monitoring finished, waiting for all tasks to complete... ---")
-        for future in as_completed(futures):
-            future.result()
-    
+    with MemorySampler(main_process, hz=SAMPLE_HZ) as sampler:
+        with ProcessPoolExecutor(max_workers=N_WORKERS) as executor:
+            futures = [executor.submit(process_data_in_memory, data_size_gb, WORKER_HOLD_TIME) for _ in range(N_WORKERS)]
+            peak_memory = monitor_memory(sampler, futures)
+    report_memory(sampler, "rss")
     return peak_memory
 
+def run_and_monitor_memmap(main_process, path, data_size_gb):
+    """
+    Runs the memmap workers under a memory budget while monitoring memory (PSS).
+    Returns the peak memory measured.
+    """
+    budget = int(MEMORY_BUDGET_GB * GB)
+    # The shared file is paid for once, up front, as part of the baseline
+    baseline = process_tree_memory(main_process) + int(data_size_gb * GB)
+    with MemorySampler(main_process, hz=SAMPLE_HZ) as sampler, \
+            MemoryBudgetExecutor(max_workers=N_WORKERS, budget_bytes=budget, baseline_bytes=baseline) as executor:
+        # Per-task private memory is one read chunk, not a copy of the data
+        futures = [executor.submit(process_data_memmap, path, WORKER_HOLD_TIME, mem_bytes=READ_CHUNK_ELEMENTS * 8)
+                   for _ in range(N_WORKERS)]
+
+        # The old approach (one private copy per worker) is refused up front
+        try:
+            executor.submit(process_data_in_memory, data_size_gb, WORKER_HOLD_TIME,
+                            mem_bytes=int(data_size_gb * GB), block=False)
+        except MemoryBudgetExceeded as e:
+            print(f"\n[Admission] Refused an in-memory copy task: {e}")
+
+        peak_memory = monitor_memory(sampler, futures, metric="pss")
+        print(f"\n[Admission] {executor.report()}")
+    report_memory(sampler, "pss")
+    return peak_memory
+
+def demo_memmap():
+    print("=" * 60)
+    print("Demo: Shared np.memmap Dataset + Memory Budget")
+    print("=" * 60)
+
+    main_process = psutil.Process(os.getpid())
+    with tempfile.TemporaryDirectory() as tmpdir:
+        print(f"Writing {DATA_SIZE_GB:.2f} GB dataset once to {tmpdir}...")
+        path = create_memmap_dataset(os.path.join(tmpdir, "shared_data.npy"), int(DATA_SIZE_GB * GB) // FLOAT64_BYTES)
+
+        print_total_memory(main_process, "Initial Baseline", "pss")
+        print(f"\nWill start {N_WORKERS} worker processes, all attached to ONE {DATA_SIZE_GB:.2f} GB file.")
+        print(f"Memory budget: {MEMORY_BUDGET_GB:.2f} GB")
+
+        peak_memory = time_it(
+            "Running Multiprocessing (memmap) and Monitoring Memory",
+            run_and_monitor_memmap,
+            main_process,
+            path,
+            DATA_SIZE_GB
+        ).result
+
+    print("\n--- Summary ---")
+    print(f"Measured Peak Memory (PSS): {peak_memory:.2f} GB")
+    print(f"Reason: All {N_WORKERS} workers mapped the same read-only file. Its pages live once")
+    print("      in the OS page cache and are shared, so total memory stays close to")
+    print(f"      ONE {DATA_SIZE_GB:.2f} GB copy no matter how many workers run.")
+
 def main():
+    global CSV_PATH
+    args = sys.argv[1:]
+    if '--csv' in args:
+        i = args.index('--csv')
+        CSV_PATH = args[i + 1]
+        del args[i:i + 2]
+
+    if args and args[0] == 'memmap':
+        demo_memmap()
+        return
+
     print("=" * 60)
     print("Demo: Memory Overhead (Advanced Measurement)")
     print("=" * 60)
@@ -103,11 +193,11 @@ def main():
         run_and_monitor_multiprocessing,
         main_process,
         DATA_SIZE_GB
-    )
+    ).result
     
     print("\n--- Summary ---")
     print("Result: The total memory usage of all processes was measured programmatically.")
-    print(f"Measured Peak Memory: {peak_memory:.2f} GB")
+    print(f"Measured Peak Memory (RSS, summed over processes): {peak_memory:.2f} GB")
     print("Reason: The main process started 2 worker processes. Each worker created its own")
     print(f"      independent {DATA_SIZE_GB:.2f} GB copy of the data in its own memory space,")
     print("      causing the total memory usage to spike significantly.")
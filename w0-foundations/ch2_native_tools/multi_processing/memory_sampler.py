@@ -0,0 +1,216 @@
+"""
+Ch2.2b (helper) - Memory Sampler: Process-tree RSS / USS / PSS Timeline
+
+`memory_overhead_example.py` used to sleep in the main thread and print the
+summed RSS once a second. That misses short peaks and double-counts shared
+(copy-on-write, memmap) pages. `MemorySampler` polls the whole process tree
+from a background thread at `hz` samples per second and records, per process:
+
+- rss: resident pages (shared pages counted once per process)
+- uss: pages private to the process (what killing it would free)
+- pss: shared pages split between the processes that map them; summing PSS
+       over the tree gives the real footprint
+
+Usage:
+    with MemorySampler(hz=50) as sampler:
+        run_workers()
+    print(sampler.format_summary())
+    sampler.to_csv("timeline.csv")
+
+    @MemorySampler(hz=50)          # or as a decorator: samples every call
+    def run_workers(): ...
+
+操作說明：
+uv run python ch2_native_tools/multi_processing/memory_sampler.py
+"""
+import csv
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import psutil
+
+# --- Sampler Configuration ---
+DEFAULT_HZ = 50
+METRICS = ('rss', 'uss', 'pss')
+
+GB = 1024 ** 3
+
+
+class Sample(NamedTuple):
+    t: float      # seconds since the sampler started
+    pid: int
+    rss: int      # bytes
+    uss: int
+    pss: int
+
+
+class Peak(NamedTuple):
+    bytes: int    # peak of the tree total
+    t: float      # seconds since the sampler started (time-to-peak)
+
+
+def _read(proc):
+    """(rss, uss, pss) of one process; uss/pss fall back to rss where unavailable."""
+    try:
+        info = proc.memory_full_info()
+        return info.rss, getattr(info, 'uss', info.rss), getattr(info, 'pss', info.rss)
+    except psutil.AccessDenied:
+        rss = proc.memory_info().rss
+        return rss, rss, rss
+
+
+class MemorySampler:
+    """
+    Background sampler of a process and all its (recursive) children.
+
+    Samples are kept in memory: at 50 Hz with 5 processes that is 250 rows
+    per second, fine for demo-length runs.
+    """
+
+    def __init__(self, process=None, hz=DEFAULT_HZ):
+        self.process = process or psutil.Process(os.getpid())
+        self.interval = 1.0 / hz
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._t0 = None
+        self.duration = 0.0
+
+    # --- Lifecycle ---
+    def start(self):
+        self.samples = []
+        self._stop.clear()
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._t0
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def __call__(self, func):
+        """Decorator: sample every call of func (the samples of the last call are kept)."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self:
+                return func(*args, **kwargs)
+        wrapper.sampler = self
+        return wrapper
+
+    def _run(self):
+        next_tick = time.perf_counter()
+        while True:
+            self.sample_once()
+            next_tick += self.interval
+            # Event.wait instead of sleep: stop() does not wait for the next tick
+            if self._stop.wait(max(0.0, next_tick - time.perf_counter())):
+                break
+        self.sample_once()  # final state, so a peak right before stop() is not missed
+
+    def sample_once(self):
+        t = time.perf_counter() - self._t0
+        try:
+            procs = [self.process] + self.process.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        for proc in procs:
+            try:
+                self.samples.append(Sample(t, proc.pid, *_read(proc)))
+            except psutil.NoSuchProcess:
+                continue
+
+    # --- Results ---
+    def totals(self):
+        """
+        Tree totals per tick.
+
+        Returns:
+            list: (t, n_processes, rss, uss, pss) tuples, in time order
+        """
+        ticks = {}
+        for s in self.samples:
+            n, rss, uss, pss = ticks.get(s.t, (0, 0, 0, 0))
+            ticks[s.t] = (n + 1, rss + s.rss, uss + s.uss, pss + s.pss)
+        return [(t, *v) for t, v in sorted(ticks.items())]
+
+    def peak(self, metric='pss'):
+        """Peak tree total of one metric and when it happened."""
+        column = 2 + METRICS.index(metric)
+        best = max(self.totals(), key=lambda row: row[column], default=None)
+        return Peak(best[column], best[0]) if best else Peak(0, 0.0)
+
+    def process_peaks(self, metric='pss'):
+        """Peak bytes of each process that was ever seen: {pid: bytes}."""
+        peaks = {}
+        for s in self.samples:
+            peaks[s.pid] = max(peaks.get(s.pid, 0), getattr(s, metric))
+        return peaks
+
+    def achieved_hz(self):
+        n_ticks = len({s.t for s in self.samples})
+        return n_ticks / self.duration if self.duration else 0.0
+
+    def summary(self):
+        return {
+            'duration_s': self.duration,
+            'achieved_hz': self.achieved_hz(),
+            'n_processes': len({s.pid for s in self.samples}),
+            **{f'peak_{m}': self.peak(m)._asdict() for m in METRICS},
+        }
+
+    def format_summary(self):
+        lines = [f"{self.duration:.2f}s sampled at {self.achieved_hz():.0f} Hz, "
+                 f"{len({s.pid for s in self.samples})} process(es) seen"]
+        for m in METRICS:
+            p = self.peak(m)
+            lines.append(f"  peak {m.upper()}: {p.bytes / GB:6.2f} GB at t={p.t:.2f}s")
+        return "\n".join(lines)
+
+    def to_csv(self, path, per_process=True):
+        """Export the timeline: one row per process per tick, or tree totals per tick."""
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            if per_process:
+                writer.writerow(Sample._fields)
+                writer.writerows(self.samples)
+            else:
+                writer.writerow(('t', 'n_processes') + METRICS)
+                writer.writerows(self.totals())
+        return str(path)
+
+
+# =============================================================================
+# Main: quick self-check
+# =============================================================================
+def _allocate(n_bytes, hold):
+    data = np.ones(n_bytes // 8)
+    time.sleep(hold)
+    return data.nbytes
+
+
+def main():
+    size = GB // 4
+    with MemorySampler(hz=DEFAULT_HZ) as sampler:
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            list(executor.map(_allocate, [size, size], [0.5, 1.0]))
+    print(f"2 workers, {size / GB:.2f} GB private each:")
+    print(sampler.format_summary())
+
+
+if __name__ == '__main__':
+    main()
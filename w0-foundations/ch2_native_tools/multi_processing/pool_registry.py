@@ -0,0 +1,174 @@
+"""
+Ch2.2 (helper) - Pool Registry: Warm Process Pools and Start Methods
+
+Creating a `ProcessPoolExecutor` for every call pays interpreter startup
+and module imports every time. `get_pool()` keeps one warm pool per
+(start method, worker count, preload list) for the whole process, so only
+the first submission is cold. Pools are shut down at interpreter exit.
+
+Start methods:
+- fork:       copy the parent (fast, preload is imported in the parent and inherited)
+- spawn:      fresh interpreter per worker (slow, preload runs as initializer)
+- forkserver: workers are forked from a clean server process that imports
+              the preload list once (numpy, pandas), so each new worker
+              starts with them already loaded
+
+操作說明：
+uv run python ch2_native_tools/multi_processing/pool_registry.py
+"""
+import atexit
+import importlib
+import importlib.util
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# --- Registry Configuration ---
+START_METHODS = ('fork', 'spawn', 'forkserver')
+DEFAULT_PRELOAD = ('numpy', 'pandas')
+WARM_PINGS = 20
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def _importable(modules):
+    """Keep only the modules that are installed."""
+    return tuple(m for m in modules if importlib.util.find_spec(m) is not None)
+
+
+def _preload_modules(modules):
+    """Worker initializer: import the preload list once per worker."""
+    for name in modules:
+        importlib.import_module(name)
+
+
+def _ping(modules=()):
+    """Task used to measure startup: imports modules (no-op if preloaded)."""
+    _preload_modules(modules)
+    return os.getpid()
+
+
+def available_start_methods():
+    """START_METHODS supported on this platform."""
+    return [m for m in START_METHODS if m in mp.get_all_start_methods()]
+
+
+def _create_pool(max_workers, start_method, preload):
+    ctx = mp.get_context(start_method)
+    if start_method == 'forkserver':
+        # Only takes effect before the fork server starts (first forkserver pool)
+        ctx.set_forkserver_preload(list(preload))
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx)
+    if start_method == 'spawn' and preload:
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx,
+                                   initializer=_preload_modules, initargs=(preload,))
+    # fork: import in the parent once, every forked child inherits the modules
+    _preload_modules(preload)
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx)
+
+
+def get_pool(max_workers=None, start_method=None, preload=DEFAULT_PRELOAD):
+    """
+    Return a warm, shared ProcessPoolExecutor, creating it on first use.
+
+    Do not use the pool as a context manager (`with get_pool() as p:`), that
+    would shut it down for every other caller. Broken pools (a worker died)
+    are replaced transparently.
+
+    Args:
+        max_workers: Pool size (default: os.cpu_count())
+        start_method: 'fork', 'spawn' or 'forkserver' (default: platform default)
+        preload: Modules imported up front (fork: in the parent before forking)
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    start_method = start_method or mp.get_start_method()
+    preload = _importable(preload)
+    key = (start_method, max_workers, preload)
+    with _lock:
+        pool = _pools.get(key)
+        if pool is None or getattr(pool, '_broken', False):
+            pool = _create_pool(max_workers, start_method, preload)
+            _pools[key] = pool
+        return pool
+
+
+def shutdown_all(wait=True):
+    """Shut down and forget every registered pool."""
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+
+atexit.register(shutdown_all)
+
+
+def registry_info():
+    """Registered pools, for printing."""
+    with _lock:
+        return [{'start_method': m, 'max_workers': n, 'preload': p}
+                for m, n, p in _pools]
+
+
+# =============================================================================
+# Startup measurement
+# =============================================================================
+def measure_startup(start_method, max_workers=2, preload=DEFAULT_PRELOAD):
+    """
+    Time a fresh pool of each kind, end to end.
+
+    Returns:
+        dict: cold (create pool + first result with preload modules imported),
+              all_ready (every worker answered), warm (median round trip on
+              the warm pool), in seconds
+    """
+    preload = _importable(preload)
+    start = time.perf_counter()
+    pool = _create_pool(max_workers, start_method, preload)
+    try:
+        pool.submit(_ping, preload).result()
+        cold = time.perf_counter() - start
+        # Submitting max_workers pings at once forces every worker to exist
+        pids = {f.result() for f in [pool.submit(_ping, preload) for _ in range(max_workers)]}
+        all_ready = time.perf_counter() - start
+
+        warm = []
+        for _ in range(WARM_PINGS):
+            t0 = time.perf_counter()
+            pool.submit(_ping, preload).result()
+            warm.append(time.perf_counter() - t0)
+    finally:
+        pool.shutdown()
+    return {'start_method': start_method, 'cold': cold, 'all_ready': all_ready,
+            'warm': sorted(warm)[len(warm) // 2], 'n_pids': len(pids)}
+
+
+# =============================================================================
+# Main: startup cost per start method
+# =============================================================================
+def main():
+    max_workers = 4
+    preload = _importable(DEFAULT_PRELOAD)
+    print("=" * 60)
+    print(f"Pool startup per start method ({max_workers} workers, preload: {', '.join(preload) or 'none'})")
+    print("=" * 60)
+    print(f"  {'method':<11} {'first result':>13} {'all workers':>12} {'warm submit':>12}")
+    for method in available_start_methods():
+        r = measure_startup(method, max_workers, preload)
+        print(f"  {method:<11} {r['cold'] * 1e3:>11.1f}ms {r['all_ready'] * 1e3:>10.1f}ms "
+              f"{r['warm'] * 1e3:>10.3f}ms")
+
+    print("\n--- Registry reuse ---")
+    for i in range(3):
+        start = time.perf_counter()
+        get_pool(max_workers).submit(_ping).result()
+        print(f"  get_pool() call {i + 1}: {(time.perf_counter() - start) * 1e3:.2f}ms")
+    print("Only the first call pays for process startup; later calls reuse the warm pool.")
+
+
+if __name__ == '__main__':
+    main()
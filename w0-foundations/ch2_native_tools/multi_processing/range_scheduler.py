@@ -0,0 +1,296 @@
+"""
+Ch2.2d (helper) - Range Scheduler: Fixing Poor Load Balancing
+
+Reusable scheduler for splitting a skewed integer range [start, end) across
+a process pool. The cost of checking a number n by trial division grows with
+~sqrt(n), so equal-sized ranges leave the low-range workers idle.
+
+Strategies:
+- static: N equal ranges (the original demo, for comparison)
+- cost:   N ranges of equal *estimated cost*, using cost(n) ~ n**COST_EXPONENT
+- guided: guided self-scheduling, chunks shrink as the remaining cost shrinks
+- queue:  many small fixed-size chunks pulled from an in-flight work queue
+
+Every run records which worker ran which chunk and when, so the per-worker
+timeline (busy vs idle) and the max/mean busy-time ratio can be reported.
+
+操作說明：
+uv run python ch2_native_tools/multi_processing/range_scheduler.py
+"""
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from pathlib import Path
+
+# --- Scheduler Configuration ---
+STRATEGIES = ('static', 'cost', 'guided', 'queue')
+COST_EXPONENT = 0.5         # cost(n) ~ n ** COST_EXPONENT (trial division: sqrt(n))
+GUIDED_FACTOR = 2           # guided chunk = remaining cost / (GUIDED_FACTOR * n_workers)
+MIN_CHUNK = 2_000           # smallest chunk the guided strategy will emit
+QUEUE_CHUNKS_PER_WORKER = 16
+IN_FLIGHT_PER_WORKER = 2    # tasks queued per worker, so nobody waits on the main process
+
+
+# =============================================================================
+# Cost model
+# =============================================================================
+def cumulative_cost(x, exponent=COST_EXPONENT):
+    """Integral of n**exponent from 0 to x: estimated cost of checking [0, x)."""
+    return x ** (exponent + 1) / (exponent + 1)
+
+
+def inverse_cumulative_cost(cost, exponent=COST_EXPONENT):
+    """The x where cumulative_cost(x) == cost."""
+    return (cost * (exponent + 1)) ** (1 / (exponent + 1))
+
+
+def range_cost(start, end, exponent=COST_EXPONENT):
+    """Estimated cost of checking every number in [start, end)."""
+    return cumulative_cost(end, exponent) - cumulative_cost(start, exponent)
+
+
+def _cost_boundary(start, cost, exponent):
+    """End of the range starting at `start` whose estimated cost is `cost`."""
+    target = cumulative_cost(start, exponent) + cost
+    return math.ceil(inverse_cumulative_cost(target, exponent))
+
+
+# =============================================================================
+# Chunking strategies
+# =============================================================================
+def static_chunks(start, end, n_parts):
+    """Split [start, end) into n_parts ranges of (almost) equal length."""
+    size = -(-(end - start) // n_parts)
+    return [(lo, min(lo + size, end)) for lo in range(start, end, size)]
+
+
+def cost_chunks(start, end, n_parts, exponent=COST_EXPONENT):
+    """Split [start, end) into n_parts ranges of equal estimated cost."""
+    share = range_cost(start, end, exponent) / n_parts
+    chunks = []
+    lo = start
+    for i in range(n_parts):
+        hi = end if i == n_parts - 1 else min(_cost_boundary(lo, share, exponent), end)
+        if hi > lo:
+            chunks.append((lo, hi))
+        lo = hi
+    return chunks
+
+
+def guided_chunks(start, end, n_workers, exponent=COST_EXPONENT,
+                  factor=GUIDED_FACTOR, min_chunk=MIN_CHUNK):
+    """
+    Guided self-scheduling in cost units.
+
+    Each chunk takes 1 / (factor * n_workers) of the remaining estimated cost,
+    so early chunks are big (few scheduling round trips) and the last chunks
+    are small (the final worker to finish has little left to do).
+    """
+    chunks = []
+    lo = start
+    while lo < end:
+        share = range_cost(lo, end, exponent) / (factor * n_workers)
+        hi = min(max(_cost_boundary(lo, share, exponent), lo + min_chunk), end)
+        chunks.append((lo, hi))
+        lo = hi
+    return chunks
+
+
+def queue_chunks(start, end, chunk_size):
+    """Split [start, end) into fixed-size chunks for a dynamic work queue."""
+    return [(lo, min(lo + chunk_size, end)) for lo in range(start, end, chunk_size)]
+
+
+def make_chunks(strategy, start, end, n_workers):
+    """Build the chunk list for one of STRATEGIES."""
+    if strategy == 'static':
+        return static_chunks(start, end, n_workers)
+    if strategy == 'cost':
+        return cost_chunks(start, end, n_workers)
+    if strategy == 'guided':
+        return guided_chunks(start, end, n_workers)
+    if strategy == 'queue':
+        chunk_size = max(1, -(-(end - start) // (n_workers * QUEUE_CHUNKS_PER_WORKER)))
+        return queue_chunks(start, end, chunk_size)
+    raise ValueError(f"Unknown strategy {strategy!r}, expected one of {STRATEGIES}")
+
+
+# =============================================================================
+# Execution
+# =============================================================================
+def _timed_call(task_fn, lo, hi):
+    """Worker: run task_fn(lo, hi) and record who ran it and when."""
+    t0 = time.time()
+    result = task_fn(lo, hi)
+    t1 = time.time()
+    return result, os.getpid(), t0, t1
+
+
+def run_chunks(task_fn, chunks, n_workers, in_flight=IN_FLIGHT_PER_WORKER):
+    """
+    Run task_fn(lo, hi) for every chunk through an in-flight work queue.
+
+    At most n_workers * in_flight chunks are submitted at once; a new chunk is
+    submitted as soon as one finishes, so free workers always find work
+    waiting and chunks are handed out in list order.
+
+    Args:
+        task_fn: Pickle-able callable taking (lo, hi)
+        chunks: List of (lo, hi) ranges
+        n_workers: Process pool size
+        in_flight: Queued chunks per worker
+
+    Returns:
+        dict: results (in chunk order), per-chunk records, start and end time
+    """
+    results = [None] * len(chunks)
+    records = []
+    pending = {}
+    next_index = 0
+    start_time = time.time()
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        while next_index < len(chunks) or pending:
+            while next_index < len(chunks) and len(pending) < n_workers * in_flight:
+                lo, hi = chunks[next_index]
+                future = executor.submit(_timed_call, task_fn, lo, hi)
+                pending[future] = next_index
+                next_index += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                result, pid, t0, t1 = future.result()
+                results[index] = result
+                lo, hi = chunks[index]
+                records.append({'chunk': index, 'lo': lo, 'hi': hi,
+                                'pid': pid, 'start': t0, 'end': t1})
+    end_time = time.time()
+    return {'results': results, 'records': records,
+            'start_time': start_time, 'end_time': end_time}
+
+
+def schedule_range(task_fn, start, end, n_workers, strategy='guided'):
+    """
+    Split [start, end) with `strategy` and run it on n_workers processes.
+
+    Returns:
+        dict: run_chunks() output plus 'strategy', 'chunks' and 'timeline'
+    """
+    chunks = make_chunks(strategy, start, end, n_workers)
+    run = run_chunks(task_fn, chunks, n_workers)
+    run['strategy'] = strategy
+    run['chunks'] = chunks
+    run['timeline'] = build_timeline(run['records'], run['start_time'], run['end_time'], n_workers)
+    return run
+
+
+def pop_strategy_arg(argv, default=None):
+    """
+    Remove `--strategy NAME` / `--strategy=NAME` from argv.
+
+    Returns:
+        tuple: (strategy or default, remaining argv)
+    """
+    strategy = default
+    rest = []
+    args = iter(argv)
+    for arg in args:
+        if arg == '--strategy':
+            strategy = next(args, '')
+        elif arg.startswith('--strategy='):
+            strategy = arg.split('=', 1)[1]
+        else:
+            rest.append(arg)
+    if strategy != default and strategy not in STRATEGIES:
+        print(f"錯誤：未知的 strategy '{strategy}'。請使用 {' / '.join(STRATEGIES)}")
+        sys.exit(1)
+    return strategy, rest
+
+
+# =============================================================================
+# Timeline
+# =============================================================================
+def build_timeline(records, start_time, end_time, n_workers=None):
+    """
+    Summarize per-worker busy and idle time from chunk records.
+
+    Workers that ran no chunk leave no record; with n_workers they are
+    added as 'idle-<k>' entries with busy=0, so mean_busy and imbalance
+    cover the whole pool.
+
+    Returns:
+        dict: makespan, per-worker stats and the max/mean busy ratio
+    """
+    makespan = end_time - start_time
+    workers = {}
+    for rec in sorted(records, key=lambda r: r['start']):
+        w = workers.setdefault(rec['pid'], {'busy': 0.0, 'n_chunks': 0, 'spans': []})
+        w['busy'] += rec['end'] - rec['start']
+        w['n_chunks'] += 1
+        w['spans'].append((rec['start'] - start_time, rec['end'] - start_time))
+    for k in range(1, (n_workers or 0) - len(workers) + 1):
+        workers[f"idle-{k}"] = {'busy': 0.0, 'n_chunks': 0, 'spans': []}
+    for w in workers.values():
+        w['idle'] = makespan - w['busy']
+
+    busy = [w['busy'] for w in workers.values()]
+    mean_busy = sum(busy) / len(busy) if busy else 0.0
+    return {
+        'makespan': makespan,
+        'workers': workers,
+        'max_busy': max(busy, default=0.0),
+        'mean_busy': mean_busy,
+        'imbalance': max(busy) / mean_busy if mean_busy > 0 else 1.0,
+    }
+
+
+def print_timeline(timeline, width=50):
+    """Print one bar per worker: '#' busy, '.' idle."""
+    makespan = timeline['makespan'] or 1e-9
+    for i, (pid, w) in enumerate(sorted(timeline['workers'].items(), key=lambda kv: (isinstance(kv[0], str), str(kv[0]).rjust(12)))):
+        bar = ['.'] * width
+        for t0, t1 in w['spans']:
+            first = int(t0 / makespan * width)
+            last = max(first + 1, int(round(t1 / makespan * width)))
+            for j in range(first, min(last, width)):
+                bar[j] = '#'
+        print(f"  W{i:<2} [PID {str(pid):>7}] |{''.join(bar)}| "
+              f"busy {w['busy']:6.2f}s  idle {w['idle']:6.2f}s  chunks {w['n_chunks']}")
+    print(f"  Makespan: {timeline['makespan']:.2f}s   "
+          f"max/mean busy: {timeline['imbalance']:.2f}")
+
+
+# =============================================================================
+# Main: strategy sweep
+# =============================================================================
+def main():
+    # prime_engine lives with the Ch1 examples
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "ch1_basics"))
+    import prime_engine
+
+    max_number = int(sys.argv[1]) if len(sys.argv) > 1 else 1_400_000
+    task_fn = partial(prime_engine.count_primes_in_range, engine='trial')
+
+    print("=" * 60)
+    print(f"Range Scheduler: trial-division prime count over 0 to {max_number:,}")
+    print("=" * 60)
+    summary = []
+    for n_workers in (4, 8, 16):
+        for strategy in STRATEGIES:
+            print(f"\n--- {strategy} with {n_workers} workers ---")
+            run = schedule_range(task_fn, 0, max_number, n_workers, strategy)
+            print_timeline(run['timeline'])
+            summary.append((n_workers, strategy, len(run['chunks']),
+                            run['timeline']['makespan'], run['timeline']['imbalance'],
+                            sum(run['results'])))
+
+    print("\n--- Summary ---")
+    print(f"  {'workers':>7}  {'strategy':<8} {'chunks':>6} {'time':>8} {'max/mean':>9}  primes")
+    for n_workers, strategy, n_chunks, makespan, imbalance, count in summary:
+        print(f"  {n_workers:>7}  {strategy:<8} {n_chunks:>6} {makespan:>7.2f}s {imbalance:>9.2f}  {count:,}")
+
+
+if __name__ == '__main__':
+    main()
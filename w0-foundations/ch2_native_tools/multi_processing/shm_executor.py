@@ -0,0 +1,259 @@
+"""
+Ch2.2a (helper) - Shared Memory Executor: Zero-copy Array Transport
+
+The fix for `serialization_cost_example.py`: instead of pickling a large
+array into every task, publish it ONCE into `multiprocessing.shared_memory`
+and send workers only a small handle plus slice bounds.
+
+How the handle works (pickle protocol 5 out-of-band buffers):
+- `pickle.dumps(obj, protocol=5, buffer_callback=...)` splits an object into
+  a small in-band payload (shape, dtype, ...) and its large raw buffers
+- each raw buffer lives in its own shared memory segment
+- a worker attaches the segments and calls `pickle.loads(payload, buffers=...)`,
+  which rebuilds the ndarray directly on top of shared memory (no copy)
+
+Cleanup is deterministic: the process that publishes a segment owns it and
+unlinks it in `release()` / `shutdown()`, which also runs when the `with`
+block exits because a worker crashed (BrokenProcessPool). Workers only
+attach and close, they never unlink.
+
+操作說明：
+uv run python ch2_native_tools/multi_processing/shm_executor.py
+"""
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import NamedTuple
+
+import numpy as np
+
+# --- Executor Configuration ---
+CHUNKS_PER_WORKER = 2
+
+
+class SharedHandle(NamedTuple):
+    """Small, pickle-able reference to an object published in shared memory."""
+    payload: bytes   # protocol-5 pickle with the buffers left out-of-band
+    segments: tuple  # ((segment name, nbytes), ...), one per out-of-band buffer
+    length: int      # len() of the published object, used to plan slices
+
+
+# =============================================================================
+# Publish / attach
+# =============================================================================
+def _attach_segment(name):
+    """Open an existing segment without letting this process unlink it."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Before 3.13 attaching also registers the segment with the resource
+    # tracker. Pool workers share their parent's tracker, so this is a no-op
+    # and the segment is still unregistered exactly once, by the owner's unlink().
+    return shared_memory.SharedMemory(name=name)
+
+
+def _dumps(obj):
+    """Pickle obj with protocol 5, returning (payload, raw out-of-band buffers)."""
+    if isinstance(obj, np.ndarray):
+        obj = np.ascontiguousarray(obj)  # non-contiguous arrays would pickle in-band
+    buffers = []
+    payload = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    return payload, [b.raw() for b in buffers]
+
+
+def open_handle(handle, writable=False):
+    """
+    Rebuild the published object on top of its shared memory segments.
+
+    Returns:
+        tuple: (object, list of SharedMemory to close when done)
+
+    Drop every reference to the object (and views of it) before closing the
+    segments, otherwise `close()` raises BufferError.
+    """
+    segments = [_attach_segment(name) for name, _ in handle.segments]
+    buffers = []
+    for shm, (_, nbytes) in zip(segments, handle.segments):
+        view = shm.buf[:nbytes]
+        buffers.append(view if writable else view.toreadonly())
+    obj = pickle.loads(handle.payload, buffers=buffers)
+    return obj, segments
+
+
+def _close_segments(segments):
+    for shm in segments:
+        try:
+            shm.close()
+        except BufferError:
+            pass  # a view is still alive; the mapping is freed when it is collected
+
+
+def _apply_slice(func, handle, lo, hi):
+    """Worker: attach, run func on obj[lo:hi], detach. Only the result is pickled back."""
+    obj, segments = open_handle(handle)
+    try:
+        result = func(obj[lo:hi])
+        if isinstance(result, np.ndarray):
+            result = result.copy()  # never return a view into shared memory
+    finally:
+        del obj
+        _close_segments(segments)
+    return result
+
+
+def slice_bounds(length, n_chunks):
+    """Split range(length) into n_chunks contiguous (lo, hi) slices."""
+    n_chunks = max(1, min(n_chunks, length))
+    size = -(-length // n_chunks)
+    return [(lo, min(lo + size, length)) for lo in range(0, length, size)]
+
+
+# =============================================================================
+# Executor
+# =============================================================================
+class SharedMemoryExecutor:
+    """
+    ProcessPoolExecutor plus the shared memory segments it serves to workers.
+
+    Usage:
+        with SharedMemoryExecutor(max_workers=4) as executor:
+            handle = executor.publish(large_array)
+            total = executor.reduce(np.sum, handle)
+
+    Every segment created through this executor is unlinked on shutdown,
+    including when a worker crashes and the pool breaks.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._owned = {}  # segment name -> SharedMemory
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+        return False
+
+    # --- Publishing ---
+    def _create_segment(self, nbytes):
+        shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        self._owned[shm.name] = shm
+        return shm
+
+    def publish(self, obj):
+        """Copy obj's buffers into shared memory once and return its handle."""
+        payload, raw_buffers = _dumps(obj)
+        segments = []
+        for raw in raw_buffers:
+            shm = self._create_segment(raw.nbytes)
+            shm.buf[:raw.nbytes] = raw
+            segments.append((shm.name, raw.nbytes))
+        return SharedHandle(payload, tuple(segments), len(obj))
+
+    def empty(self, shape, dtype=np.float64):
+        """
+        Allocate an ndarray directly in shared memory (no copy at publish time).
+
+        Returns:
+            tuple: (handle, ndarray to fill in this process)
+        """
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        shm = self._create_segment(nbytes)
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        payload, _ = _dumps(array)
+        return SharedHandle(payload, ((shm.name, nbytes),), len(array)), array
+
+    def _release_segment(self, name):
+        shm = self._owned.pop(name, None)
+        if shm is None:
+            return
+        _close_segments([shm])
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def release(self, handle):
+        """Unlink the segments behind handle. Safe to call more than once."""
+        for name, _ in handle.segments:
+            self._release_segment(name)
+
+    # --- Running ---
+    def map_slices(self, func, handle, n_chunks=None):
+        """
+        Run func(obj[lo:hi]) for contiguous slices of the published object.
+
+        Returns:
+            list: per-slice results, in slice order
+        """
+        n_chunks = n_chunks or self.max_workers * CHUNKS_PER_WORKER
+        bounds = slice_bounds(handle.length, n_chunks)
+        futures = [self._pool.submit(_apply_slice, func, handle, lo, hi) for lo, hi in bounds]
+        return [f.result() for f in futures]
+
+    def reduce(self, func, handle, combine=None, n_chunks=None):
+        """
+        Chunked parallel reduction, e.g. reduce(np.sum, handle).
+
+        Each worker applies func to its slice; the partial results are then
+        combined with `combine` (default: func over the partials, which is
+        right for sum / min / max / prod).
+        """
+        partials = self.map_slices(func, handle, n_chunks)
+        if combine is None:
+            return func(np.asarray(partials))
+        return combine(partials)
+
+    def submit(self, fn, *args, **kwargs):
+        """Plain submit on the underlying pool (pass handles, not arrays)."""
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        """Stop the pool and unlink every segment this executor created."""
+        try:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+        finally:
+            for name in list(self._owned):
+                self._release_segment(name)
+
+
+def parallel_reduce(data, func=np.sum, max_workers=None, combine=None):
+    """One-shot helper: publish data, reduce it in parallel, clean up."""
+    with SharedMemoryExecutor(max_workers=max_workers) as executor:
+        handle = executor.publish(data)
+        return executor.reduce(func, handle, combine=combine)
+
+
+# =============================================================================
+# Main: quick self-check
+# =============================================================================
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 25_000_000
+    print("=" * 60)
+    print(f"Shared Memory Executor: np.sum over {n:,} float64 ({n * 8 / 1e9:.2f} GB)")
+    print("=" * 60)
+    with SharedMemoryExecutor(max_workers=4) as executor:
+        handle, array = executor.empty(n)
+        np.random.default_rng(0).random(out=array)
+
+        start = time.perf_counter()
+        expected = np.sum(array)
+        print(f"Sequential np.sum:       {time.perf_counter() - start:.4f}s")
+
+        executor.reduce(np.sum, handle)  # warm up the pool
+        start = time.perf_counter()
+        total = executor.reduce(np.sum, handle)
+        print(f"Shared memory reduce:    {time.perf_counter() - start:.4f}s")
+        print(f"Handle size sent per task: {len(pickle.dumps(handle))} bytes")
+        print(f"Results match: {np.isclose(total, expected)}")
+        del array
+    print("Segments released.")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,44 +6,102 @@ creating and managing processes is greater than the computation itself.
 
 操作說明：
 uv run python ch2_native_tools/multi_processing/tiny_tasks_example.py
+
+修正版 (adaptive chunksize / batch kernel, 見 adaptive_map.py)：
+uv run python ch2_native_tools/multi_processing/tiny_tasks_example.py adaptive
 """
-import time
-from concurrent.futures import ProcessPoolExecutor
 import sys
+from pathlib import Path
+
+import numpy as np
+
+from adaptive_map import AdaptiveBatchExecutor, format_plan
+from pool_registry import get_pool
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from benchkit import scenario, time_it
 
 # --- Demo Configuration ---
 N_WORKERS = 4
+N_TASKS = 20_000
 
 def tiny_task(n):
     """A trivial, instantly completed calculation."""
     return n * 2
 
+def tiny_task_batch(values):
+    """The same calculation as a batch kernel: one call per NumPy slice."""
+    return values * 2
+
 def run_sequentially(tasks):
     """Runs the tiny tasks in a simple for-loop."""
     for i in tasks:
         tiny_task(i)
 
 def run_multiprocessing(tasks):
-    """Runs the tiny tasks using a process pool."""
-    with ProcessPoolExecutor(max_workers=N_WORKERS) as executor:
-        # We must call list() to ensure all tasks are completed before returning.
-        list(executor.map(tiny_task, tasks))
-
-def time_it(title, func_to_run, *args):
-    """Helper function to time and print the execution of a function."""
-    print(f"--- {title} ---")
-    start = time.time()
-    func_to_run(*args)
-    elapsed = time.time() - start
-    print(f"Time: {elapsed:.4f} seconds\n")
-    return elapsed
+    """Runs the tiny tasks using a process pool (warm after the first call)."""
+    executor = get_pool(N_WORKERS, preload=())
+    # We must call list() to ensure all tasks are completed before returning.
+    list(executor.map(tiny_task, tasks))
+
+def run_adaptive(executor, tasks):
+    """Runs the tiny tasks through the adaptive executor (inline or tuned chunksize)."""
+    executor.map(tiny_task, tasks)
+
+def run_adaptive_batches(executor, values):
+    """Runs the batch kernel over a NumPy array through the adaptive executor."""
+    executor.map_batches(tiny_task_batch, values)
+
+def demo_adaptive():
+    print("=" * 60)
+    print("Demo: Adaptive Batching for Tiny Tasks")
+    print("=" * 60)
+
+    tasks = range(N_TASKS)
+
+    # 1. Time the sequential execution
+    elapsed_seq = time_it(
+        f"Executing {N_TASKS:,} tiny tasks (Sequentially)",
+        run_sequentially,
+        tasks
+    ).elapsed
+
+    with AdaptiveBatchExecutor(max_workers=N_WORKERS) as executor:
+        # 2. Adaptive map: samples the tasks, then picks a chunksize or runs inline
+        elapsed_adaptive = time_it(
+            f"Executing {N_TASKS:,} tiny tasks (Adaptive map, {N_WORKERS} workers)",
+            run_adaptive,
+            executor,
+            tasks
+        ).elapsed
+        print(f"Plan: {format_plan(executor.last_plan)}\n")
+
+        # 3. Batch kernel: one call per NumPy slice instead of one per number
+        elapsed_batch = time_it(
+            f"Executing {N_TASKS:,} tiny tasks (Adaptive batch kernel)",
+            run_adaptive_batches,
+            executor,
+            np.arange(N_TASKS)
+        ).elapsed
+        print(f"Plan: {format_plan(executor.last_plan)}\n")
+
+    # --- Summary ---
+    print("--- Summary ---")
+    print(f"Adaptive map:  {elapsed_adaptive / elapsed_seq:.2f}x the sequential time")
+    print(f"Batch kernel:  {elapsed_batch / elapsed_seq:.2f}x the sequential time")
+    print("Reason: The executor measured the per-task cost and the pool round trip first.")
+    print("        Tasks this small are not worth shipping one by one, so it batches them")
+    print("        (or stays inline) instead of paying a pickle round trip per call.")
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'adaptive':
+        demo_adaptive()
+        return
+
     print("=" * 60)
     print("Demo: Overhead of Tiny Tasks")
     print("=" * 60)
 
-    N_TASKS = 20_000
     tasks = range(N_TASKS)
 
     # 1. Time the sequential execution
@@ -51,14 +109,14 @@ def main():
         f"Executing {N_TASKS:,} tiny tasks (Sequentially)",
         run_sequentially,
         tasks
-    )
+    ).elapsed
 
     # 2. Time the multiprocessing execution
     elapsed_multi = time_it(
         f"Executing {N_TASKS:,} tiny tasks (Multiprocessing)",
         run_multiprocessing,
         tasks
-    )
+    ).elapsed
 
     # --- Summary ---
     print("--- Summary ---")
@@ -70,6 +128,29 @@ def main():
     else:
         print("Result: Multiprocessing was faster (this is unexpected for this demo).")
 
+# --- Benchmark scenarios (see benchmark.py) ---
+def _adaptive_setup():
+    return (AdaptiveBatchExecutor(max_workers=N_WORKERS),)
+
+def _adaptive_teardown(executor):
+    executor.shutdown()
+
+@scenario()
+def sequential():
+    run_sequentially(range(N_TASKS))
+
+@scenario()
+def multiprocessing_pool():
+    run_multiprocessing(range(N_TASKS))
+
+@scenario(setup=_adaptive_setup, teardown=_adaptive_teardown)
+def adaptive_map(executor):
+    run_adaptive(executor, range(N_TASKS))
+
+@scenario(setup=_adaptive_setup, teardown=_adaptive_teardown)
+def adaptive_batches(executor):
+    run_adaptive_batches(executor, np.arange(N_TASKS))
+
 if __name__ == '__main__':
     main()
 
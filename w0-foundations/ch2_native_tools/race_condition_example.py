@@ -13,6 +13,8 @@ import sys
 import threading
 from concurrent.futures import ThreadPoolExecutor
 
+from counters import ThreadLocalCounter
+
 # A shared variable
 counter = 0
 N_TASKS = 2
@@ -103,6 +105,41 @@ def demo_lock_solution():
     print(f"Time: {elapsed:.2f} seconds")
     print("\nResult: The final count is correct.")
 
+# =============================================================================
+# Demo 3: Contention-free (thread-local partial sums)
+# =============================================================================
+counter_local = ThreadLocalCounter()
+
+def local_increment():
+    """
+    Each thread adds to its own private cell, so there is nothing to lock.
+    The cells are summed once, after all threads have joined.
+    """
+    for _ in range(N_INCREMENTS):
+        time.sleep(0)  # Same context-switch pressure as Demo 1 and 2
+        counter_local.increment()
+
+def demo_thread_local_solution():
+    print("=" * 60)
+    print("Demo 3: No Shared State (thread-local counters, see counters.py)")
+    print("=" * 60)
+    global counter_local
+    counter_local = ThreadLocalCounter() # Reset counter
+
+    tasks = [local_increment] * N_TASKS
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=N_TASKS) as executor:
+        executor.map(lambda f: f(), tasks)
+    elapsed = time.time() - start
+
+    expected = N_TASKS * N_INCREMENTS
+    print(f"Expected result: {expected:,}")
+    print(f"Actual result:   {counter_local.value():,}") # Correct, without a lock per increment
+    print(f"Time: {elapsed:.2f} seconds")
+    print("\nResult: Correct, and no thread ever waits for another thread's lock.")
+    print("Benchmark all counter variants: uv run python ch2_native_tools/counters.py")
+
 # =============================================================================
 # Main
 # =============================================================================
@@ -110,6 +147,8 @@ def main():
     demo_race_condition()
     print("\n")
     demo_lock_solution()
+    print("\n")
+    demo_thread_local_solution()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
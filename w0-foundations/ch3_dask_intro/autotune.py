@@ -0,0 +1,397 @@
+"""
+Ch3.4a (helper) - Scheduler Autotuner: Pick (and Remember) a Dask Setup per Workload
+
+`delayed_example.py` hardcodes the threads scheduler, and every notebook
+hand-picks its own `Client(n_workers=..., threads_per_worker=...,
+memory_limit=...)`. The right choice depends on the workload:
+
+- sleeps, I/O, NumPy (GIL released)   -> threads, one process
+- pure Python (GIL held)              -> processes
+- large intermediate results          -> fewer, bigger workers (memory)
+
+`autotune()` builds the workload on a SAMPLE of its items (e.g. 8 of 10k
+files) and runs it under every candidate setup:
+
+    sync | threads | processes | distributed (workers x threads, processes or not)
+
+Each run is timed after an untimed warm-up (pool / cluster start-up is not
+counted: 'processes' runs on a warm shared pool from pool_registry, since
+dask would otherwise start a new pool on every compute), and the process tree is sampled for peak memory (PSS, see
+memory_sampler.py). The fastest setup within the memory budget wins; near
+ties (within 10%) go to the simpler, smaller setup. The choice is stored in
+a JSON file per workload and host (cores, RAM), so later runs reuse it:
+
+    config = autotune("sensor-pipeline", build_pipeline, files)     # tunes once
+    with use_config(config):
+        build_pipeline(files).compute()
+
+`topology_warnings()` checks a hand-written Client setup for oversubscribed
+cores and memory limits that exceed the machine or the measured peak.
+
+操作說明：
+uv run python w0-foundations/ch3_dask_intro/autotune.py           (tune two workloads, check the notebook setups)
+uv run python w0-foundations/ch3_dask_intro/autotune.py --force   (ignore stored results, tune again)
+"""
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import NamedTuple
+
+import dask
+import psutil
+from dask import delayed
+from dask.distributed import Client, LocalCluster
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "ch2_native_tools" / "multi_processing"))
+from memory_sampler import MemorySampler
+from pool_registry import get_pool
+
+# ============================================================
+# Configuration
+# ============================================================
+
+DEFAULT_STORE = Path(__file__).resolve().parent.parent / ".autotune.json"
+DEFAULT_SAMPLE = 8          # items per trial
+SAMPLER_HZ = 20
+TIE_TOLERANCE = 0.10        # within 10% of the fastest counts as a tie
+SCHEDULER_ORDER = ('sync', 'threads', 'processes', 'distributed')  # simplest first
+IO_THREADS_PER_CORE = 4     # waits (I/O, sleep) leave the core free: try more threads than cores
+
+MB = 1024 ** 2
+
+
+class Config(NamedTuple):
+    scheduler: str              # 'sync' | 'threads' | 'processes' | 'distributed'
+    n_workers: int = 1          # pool size (threads / processes) or cluster workers
+    threads_per_worker: int = 1
+    processes: bool = True      # distributed only: worker processes or threads in this process
+
+    @property
+    def label(self):
+        if self.scheduler == 'sync':
+            return "sync"
+        if self.scheduler in ('threads', 'processes'):
+            return f"{self.scheduler} x{self.n_workers}"
+        kind = "proc" if self.processes else "in-proc"
+        return f"distributed {self.n_workers}w x {self.threads_per_worker}t ({kind})"
+
+    @property
+    def total_threads(self):
+        return self.n_workers * self.threads_per_worker
+
+    def cluster_kwargs(self):
+        """LocalCluster / Client keyword arguments (distributed only)."""
+        return {'n_workers': self.n_workers, 'threads_per_worker': self.threads_per_worker,
+                'processes': self.processes}
+
+
+class Trial(NamedTuple):
+    config: Config
+    seconds: float              # timed run, after the warm-up
+    items_per_s: float
+    peak_mb: float              # peak PSS of the process tree during the timed run
+    error: str = ""
+
+
+def candidate_configs(n_cores=None):
+    """
+    Setups worth trying on n_cores: every local scheduler at one worker per
+    core, an oversubscribed thread pool for I/O-bound work, and distributed
+    clusters whose workers x threads fill the cores.
+    """
+    n = n_cores or os.cpu_count() or 1
+    configs = [Config('sync'), Config('threads', n), Config('threads', IO_THREADS_PER_CORE * n),
+               Config('processes', n)]
+    splits = [(w, n // w) for w in range(1, n + 1) if n % w == 0]
+    if len(splits) > 3:
+        # one worker, one thread per worker, and the most square split in between
+        middle = min(splits[1:-1], key=lambda s: abs(s[0] - s[1]))
+        splits = [splits[0], middle, splits[-1]]
+    configs += [Config('distributed', w, t) for w, t in splits]
+    configs.append(Config('distributed', 1, n, processes=False))
+    return configs
+
+
+# ============================================================
+# Running under a configuration
+# ============================================================
+
+@contextmanager
+def use_config(config):
+    """
+    Make config the default for .compute() inside the block.
+
+    Yields:
+        Client for distributed configs, else None
+    """
+    if config.scheduler == 'processes':
+        # Without pool=, dask's multiprocessing get() starts (and stops) a pool per compute
+        with dask.config.set(scheduler='processes', num_workers=config.n_workers,
+                             pool=get_pool(config.n_workers, preload=())):
+            yield None
+        return
+    if config.scheduler != 'distributed':
+        with dask.config.set(scheduler=config.scheduler, num_workers=config.n_workers):
+            yield None
+        return
+    with LocalCluster(dashboard_address=None, **config.cluster_kwargs()) as cluster, \
+            Client(cluster) as client, dask.config.set(scheduler=client.get):
+        yield client
+
+
+def _compute(collection):
+    (result,) = dask.compute(collection)
+    return result
+
+
+def run_trial(build, sample, config):
+    """
+    Time build(sample).compute() under config: one untimed warm-up run on a
+    single item (pools, imports, connections), then one timed run.
+
+    Returns:
+        Trial
+    """
+    try:
+        with use_config(config):
+            _compute(build(sample[:1]))
+            with MemorySampler(hz=SAMPLER_HZ) as sampler:
+                start = time.perf_counter()
+                _compute(build(sample))
+                seconds = time.perf_counter() - start
+    except Exception as e:
+        return Trial(config, float('inf'), 0.0, 0.0, f"{type(e).__name__}: {e}")
+    return Trial(config, seconds, len(sample) / seconds, sampler.peak('pss').bytes / MB)
+
+
+def recommend(trials, memory_budget_mb=None):
+    """
+    Fastest trial within the memory budget; near ties go to the simpler setup,
+    then the one with fewer threads, then the lower peak memory.
+
+    Returns:
+        Trial, or None if every trial failed or exceeded the budget
+    """
+    ok = [t for t in trials if not t.error and (memory_budget_mb is None or t.peak_mb <= memory_budget_mb)]
+    if not ok:
+        return None
+    fastest = min(t.seconds for t in ok)
+    close = [t for t in ok if t.seconds <= fastest * (1 + TIE_TOLERANCE)]
+    return min(close, key=lambda t: (SCHEDULER_ORDER.index(t.config.scheduler),
+                                     t.config.total_threads, t.peak_mb))
+
+
+# ============================================================
+# Persistence
+# ============================================================
+
+def workload_name(name, **params):
+    """
+    Stored-result name of a workload built with params: 'delayed_example[batch_size=2]'.
+
+    Build parameters that change the graph (batch size, fusion, ...) must be
+    part of the name, or tuning one variant overwrites another's setup.
+    None values are left out.
+    """
+    given = ",".join(f"{k}={v}" for k, v in sorted(params.items()) if v is not None)
+    return f"{name}[{given}]" if given else name
+
+
+def host_fingerprint():
+    """Stored results only apply to machines of the same size."""
+    return f"{os.cpu_count()}cpu-{round(psutil.virtual_memory().total / 1024 ** 3)}gb"
+
+
+class TuningStore:
+    """Recommended Config per (workload, host), in one JSON file."""
+
+    def __init__(self, path=DEFAULT_STORE):
+        self.path = Path(path)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _entry_key(self, workload):
+        return f"{workload}@{host_fingerprint()}"
+
+    def load(self, workload):
+        """The stored Config, or None."""
+        entry = self._read().get(self._entry_key(workload))
+        return Config(**entry['config']) if entry else None
+
+    def save(self, workload, best, trials, sample_size):
+        data = self._read()
+        data[self._entry_key(workload)] = {
+            'config': best.config._asdict(),
+            'tuned_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'sample_size': sample_size,
+            'trials': [{'config': t.config.label, 'seconds': None if t.error else t.seconds,
+                        'peak_mb': t.peak_mb, 'error': t.error} for t in trials],
+        }
+        # Write under a private name, then rename: a crash never leaves half a file
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def autotune(workload, build, items, sample_size=DEFAULT_SAMPLE, configs=None,
+             memory_budget_mb=None, store=None, force=False, verbose=True):
+    """
+    Recommended Config for a workload, tuned on a sample of its items and stored.
+
+    Args:
+        workload: Name under which the result is stored
+        build: items -> Dask collection (e.g. build_data_pipeline)
+        items: Work items (files, ...); the first sample_size are used
+        sample_size: Items per trial
+        configs: Candidates (default: candidate_configs())
+        memory_budget_mb: Reject setups whose peak exceeds this
+        store: TuningStore (default: DEFAULT_STORE)
+        force: Tune again even if a stored result exists
+        verbose: Print the trial table
+
+    Returns:
+        Config
+    """
+    store = store or TuningStore()
+    if not force:
+        stored = store.load(workload)
+        if stored is not None:
+            if verbose:
+                print(f"[{workload}] stored setup: {stored.label} ({store.path})")
+            return stored
+
+    sample = list(items)[:sample_size]
+    trials = []
+    if verbose:
+        print(f"[{workload}] tuning on {len(sample)} items")
+        print(f"  {'setup':<36} {'time':>8} {'items/s':>9} {'peak PSS':>10}")
+    for config in configs or candidate_configs():
+        trial = run_trial(build, sample, config)
+        trials.append(trial)
+        if verbose:
+            if trial.error:
+                print(f"  {config.label:<36} failed: {trial.error}")
+            else:
+                print(f"  {config.label:<36} {trial.seconds:>7.2f}s {trial.items_per_s:>9.1f} "
+                      f"{trial.peak_mb:>7.0f} MB")
+
+    best = recommend(trials, memory_budget_mb)
+    if best is None:
+        raise RuntimeError(f"No setup ran {workload} within the memory budget")
+    store.save(workload, best, trials, len(sample))
+    if verbose:
+        print(f"  -> {best.config.label} (stored in {store.path})")
+    return best.config
+
+
+# ============================================================
+# Topology checks
+# ============================================================
+
+def _parse_bytes(limit):
+    return dask.utils.parse_bytes(limit) if isinstance(limit, str) else limit
+
+
+def topology_warnings(n_workers, threads_per_worker=1, memory_limit=None, processes=True,
+                      peak_mb_per_worker=None, n_cores=None, total_memory=None):
+    """
+    Problems with a Client/LocalCluster setup on this machine.
+
+    Args:
+        memory_limit: Per worker, as given to Client ('2GB' or bytes)
+        processes: False if the workers are threads of this process
+        peak_mb_per_worker: Measured peak of one worker (e.g. from autotune), if known
+
+    Returns:
+        list of str
+    """
+    n_cores = n_cores or os.cpu_count() or 1
+    total_memory = total_memory or psutil.virtual_memory().total
+    warnings = []
+    threads = n_workers * threads_per_worker
+    if threads > n_cores:
+        warnings.append(f"{threads} threads on {n_cores} cores: oversubscribed "
+                        f"({threads / n_cores:.1f} threads per core); tasks time-slice instead of running in parallel")
+    elif threads < n_cores / 2:
+        warnings.append(f"{threads} threads on {n_cores} cores: more than half the cores stay idle")
+    if not processes and n_workers > 1:
+        warnings.append(f"processes=False: the {n_workers} workers share one process and one GIL; "
+                        f"use threads_per_worker instead, or processes for pure-Python work")
+    limit = _parse_bytes(memory_limit)
+    if limit:
+        if limit * n_workers > total_memory:
+            warnings.append(f"memory_limit {limit / 1024 ** 3:.1f} GB x {n_workers} workers exceeds "
+                            f"the machine's {total_memory / 1024 ** 3:.1f} GB: workers get OOM-killed "
+                            f"before they spill")
+        if peak_mb_per_worker and limit < peak_mb_per_worker * MB / 0.6:
+            warnings.append(f"memory_limit {limit / MB:.0f} MB is below the measured peak "
+                            f"{peak_mb_per_worker:.0f} MB / 60% (spill threshold): workers will spill")
+    return warnings
+
+
+# ============================================================
+# Main: two workloads, and the notebooks' hand-picked setups
+# ============================================================
+
+def sleepy_load(i):
+    """I/O stand-in: releases the GIL."""
+    time.sleep(0.2)
+    return i
+
+
+def python_loop(i, n=2_000_000):
+    """Pure Python: holds the GIL."""
+    total = 0
+    for k in range(n):
+        total += k % (i + 2)
+    return total
+
+
+def build_io(items):
+    return delayed(sum)([delayed(sleepy_load)(i) for i in items])
+
+
+def build_cpu(items):
+    return delayed(sum)([delayed(python_loop)(i) for i in items])
+
+
+NOTEBOOK_SETUPS = {
+    '01-data-loading-basics': dict(n_workers=2, threads_per_worker=2, memory_limit='2GB'),
+    '02-processing-and-saving': dict(processes=False, n_workers=4, threads_per_worker=2, memory_limit='4GB'),
+    '03-ml-pipeline': dict(n_workers=10, threads_per_worker=2, memory_limit='2GB'),
+}
+
+
+def main():
+    force = '--force' in sys.argv[1:]
+    print("=" * 70)
+    print(f"Autotuning on {host_fingerprint()}")
+    print("=" * 70)
+    for name, build in (("io-sleep", build_io), ("cpu-python", build_cpu)):
+        config = autotune(name, build, range(100), force=force)
+        with use_config(config):
+            start = time.perf_counter()
+            _compute(build(range(16)))
+            print(f"  16 items with {config.label}: {time.perf_counter() - start:.2f}s\n")
+
+    print("=" * 70)
+    print("Hand-picked notebook setups on this machine")
+    print("=" * 70)
+    for notebook, setup in NOTEBOOK_SETUPS.items():
+        warnings = topology_warnings(**setup)
+        print(f"{notebook}: Client({', '.join(f'{k}={v!r}' for k, v in setup.items())})")
+        for w in warnings or ["ok"]:
+            print(f"  - {w}")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,14 +6,36 @@ Ch3.4b - Dask Dashboard: Real-time Monitoring
 
 操作說明：
 uv run python w0-foundations/ch3_dask_intro/dashboard_demo.py
+uv run python w0-foundations/ch3_dask_intro/dashboard_demo.py --format csv   (csv | parquet | feather)
+uv run python w0-foundations/ch3_dask_intro/dashboard_demo.py --dataframe   (per-sensor analytics over one dask DataFrame)
+uv run python w0-foundations/ch3_dask_intro/dashboard_demo.py --stream      (process files as they arrive)
+uv run python w0-foundations/ch3_dask_intro/dashboard_demo.py --cache       (keep files, reuse unchanged results)
+uv run python w0-foundations/ch3_dask_intro/dashboard_demo.py --trace run.json   (Chrome trace + summary)
+uv run python w0-foundations/ch3_dask_intro/dashboard_demo.py --annotate    (IO / CPU worker slots + stage priorities)
+uv run python w0-foundations/ch3_dask_intro/dashboard_demo.py --bench --no-sleep --n-files 200 --workers 2   (no prompts)
+uv run python w0-foundations/ch3_dask_intro/dashboard_demo.py --bench --annotate   (compare I/O / CPU overlap)
 """
+import sys
+import tempfile
 import time
-import numpy as np
+from contextlib import ExitStack, nullcontext
+import dask
 import pandas as pd
+import typer
 from pathlib import Path
 from dask import delayed, compute, persist
 from dask.distributed import Client, LocalCluster
 
+from graph_analyzer import analyze_graph, format_report
+from reductions import tree_depth, tree_reduce
+from result_cache import ResultCache
+from sensor_frames import per_sensor_summary, read_sensor_dataframe
+from sensor_stats import SensorPartial, merge_partials
+from sensor_stream import print_latency_report, print_update, start_producer, stream_directory
+from sensor_storage import (DEFAULT_FORMAT, make_sensor_frame, pop_format_arg, read_sensor_file,
+                            sensor_filename, write_sensor_file)
+from task_trace import DEFAULT_TRACE_PATH, stage_overlap, trace_tasks
+
 
 # ============================================================
 # Configuration
@@ -24,207 +46,203 @@ SCRIPT_DIR = Path(__file__).resolve().parent
 DATA_DIR = SCRIPT_DIR.parent / "temp_data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# Partial results merged per aggregation task (reduction tree fanout)
+TREE_FANOUT = 4
+
+# Simulated work per task (seconds), so the dashboard has time to show it
+LOAD_DELAY = 2.0
+ANALYZE_DELAY = 3.0
+MERGE_DELAY = 0.2
+
+# Estimated seconds per task (the simulated work), for the graph analyzer
+TASK_COSTS = {'load_and_validate': LOAD_DELAY, 'analyze_file': ANALYZE_DELAY, 'merge_results': MERGE_DELAY}
+
+# Stage scheduling (--annotate): loads take an IO slot, analyses a CPU slot, so
+# loads in flight never occupy the threads that should keep the cores busy.
+# Higher priority runs first: finish analyses and merges before starting more loads.
+STAGE_ANNOTATIONS = {
+    'load_and_validate': {'resources': {'IO': 1}, 'priority': 0},
+    'analyze_file': {'resources': {'CPU': 1}, 'priority': 10},
+    'merge_results': {'priority': 20},
+}
+IO_SLOTS = 4   # concurrent loads per worker (they mostly wait)
+
 
 # ============================================================
 # Core Logic: Realistic Data Processing Tasks
 # ============================================================
 
-def generate_sample_csv(filename, rows=10000):
+def generate_sample_file(filename, rows=10000, start='2024-01-01'):
     """
-    Generate a sample CSV file with time-series sensor data
+    Generate a sample file with time-series sensor data
     
     Args:
-        filename: Output filename
+        filename: Output filename (.csv, .parquet or .feather)
         rows: Number of rows to generate
+        start: First timestamp (one row per minute from here)
     """
-    # Generate time series with trend and noise
-    timestamps = pd.date_range('2024-01-01', periods=rows, freq='1min')
+    # Time series with a daily pattern (temperature higher during day) and noise
+    write_sensor_file(make_sensor_frame(rows, start=start), filename)
+
+
+def generate_sample_files(n_files, fmt=DEFAULT_FORMAT, rows=5000, reuse=False, directory=DATA_DIR):
+    """
+    Generate consecutive sensor files: file i covers the i-th block of `rows` minutes
     
-    # Add daily pattern (temperature higher during day)
-    hour_of_day = timestamps.hour
-    daily_pattern = 5 * np.sin(2 * np.pi * hour_of_day / 24)
+    Args:
+        reuse: Keep files that already exist (so cached results stay valid)
+        directory: Where to write the files
     
-    data = {
-        'timestamp': timestamps,
-        'sensor_id': np.random.choice(['A', 'B', 'C', 'D'], rows),
-        'temperature': 25 + daily_pattern + np.random.normal(0, 2, rows),
-        'humidity': 60 + np.random.normal(0, 5, rows),
-        'pressure': 1013 + np.random.normal(0, 10, rows)
-    }
-    df = pd.DataFrame(data)
-    df.to_csv(filename, index=False)
+    Returns:
+        list: Generated file paths
+    """
+    print("Generating sample data files...")
+    filenames = []
+    generated = 0
+    for i in range(n_files):
+        filename = sensor_filename(directory, i, fmt)
+        if not (reuse and filename.exists()):
+            start = pd.Timestamp('2024-01-01') + pd.Timedelta(minutes=i * rows)
+            generate_sample_file(filename, rows=rows, start=start)
+            generated += 1
+        filenames.append(filename)
+    print(f"Generated {generated} files in {directory} ({n_files - generated} reused)\n")
+    return filenames
 
 
 @delayed
-def load_and_validate(filename):
+def load_and_validate(filename, columns=None, delay=LOAD_DELAY, verbose=True):
     """
-    I/O-bound: Load CSV and validate data
+    I/O-bound: Load a sensor file and validate data
     
-    Simulates real file I/O operations
+    Simulates real file I/O operations. The file is read typed by schema
+    (no inference or second timestamp parse), sensor_id is a category, and
+    nulls are checked from column statistics instead of a full scan.
     
     Args:
-        filename: CSV file to load
+        filename: Sensor file to load (format from the extension)
+        columns: Columns to read (default: all)
+        delay: Simulated extra I/O time in seconds (0 for benchmarks)
+        verbose: Print progress
         
     Returns:
         DataFrame: Loaded data
     """
-    print(f"[I/O] Loading {Path(filename).name}...")
-    time.sleep(2)  # 增加到 2 秒，讓你有時間觀察
-    df = pd.read_csv(filename)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    # Validate data
-    assert not df.isnull().any().any(), "Found null values"
-    assert len(df) > 0, "Empty dataframe"
+    if verbose:
+        print(f"[I/O] Loading {Path(filename).name}...")
+    time.sleep(delay)  # 增加到 2 秒，讓你有時間觀察
+    df = read_sensor_file(filename, columns)  # raises ValueError on nulls / empty file
     
-    print(f"[I/O] {Path(filename).name} loaded: {len(df)} rows")
+    if verbose:
+        print(f"[I/O] {Path(filename).name} loaded: {len(df)} rows")
     
     return df
 
 
 @delayed
-def compute_statistics(df, file_id):
+def analyze_file(df, file_id, delay=ANALYZE_DELAY, verbose=True):
     """
-    CPU-bound: Compute time-series statistics
+    CPU-bound: All per-file analysis in one fused pass
     
-    Realistic analysis:
-    - Basic statistics (mean, std)
-    - Moving averages
+    Realistic analysis (see sensor_stats.SensorPartial):
+    - Basic statistics (mean, std, min, max)
+    - Trend detection (24h moving average)
     - Correlation analysis
-    - Trend detection
+    - Hourly patterns (group by hour of day, peak hours)
+    
+    One vectorized NumPy pass over the column arrays replaces the former
+    compute_statistics + analyze_hourly_patterns tasks; the input DataFrame
+    is neither copied nor modified.
     
     Args:
         df: Input DataFrame
         file_id: File identifier
+        delay: Simulated extra compute time in seconds (0 for benchmarks)
+        verbose: Print progress
         
     Returns:
-        dict: Computed statistics
+        SensorPartial: Mergeable accumulators (fixed size, independent of rows)
     """
-    print(f"[CPU] Computing statistics for file {file_id}...")
-    
-    # 增加到 3 秒，讓你有時間觀察
-    time.sleep(3)
+    if verbose:
+        print(f"[CPU] Analyzing file {file_id}...")
     
-    # Calculate moving averages (simulate trend analysis)
-    df_sorted = df.sort_values('timestamp')
-    ma_24h = df_sorted['temperature'].rolling(window=60*24, min_periods=1).mean()
+    # 3 秒，讓你有時間觀察 (the kernel itself takes about a millisecond)
+    time.sleep(delay)
     
-    stats = {
-        'file_id': file_id,
-        'row_count': len(df),
-        
-        # Basic statistics
-        'mean_temp': df['temperature'].mean(),
-        'std_temp': df['temperature'].std(),
-        'min_temp': df['temperature'].min(),
-        'max_temp': df['temperature'].max(),
-        
-        'mean_humidity': df['humidity'].mean(),
-        'std_humidity': df['humidity'].std(),
-        
-        'mean_pressure': df['pressure'].mean(),
-        'std_pressure': df['pressure'].std(),
-        
-        # Trend analysis
-        'temp_range': df['temperature'].max() - df['temperature'].min(),
-        'temp_trend': ma_24h.iloc[-1] - ma_24h.iloc[0] if len(ma_24h) > 1 else 0,
-        
-        # Correlation
-        'temp_humidity_corr': df['temperature'].corr(df['humidity']),
-        'temp_pressure_corr': df['temperature'].corr(df['pressure']),
-        
-        # Sensor distribution
-        'sensor_a_pct': (df['sensor_id'] == 'A').sum() / len(df) * 100,
-        'sensor_b_pct': (df['sensor_id'] == 'B').sum() / len(df) * 100,
-    }
+    partial = SensorPartial.from_frame(df)
     
-    print(f"[CPU] Statistics computed for file {file_id}")
-    return stats
+    if verbose:
+        print(f"[CPU] Analysis complete for file {file_id}")
+    return partial
 
 
-@delayed
-def analyze_hourly_patterns(df, file_id):
+@delayed(pure=True)
+def merge_results(partials, delay=MERGE_DELAY, verbose=True):
     """
-    CPU-bound: Analyze hourly patterns in sensor data
-    
-    Realistic analysis:
-    - Group by hour of day
-    - Calculate hourly averages
-    - Identify peak hours
+    Lightweight: Merge a group of partial results (one node of the reduction tree)
     
     Args:
-        df: Input DataFrame
-        file_id: File identifier
+        partials: At most `fanout` SensorPartial objects
+        delay: Simulated extra time in seconds (0 for benchmarks)
+        verbose: Print progress
         
     Returns:
-        dict: Hourly pattern analysis
+        SensorPartial: Combined accumulators
     """
-    print(f"[CPU] Analyzing hourly patterns for file {file_id}...")
-    
-    time.sleep(2)  # 增加到 2 秒
-    
-    # Extract hour from timestamp
-    df['hour'] = pd.to_datetime(df['timestamp']).dt.hour
-    
-    # Calculate hourly statistics
-    hourly_temp = df.groupby('hour')['temperature'].agg(['mean', 'std', 'count'])
-    
-    # Find peak hours
-    peak_hour = hourly_temp['mean'].idxmax()
-    lowest_hour = hourly_temp['mean'].idxmin()
+    if verbose:
+        print(f"[Aggregate] Merging {len(partials)} partial results...")
+    time.sleep(delay)
     
-    result = {
-        'file_id': file_id,
-        'peak_temp_hour': int(peak_hour),
-        'peak_temp_value': float(hourly_temp.loc[peak_hour, 'mean']),
-        'lowest_temp_hour': int(lowest_hour),
-        'lowest_temp_value': float(hourly_temp.loc[lowest_hour, 'mean']),
-        'daily_temp_variation': float(hourly_temp['mean'].max() - hourly_temp['mean'].min()),
-        'avg_hourly_std': float(hourly_temp['std'].mean()),
-    }
+    merged = merge_partials(partials)
     
-    print(f"[CPU] Hourly analysis complete for file {file_id}")
-    return result
+    if verbose:
+        print(f"[Aggregate] Merged results of {merged.n_files} files")
+    return merged
 
 
-@delayed
-def aggregate_results(stats_list):
+def stage_cluster_options(cpu_slots, io_slots=IO_SLOTS):
     """
-    Lightweight: Aggregate results from all files
+    LocalCluster options whose workers match STAGE_ANNOTATIONS
     
-    Args:
-        stats_list: List of statistics dictionaries
-        
-    Returns:
-        DataFrame: Aggregated results
+    Each worker gets one thread per slot: `cpu_slots` (one per core) for the
+    analyses plus `io_slots` extra threads that only loads may use.
     """
-    print(f"[Aggregate] Combining results from {len(stats_list)} files...")
-    time.sleep(0.2)
-    
-    results_df = pd.DataFrame(stats_list)
-    
-    print("[Aggregate] Aggregation complete")
-    return results_df
+    return {'threads_per_worker': cpu_slots + io_slots, 'resources': {'CPU': cpu_slots, 'IO': io_slots}}
 
 
-@delayed
-def combine_hourly_patterns(pattern_list):
+def _stage(name, annotate):
+    return dask.annotate(**STAGE_ANNOTATIONS[name]) if annotate else nullcontext()
+
+
+def build_pipeline(filenames, fanout=TREE_FANOUT, cache=None, simulate=True, annotate=False):
     """
-    Lightweight: Combine hourly pattern analysis
+    Build the load -> analyze -> tree-merge graph
     
     Args:
-        pattern_list: List of hourly pattern dictionaries
+        filenames: Sensor files
+        fanout: Partial results merged per aggregation task
+        cache: Optional ResultCache for the load and analysis tasks
+        simulate: Add the demo delays and progress prints (False: real work only)
+        annotate: Attach STAGE_ANNOTATIONS (resources + priorities); the workers
+            must provide the resources (stage_cluster_options), or tasks never run
         
     Returns:
-        DataFrame: Combined hourly patterns
+        Delayed: The merged SensorPartial
     """
-    print(f"[Aggregate] Combining hourly patterns from {len(pattern_list)} files...")
-    time.sleep(0.1)
+    load, analyze = (cache(load_and_validate), cache(analyze_file)) if cache else (load_and_validate, analyze_file)
+    delays = (LOAD_DELAY, ANALYZE_DELAY, MERGE_DELAY) if simulate else (0, 0, 0)
+    
+    # Step 1: Load all files (I/O-bound, parallel)
+    with _stage('load_and_validate', annotate):
+        loaded_dfs = [load(str(f), delay=delays[0], verbose=simulate) for f in filenames]
     
-    combined = pd.DataFrame(pattern_list)
+    # Step 2: Statistics + hourly patterns, one fused CPU task per file (parallel)
+    with _stage('analyze_file', annotate):
+        partials = [analyze(df, i, delay=delays[1], verbose=simulate) for i, df in enumerate(loaded_dfs)]
     
-    print(f"[Aggregate] Combined patterns from {len(combined)} files")
-    return combined
+    # Step 3: Merge in a tree; no single task holds every per-file result
+    with _stage('merge_results', annotate):
+        return tree_reduce(partials, merge_results, fanout, delay=delays[2], verbose=simulate)
 
 
 # ============================================================
@@ -294,7 +312,7 @@ def print_instructions():
    - Green bars = actual computation time
    - Orange/Red bars = data transfer/waiting time
    - Different rows = different workers executing in parallel
-   - Tasks will run for ~15-20 seconds (enough time to observe)
+   - Tasks will run for ~10-15 seconds (enough time to observe)
 
 5. Other useful tabs:
    - Progress: Overall completion percentage
@@ -303,52 +321,43 @@ def print_instructions():
     print("=" * 70)
 
 
-def print_task_graph_info(final_stats, final_patterns):
+def print_task_graph_info(final, n_files, fanout, n_workers=None):
     """
-    Print task graph information
+    Print task graph information (see graph_analyzer.py)
     
     Args:
-        final_stats: Delayed stats result
-        final_patterns: Delayed patterns result
+        final: Delayed result (top of the reduction tree)
+        n_files: Number of input files
+        fanout: Partial results merged per aggregation task
+        n_workers: Worker threads in the cluster (for the time prediction)
     """
-    # Get graph information
-    stats_graph = final_stats.__dask_graph__()
+    report = analyze_graph(final, costs=TASK_COSTS)
     
     print("\nTask Graph Information:")
     print("=" * 70)
     
-    # Count task types
-    task_types = {}
-    for key in stats_graph.keys():
-        task_name = str(key).split('-')[0]
-        task_types[task_name] = task_types.get(task_name, 0) + 1
-    
-    print("\nTask Summary:")
-    total_tasks = 0
-    for task_name, count in sorted(task_types.items()):
-        print(f"  - {task_name}: {count} task(s)")
-        total_tasks += count
-    
-    print(f"\nTotal tasks in graph: {total_tasks}")
-    
     print("\nExecution Flow:")
     print("  Stage 1: Load Files (I/O)")
-    print("    - 12 load_and_validate tasks")
+    print(f"    - {n_files} load_and_validate tasks")
     print("    - Run in parallel")
-    print("    - ~2s per task")
+    print(f"    - ~{TASK_COSTS['load_and_validate']:g}s per task")
     print()
     print("  Stage 2: Process Data (CPU)")
-    print("    - 12 compute_statistics tasks (~3s each)")
-    print("    - 12 analyze_hourly_patterns tasks (~2s each)")
-    print("    - Run in parallel (24 tasks total)")
+    print(f"    - {n_files} analyze_file tasks (~{TASK_COSTS['analyze_file']:g}s each)")
+    print("    - One fused pass per file: statistics + hourly patterns")
+    print("    - Run in parallel")
     print()
     print("  Stage 3: Aggregate (Lightweight)")
-    print("    - 2 aggregation tasks")
-    print("    - Wait for all Stage 2 tasks")
-    print("    - ~0.2s per task")
+    print(f"    - {report.task_types.get('merge_results', 0)} merge_results tasks in a tree "
+          f"(fanout {fanout}, {tree_depth(n_files, fanout)} levels)")
+    print(f"    - Each merges at most {fanout} partial results, on any worker")
+    print(f"    - ~{TASK_COSTS['merge_results']:g}s per task")
     
-    print("\nExpected total time: ~15-20 seconds")
-    print("(vs ~80+ seconds if sequential)")
+    print()
+    print(format_report(report, n_workers))
+    if n_workers:
+        print(f"\nExpected total time: >= {report.best_time(n_workers):.1f} seconds on {n_workers} threads")
+        print(f"(vs ~{report.work:.0f} seconds if sequential)")
     
     print("=" * 70)
 
@@ -357,16 +366,16 @@ def print_task_graph_info(final_stats, final_patterns):
 # Demo Scenarios
 # ============================================================
 
-def demo_realistic_pipeline(client, n_files=12):
+def demo_realistic_pipeline(client, n_files=12, fmt=DEFAULT_FORMAT, fanout=TREE_FANOUT, cache=None,
+                            trace_path=None, annotate=False):
     """
     Demo: Realistic data processing pipeline
     
     Pipeline:
-    1. Load multiple CSV files (I/O-bound)
+    1. Load multiple sensor files (I/O-bound)
     2. For each file:
-       - Compute statistics (CPU-bound)
-       - Analyze hourly patterns (CPU-bound)
-    3. Aggregate all results (lightweight)
+       - Statistics + hourly patterns in one fused pass (CPU-bound)
+    3. Merge the per-file results in a tree (lightweight)
     
     Watch the Dashboard to see:
     - I/O and CPU tasks interleaved
@@ -377,40 +386,34 @@ def demo_realistic_pipeline(client, n_files=12):
     Args:
         client: Dask client
         n_files: Number of files to process
+        fmt: Storage format ('csv', 'parquet' or 'feather')
+        fanout: Partial results merged per aggregation task
+        cache: Optional ResultCache; files are kept and load/analysis results
+            reused, so a rerun only recomputes the branches of changed files
+        trace_path: Write a Chrome trace of the run here (see task_trace.py)
+        annotate: Run loads on IO slots and analyses on CPU slots, with stage
+            priorities (the cluster must be started with stage_cluster_options)
         
     Returns:
         list: List of generated filenames (for cleanup later)
     """
-    print(f"\n[Pipeline] Processing {n_files} sensor data files...")
+    print(f"\n[Pipeline] Processing {n_files} sensor data files ({fmt})...")
     print(f"Data directory: {DATA_DIR}")
     print()
     
     # Generate test files
-    print("Generating sample data files...")
-    filenames = []
-    for i in range(n_files):
-        filename = DATA_DIR / f'sensor_data_{i}.csv'
-        generate_sample_csv(filename, rows=5000)
-        filenames.append(filename)
-    print(f"Generated {n_files} files in {DATA_DIR}\n")
+    filenames = generate_sample_files(n_files, fmt, reuse=cache is not None)
     
     print("Building task graph...")
-    
-    # Step 1: Load all files (I/O-bound, parallel)
-    loaded_dfs = [load_and_validate(str(f)) for f in filenames]
-    
-    # Step 2a: Compute statistics (CPU-bound, parallel)
-    stats_tasks = [compute_statistics(df, i) for i, df in enumerate(loaded_dfs)]
-    
-    # Step 2b: Analyze hourly patterns (CPU-bound, parallel)
-    pattern_tasks = [analyze_hourly_patterns(df, i) for i, df in enumerate(loaded_dfs)]
-    
-    # Step 3: Aggregate results (depends on all previous tasks)
-    final_stats = aggregate_results(stats_tasks)
-    final_patterns = combine_hourly_patterns(pattern_tasks)
+    if cache:
+        cache.reset_stats()
+    final = build_pipeline(filenames, fanout, cache, annotate=annotate)
     
     print("Task graph built!")
-    print_task_graph_info(final_stats, final_patterns)
+    if annotate:
+        print("Stage annotations: " + ", ".join(f"{name} {a}" for name, a in STAGE_ANNOTATIONS.items()))
+    n_threads = sum(w['nthreads'] for w in client.scheduler_info()['workers'].values())
+    print_task_graph_info(final, n_files, fanout, n_threads)
     
     # === 關鍵修改：分兩階段執行 ===
     
@@ -420,57 +423,287 @@ def demo_realistic_pipeline(client, n_files=12):
     print("=" * 70)
     input("\nPress Enter to submit tasks to scheduler (they won't run yet)...")
     
-    # 使用 persist() 提交任務，但不立即執行
-    final_stats_persisted, final_patterns_persisted = persist(final_stats, final_patterns)
+    # Record every task from here on (the plugin is removed and the trace written
+    # even if the pipeline raises)
+    tracing = ExitStack()
+    trace = tracing.enter_context(trace_tasks(client, trace_path)) if trace_path else None
+    with tracing:
+        # 使用 persist() 提交任務，但不立即執行
+        (final_persisted,) = persist(final)
+    
+        print("\nTasks submitted to scheduler!")
+        print("Now you can see the Graph in Dashboard!")
+        print()
+        print("What to do:")
+        print("  1. Switch to Dashboard")
+        print("  2. Click 'Graph' tab in the top menu")
+        print("  3. You should see the task dependency graph")
+        print("  4. Come back here when ready")
+    
+        # 階段 2: 真正開始執行
+        print("\n" + "=" * 70)
+        print("Stage 2: Starting execution...")
+        print("=" * 70)
+        input("\nPress Enter to START EXECUTION (watch Task Stream now)...")
+    
+        # Countdown
+        print("\nStarting in:")
+        for i in range(3, 0, -1):
+            print(f"  {i}...")
+            time.sleep(1)
+        print("  GO! Switch to Task Stream NOW!\n")
+    
+        print("Executing pipeline...")
+    
+        start = time.time()
+    
+        # 真正執行（compute）
+        (total,) = compute(final_persisted)
+        elapsed = time.time() - start
     
-    print("\nTasks submitted to scheduler!")
-    print("Now you can see the Graph in Dashboard!")
-    print()
-    print("What to do:")
-    print("  1. Switch to Dashboard")
-    print("  2. Click 'Graph' tab in the top menu")
-    print("  3. You should see the task dependency graph")
-    print("  4. Come back here when ready")
-    
-    # 階段 2: 真正開始執行
+    # Display results
     print("\n" + "=" * 70)
-    print("Stage 2: Starting execution...")
+    print("Pipeline Completed!")
     print("=" * 70)
-    input("\nPress Enter to START EXECUTION (watch Task Stream now)...")
+    print(f"Total time: {elapsed:.2f}s")
+    print(f"\nProcessed {n_files} files")
     
-    # Countdown
-    print("\nStarting in:")
-    for i in range(3, 0, -1):
-        print(f"  {i}...")
-        time.sleep(1)
-    print("  GO! Switch to Task Stream NOW!\n")
+    stats_result = pd.Series(total.statistics()).drop('file_id')
+    patterns_result = pd.Series(total.hourly_pattern()).drop('file_id')
     
-    print("Executing pipeline...")
+    print(f"\nStatistics Summary (all {total.n_files} files, {total.n:,} rows):")
+    print(stats_result[['mean_temp', 'std_temp', 'temp_range', 'temp_trend', 'temp_humidity_corr']].to_string())
     
-    start = time.time()
+    print("\nHourly Pattern Summary:")
+    print(patterns_result[['peak_temp_hour', 'peak_temp_value', 'lowest_temp_hour', 'daily_temp_variation']].to_string())
+    
+    if trace:
+        print("\nTask Trace Summary:")
+        print(trace.format_summary())
+        overlap = stage_overlap(trace.records, 'load_and_validate', 'analyze_file')
+        print(f"Loads and analyses overlapped for {overlap:.2f}s of {trace.summary['run']['wall_s']:.2f}s")
+        print(f"Chrome trace: {trace_path} (open in https://ui.perfetto.dev or chrome://tracing)")
+    
+    if cache:
+        print()
+        print(cache.format_stats())
+        print(f"\nData files are kept in {DATA_DIR} for the next --cache run")
+        return []
+    
+    print(f"\nData files are in: {DATA_DIR}")
+    print("Files will be cleaned up after cluster closes")
+    
+    return filenames
+
+
+def demo_dataframe_pipeline(client, n_files=12, fmt=DEFAULT_FORMAT):
+    """
+    Demo: The same sensor files as ONE dask DataFrame (see sensor_frames.py)
     
-    # 真正執行（compute）
-    stats_result, patterns_result = compute(final_stats_persisted, final_patterns_persisted)
+    Pipeline:
+    1. One partition per file, indexed by timestamp, known divisions
+    2. Per-sensor statistics: groupby per partition, partials merged in a tree (no shuffle)
+    3. Rolling 24h mean per sensor across file boundaries (map_overlap)
     
+    Args:
+        client: Dask client
+        n_files: Number of files to process
+        fmt: Storage format ('csv', 'parquet' or 'feather')
+        
+    Returns:
+        list: List of generated filenames (for cleanup later)
+    """
+    print(f"\n[DataFrame] Processing {n_files} sensor data files ({fmt}) as one dask DataFrame...")
+    print(f"Data directory: {DATA_DIR}")
+    print()
+    
+    filenames = generate_sample_files(n_files, fmt)
+    
+    ddf = read_sensor_dataframe(filenames)
+    print(f"Partitions: {ddf.npartitions} (one per file)")
+    print(f"Known divisions: {ddf.known_divisions} ({ddf.divisions[0]} .. {ddf.divisions[-1]})")
+    
+    input("\nPress Enter to START EXECUTION (watch Task Stream now)...")
+    
+    print("Executing pipeline...")
+    start = time.time()
+    summary = per_sensor_summary(ddf)
     elapsed = time.time() - start
     
-    # Display results
     print("\n" + "=" * 70)
     print("Pipeline Completed!")
     print("=" * 70)
     print(f"Total time: {elapsed:.2f}s")
-    print(f"\nProcessed {n_files} files")
+    print("\nPer-sensor Summary:")
+    print(summary.round(3).T.to_string())
     
-    print("\nStatistics Summary:")
-    print(stats_result[['file_id', 'mean_temp', 'temp_range', 'temp_humidity_corr']].head())
+    return filenames
+
+
+def demo_streaming_pipeline(client, n_files=12, fmt=DEFAULT_FORMAT, interval=1.0):
+    """
+    Demo: Process files as they land in DATA_DIR (see sensor_stream.py)
     
-    print("\nHourly Pattern Summary:")
-    print(patterns_result[['file_id', 'peak_temp_hour', 'peak_temp_value', 'daily_temp_variation']].head())
+    A background producer writes one file every `interval` seconds; each new
+    file gets its own load + stats tasks (Client.submit) and is merged into
+    the running aggregate as soon as it completes (as_completed).
     
-    print(f"\nData files are in: {DATA_DIR}")
-    print("Files will be cleaned up after cluster closes")
+    Args:
+        client: Dask client
+        n_files: Number of files the producer writes
+        fmt: Storage format ('csv', 'parquet' or 'feather')
+        interval: Seconds between file arrivals
+        
+    Returns:
+        list: List of generated filenames (for cleanup later)
+    """
+    print(f"\n[Stream] Watching {DATA_DIR} for {n_files} files ({fmt}), one every {interval}s...")
+    input("\nPress Enter to START the producer (watch Task Stream now)...")
+    print()
     
-    return filenames
+    producer = start_producer(DATA_DIR, n_files, interval, fmt)
+    aggregate, results, failed = stream_directory(client, DATA_DIR, expected=n_files,
+                                                  on_update=print_update, skip_existing=True)
+    producer.join()
+    
+    print("\n" + "=" * 70)
+    print("Stream Completed!")
+    print("=" * 70)
+    print_latency_report(results)
+    if failed:
+        print(f"Failed: {len(failed)} file(s)")
+    if aggregate is not None:
+        stats_result = pd.Series(aggregate.statistics()).drop('file_id')
+        print(f"\nFinal aggregate ({aggregate.n_files} files, {aggregate.n:,} rows):")
+        print(stats_result[['mean_temp', 'std_temp', 'temp_range', 'temp_trend', 'temp_humidity_corr']].to_string())
+    
+    return [sensor_filename(DATA_DIR, i, fmt) for i in range(n_files)]
+
+
+# ============================================================
+# Benchmark Mode (non-interactive)
+# ============================================================
+
+bench_app = typer.Typer(add_completion=False, help="Sensor pipeline throughput benchmark (no prompts).")
+
+
+def measure_run(client, filenames, fanout, simulate, n_threads, cpu_threads=None, annotate=False):
+    """
+    One timed, traced run of the pipeline
+    
+    Args:
+        n_threads: Worker threads in the cluster
+        cpu_threads: Threads meant for CPU work (default: all of them)
+        annotate: Build the pipeline with STAGE_ANNOTATIONS
+    
+    Returns:
+        dict: wall, files/s, rows/s, scheduler overhead per task, thread utilization,
+            I/O-CPU overlap and CPU slot utilization
+    """
+    final = build_pipeline(filenames, fanout, simulate=simulate, annotate=annotate)
+    with trace_tasks(client, None) as trace:
+        start = time.perf_counter()
+        total = final.compute()
+        wall = time.perf_counter() - start
+    
+    # Best case from the measured task times: max(work / threads, critical path)
+    mean_cost = {name: s['compute_s'] / s['count'] for name, s in trace.summary['tasks'].items()}
+    report = analyze_graph(final, costs=mean_cost)
+    ideal = max(report.work / n_threads, report.span)
+    analyze_s = trace.summary['tasks'].get('analyze_file', {}).get('compute_s', 0.0)
+    if annotate:  # analyses can only run on the CPU slots
+        ideal = max(ideal, analyze_s / (cpu_threads or n_threads))
+    return {
+        'wall_s': wall,
+        'files_per_s': len(filenames) / wall,
+        'rows_per_s': total.n / wall,
+        'tasks': report.n_tasks,
+        'overhead_per_task_ms': max(wall - ideal, 0.0) / report.n_tasks * 1e3,
+        # Share of all thread time spent in tasks (sleeps included, not a speedup ratio)
+        'utilization': report.work / (wall * n_threads),
+        # Share of the run with loads and analyses in flight together
+        'overlap': stage_overlap(trace.records, 'load_and_validate', 'analyze_file') / wall,
+        # Share of the CPU threads' time spent analyzing
+        'cpu_busy': analyze_s / (wall * (cpu_threads or n_threads)),
+    }
+
+
+@bench_app.command()
+def bench(n_files: int = typer.Option(12, min=1, help="Sensor files per run"),
+          rows: int = typer.Option(5000, min=1, help="Rows per file"),
+          workers: int = typer.Option(4, min=1, help="Worker processes"),
+          threads_per_worker: int = typer.Option(2, min=1, help="Threads per worker"),
+          no_sleep: bool = typer.Option(False, "--no-sleep", help="Drop the demo delays: real work only"),
+          repeat: int = typer.Option(3, min=1, help="Timed runs (after one untimed warm-up)"),
+          fmt: str = typer.Option(DEFAULT_FORMAT, "--format", help="csv | parquet | feather"),
+          fanout: int = typer.Option(TREE_FANOUT, min=2, help="Partial results merged per aggregation task"),
+          annotate: bool = typer.Option(False, "--annotate",
+                                        help="Loads on extra IO slots, analyses on the CPU threads, stage priorities"),
+          io_slots: int = typer.Option(IO_SLOTS, help="IO slots (extra threads) per worker with --annotate")):
+    """Run the sensor pipeline end to end and report throughput."""
+    cpu_threads = workers * threads_per_worker
+    if annotate:
+        options = stage_cluster_options(threads_per_worker, io_slots)
+        slots = f"{threads_per_worker} CPU + {io_slots} IO slots"
+    else:
+        options = {'threads_per_worker': threads_per_worker}
+        slots = f"{threads_per_worker} threads"
+    n_threads = workers * options['threads_per_worker']
+    print(f"Sensor pipeline benchmark: {n_files} files x {rows:,} rows ({fmt}), "
+          f"{workers} workers x {slots}, "
+          f"{'no sleep' if no_sleep else 'with demo delays'}")
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filenames = generate_sample_files(n_files, fmt, rows, directory=tmpdir)
+        baseline = None
+        if annotate:
+            # Same total threads without annotations: the IO slots alone also speed things up
+            print(f"\nBaseline: no annotations, {workers} workers x {options['threads_per_worker']} threads")
+            baseline = bench_cluster(filenames, workers, {'threads_per_worker': options['threads_per_worker']},
+                                     fanout, not no_sleep, repeat, n_threads)
+            print(f"\nAnnotated: {workers} workers x {slots}")
+        runs = bench_cluster(filenames, workers, options, fanout, not no_sleep, repeat, cpu_threads, annotate)
+    
+    best = min(runs, key=lambda m: m['wall_s'])
+    print(f"\nBest of {repeat}: {best['files_per_s']:.1f} files/s, {best['rows_per_s']:,.0f} rows/s "
+          f"on {n_threads} threads")
+    print(f"  scheduler overhead: {best['overhead_per_task_ms']:.2f} ms/task "
+          f"(wall time beyond max(work / threads, critical path))")
+    print(f"  thread utilization: {best['utilization']:.0%} "
+          f"(task time / (wall x {n_threads} threads); 100% = every thread always busy)")
+    print(f"  I/O-CPU overlap:    {best['overlap']:.0%} of the run had loads and analyses in flight together")
+    print(f"  CPU threads busy:   {best['cpu_busy']:.0%} "
+          f"(analyze time / (wall x {cpu_threads} CPU threads))")
+    if baseline:
+        base = min(baseline, key=lambda m: m['wall_s'])
+        delta = best['wall_s'] - base['wall_s']
+        print(f"  vs. unannotated:    {base['wall_s']:.2f}s -> {best['wall_s']:.2f}s "
+              f"({delta:+.2f}s, {delta / base['wall_s']:+.0%}) on the same {n_threads} threads")
+
+
+def bench_cluster(filenames, workers, options, fanout, simulate, repeat, cpu_threads, annotate=False):
+    """
+    Timed runs on a fresh LocalCluster started with `options`
+    
+    Returns:
+        list: One measure_run() dict per run
+    """
+    n_threads = workers * options['threads_per_worker']
+    with LocalCluster(n_workers=workers, dashboard_address=None, **options) as cluster, \
+            Client(cluster) as client:
+        # Warm-up: imports and connections on every worker, not timed
+        build_pipeline(filenames[:n_threads], fanout, simulate=False, annotate=annotate).compute()
+        
+        print(f"  {'run':>4} {'wall':>9} {'files/s':>9} {'rows/s':>12} {'tasks':>6} "
+              f"{'overhead/task':>14} {'thread util':>12} {'IO|CPU':>7} {'CPU busy':>9}")
+        runs = []
+        for i in range(repeat):
+            m = measure_run(client, filenames, fanout, simulate, n_threads, cpu_threads, annotate)
+            runs.append(m)
+            print(f"  {i + 1:>4} {m['wall_s']:>8.2f}s {m['files_per_s']:>9.1f} {m['rows_per_s']:>12,.0f} "
+                  f"{m['tasks']:>6} {m['overhead_per_task_ms']:>11.2f} ms {m['utilization']:>11.0%} "
+                  f"{m['overlap']:>7.0%} {m['cpu_busy']:>9.0%}")
+    return runs
 
 
 # ============================================================
@@ -511,6 +744,21 @@ def cleanup_data_files(filenames):
 # ============================================================
 
 def main():
+    if '--bench' in sys.argv[1:]:
+        args = [a for a in sys.argv[1:] if a != '--bench']
+        bench_app(args=args, prog_name=f"{Path(sys.argv[0]).name} --bench")
+        return
+    
+    fmt, args = pop_format_arg(sys.argv[1:])
+    use_dataframe = '--dataframe' in args
+    use_stream = '--stream' in args
+    annotate = '--annotate' in args
+    cache = ResultCache() if '--cache' in args else None
+    trace_path = None
+    if '--trace' in args:
+        i = args.index('--trace')
+        has_path = i + 1 < len(args) and not args[i + 1].startswith('--')
+        trace_path = args[i + 1] if has_path else DEFAULT_TRACE_PATH
     cluster = None
     client = None
     filenames = []  # Track generated files
@@ -522,10 +770,11 @@ def main():
         
         # 2. Start LocalCluster
         print("\nStarting Dask LocalCluster...")
+        # --annotate: the 2 threads per worker become CPU slots, loads get extra IO slots
         cluster = LocalCluster(
             n_workers=4,
-            threads_per_worker=2,
-            dashboard_address=':0'
+            dashboard_address=':0',
+            **(stage_cluster_options(2) if annotate else {'threads_per_worker': 2})
         )
         
         client = Client(cluster)
@@ -540,7 +789,13 @@ def main():
         input("\nPress Enter after opening Dashboard and switching to Task Stream...")
         
         # 5. Run realistic pipeline (returns filenames for cleanup)
-        filenames = demo_realistic_pipeline(client, n_files=12)
+        if use_stream:
+            filenames = demo_streaming_pipeline(client, n_files=12, fmt=fmt)
+        elif use_dataframe:
+            filenames = demo_dataframe_pipeline(client, n_files=12, fmt=fmt)
+        else:
+            filenames = demo_realistic_pipeline(client, n_files=12, fmt=fmt, cache=cache,
+                                                trace_path=trace_path, annotate=annotate)
         
         # 6. Wait before closing
         input("\nPress Enter to close the cluster and exit...")
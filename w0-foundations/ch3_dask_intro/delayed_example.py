@@ -6,13 +6,32 @@ Python functions into delayed tasks and automatically build task graphs.
 
 Usage:
 uv run python w0-foundations/ch3_dask_intro/delayed_example.py
+uv run python w0-foundations/ch3_dask_intro/delayed_example.py --cache   (reuse results across runs)
+uv run python w0-foundations/ch3_dask_intro/delayed_example.py --batch-size 2   (fuse load+process, 2 files per task)
+uv run python w0-foundations/ch3_dask_intro/delayed_example.py --autotune   (pick and store the scheduler setup)
 """
+import os
+import sys
 import time
+from contextlib import nullcontext
+from pathlib import Path
 from dask import delayed
 import dask
 
-# Use threads scheduler (suitable for I/O bound tasks)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from autotune import TuningStore, autotune, use_config, workload_name
+from benchkit import scenario
+from fusion import fuse_pipeline, fused_costs
+from graph_analyzer import analyze_graph, format_report
+from result_cache import ResultCache
+
+# Use threads scheduler (suitable for I/O bound tasks) unless a tuned setup is stored
+# (see autotune.py, --autotune)
 dask.config.set(scheduler='threads')
+WORKLOAD = "delayed_example"
+
+# Estimated seconds per task (the sleeps below), for the graph analyzer
+TASK_COSTS = {'load_file': 1.0, 'process_data': 0.5, 'aggregate': 0.0}
 
 
 # ============================================================
@@ -43,43 +62,44 @@ def aggregate(results):
 # Helper Functions: Task Graph Analysis
 # ============================================================
 
-def analyze_task_graph(delayed_obj):
+def analyze_task_graph(delayed_obj, batch_size=None):
     """
-    Analyze Dask task graph structure
+    Analyze Dask task graph structure (see graph_analyzer.py)
+    
+    Args:
+        batch_size: Files per fused task, if the pipeline was built fused
     
     Returns:
-        dict: Task statistics information
+        GraphReport: Task counts, layers, critical path and predicted speedup
     """
-    graph = delayed_obj.__dask_graph__()
-    
-    # Count each task type
-    task_types = {}
-    for key in graph.keys():
-        task_name = str(key).split('-')[0]
-        task_types[task_name] = task_types.get(task_name, 0) + 1
-    
-    return {
-        'task_types': task_types,
-        'total_tasks': len(graph),
-        'graph': graph
-    }
+    costs = fused_costs(TASK_COSTS, [load_file, process_data], batch_size) if batch_size else TASK_COSTS
+    return analyze_graph(delayed_obj, costs=costs)
 
 
-def build_data_pipeline(files):
+def build_data_pipeline(files, cache=None, batch_size=None):
     """
     Build data processing pipeline
     
     Args:
         files: List of file names
+        cache: Optional ResultCache; load/process results are reused across runs
+        batch_size: Fuse load + process into one task per `batch_size` files
+            (see fusion.py); None keeps one task per stage per file
         
     Returns:
         Delayed object: Final aggregated result
     """
+    load, process = (cache(load_file), cache(process_data)) if cache else (load_file, process_data)
+    
+    if batch_size:
+        # One task per batch runs both stages; aggregate still sees every per-file result
+        return fuse_pipeline(files, [load, process], aggregate, batch_size)
+    
     # Step 1: Load files in parallel
-    loaded = [load_file(f) for f in files]
+    loaded = [load(f) for f in files]
     
     # Step 2: Process each file's data in parallel
-    processed = [process_data(data) for data in loaded]
+    processed = [process(data) for data in loaded]
     
     # Step 3: Aggregate all results
     final = aggregate(processed)
@@ -98,26 +118,18 @@ def print_header():
     print("=" * 60)
 
 
-def print_task_graph_info(analysis):
+def print_task_graph_info(analysis, n_workers=None):
     """
     Print task graph analysis results
     
     Args:
         analysis: Return value from analyze_task_graph()
+        n_workers: Threads the scheduler will use
     """
     print("\nTask Graph Structure:")
     print("=" * 60)
     
-    print("\nTask Summary:")
-    for task_name, count in sorted(analysis['task_types'].items()):
-        print(f"   - {task_name}: {count} task(s)")
-    
-    print(f"\nTotal tasks: {analysis['total_tasks']}")
-    
-    print("\nExecution Flow:")
-    print("   Step 1: load_file tasks (4) -> Can execute in parallel")
-    print("   Step 2: process_data tasks (4) -> Can execute in parallel") 
-    print("   Step 3: aggregate task (1) -> Waits for Step 2 to complete")
+    print(format_report(analysis, n_workers))
     print("=" * 60)
 
 
@@ -153,6 +165,17 @@ Speedup: ~4x faster!
     """)
 
 
+# ============================================================
+# Benchmark Scenarios (see benchmark.py)
+# ============================================================
+
+@scenario(warmup=0)
+def pipeline_threads():
+    """4-file pipeline on the threads scheduler (~1.5s when parallel)"""
+    files = [f"file_{i}.csv" for i in range(4)]
+    build_data_pipeline(files).compute()
+
+
 # ============================================================
 # Main Program
 # ============================================================
@@ -164,24 +187,39 @@ def main():
     # 2. Build task graph
     print("\nBuilding task graph...")
     files = [f"file_{i}.csv" for i in range(4)]
-    final = build_data_pipeline(files)
+    args = sys.argv[1:]
+    cache = ResultCache() if '--cache' in args else None
+    batch_size = int(args[args.index('--batch-size') + 1]) if '--batch-size' in args else None
+    if cache:
+        cache.reset_stats()
+    final = build_data_pipeline(files, cache, batch_size)
     print("Task graph built (no computation yet!)")
     
     # 3. Analyze and display task graph
-    analysis = analyze_task_graph(final)
-    print_task_graph_info(analysis)
-    
-    # 4. Display scheduler being used
-    print(f"\nUsing scheduler: {dask.config.get('scheduler')}")
+    analysis = analyze_task_graph(final, batch_size)
+    print_task_graph_info(analysis, n_workers=os.cpu_count())
+    
+    # 4. Pick the scheduler: stored tuned setup, or tune now with --autotune
+    #    (stored per batch size: fused and unfused graphs tune differently)
+    workload = workload_name(WORKLOAD, batch_size=batch_size)
+    if '--autotune' in args:
+        print()
+        config = autotune(workload, lambda fs: build_data_pipeline(fs, batch_size=batch_size), files, force=True)
+    else:
+        config = TuningStore().load(workload)
+    print(f"\nUsing scheduler: {config.label + ' (tuned)' if config else dask.config.get('scheduler')}")
     
     # 5. Execute computation
     print("\nStarting computation with .compute()...\n")
-    start = time.time()
-    result = final.compute()
-    elapsed = time.time() - start
+    with use_config(config) if config else nullcontext():
+        start = time.time()
+        result = final.compute()
+        elapsed = time.time() - start
     
     # 6. Display results
     print_execution_result(result, elapsed)
+    if cache:
+        print(cache.format_stats())
     
     # 7. Display explanation
     print_explanation()
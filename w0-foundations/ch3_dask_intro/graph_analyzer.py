@@ -0,0 +1,273 @@
+"""
+Ch3.4c (helper) - Task Graph Analyzer: Critical Path, Width, Predicted Speedup
+
+Counting keys by name says nothing about how parallel a graph is. Before
+anything runs, `analyze_graph()` inspects the graph of ANY Dask collection
+(delayed, array, dataframe, and xarray objects backed by dask):
+
+- total tasks, tasks per name ("load_and_validate", "mean_chunk", ...)
+- layers: tasks at each dependency depth (the first layer has no inputs)
+- width: the largest layer, i.e. the most tasks that can ever run at once
+- critical path: the most expensive dependency chain (span)
+- fan-in hotspots: tasks with the most inputs (one task holding them all)
+
+With per-task cost estimates (seconds per task name), the work and span give
+the best-case time on N workers (the bound behind Brent's theorem), and the
+scheduler, which handles tasks one at a time (~1 ms each), adds a floor:
+
+    T_N >= max(work / N, span, n_tasks * overhead)      speedup_N <= work / T_N
+
+The overhead term flags graphs with too many tiny tasks, e.g. a year of
+hourly data read one time step per chunk (8760 chunks per variable), before
+anyone calls `.compute()`.
+
+Usage:
+    report = analyze_graph(final, costs={'load_and_validate': 2.0, 'analyze_file': 3.0})
+    print(format_report(report, n_workers=8))
+
+操作說明：
+uv run python w0-foundations/ch3_dask_intro/graph_analyzer.py     (delayed pipeline, hourly dask array, xarray)
+"""
+from collections import Counter
+from typing import NamedTuple
+
+import numpy as np
+from dask.core import get_deps
+from dask.utils import key_split
+
+# ============================================================
+# Configuration
+# ============================================================
+
+DEFAULT_COST = 0.001            # seconds per task without an estimate
+SCHEDULER_OVERHEAD = 0.001      # seconds of scheduler time per task (distributed)
+LARGE_GRAPH_TASKS = 10_000      # flag graphs with more tasks than this
+LARGE_LAYER_TASKS = 5_000       # ... or one task name repeated this often (tiny chunks)
+WORKER_COUNTS = (1, 2, 4, 8, 16, 32)
+N_HOTSPOTS = 3
+
+
+class GraphReport(NamedTuple):
+    n_tasks: int
+    task_types: dict        # {task name: count}
+    layers: list            # tasks per depth, first layer = no dependencies
+    width: int              # largest layer
+    work: float             # sum of task costs (seconds)
+    span: float             # cost of the critical path (seconds)
+    critical_path: list     # task names along the critical path, first to last
+    hotspots: list          # [(task name, most inputs of one such task)], largest first
+    warnings: list
+
+    @property
+    def depth(self):
+        return len(self.layers)
+
+    def best_time(self, n_workers):
+        """Lower bound on the run time with n workers (seconds)."""
+        return max(self.work / n_workers, self.span, self.scheduler_overhead())
+
+    def speedup(self, n_workers):
+        """Best-case speedup over one worker."""
+        best = self.best_time(n_workers)
+        return self.work / best if best else 1.0
+
+    def scheduler_overhead(self):
+        return self.n_tasks * SCHEDULER_OVERHEAD
+
+
+# ============================================================
+# Analysis
+# ============================================================
+
+def _graph_of(collections):
+    dsk = {}
+    for c in collections:
+        if not hasattr(c, '__dask_graph__'):
+            raise TypeError(f"Not a Dask collection: {type(c).__name__}")
+        dsk.update(c.__dask_graph__())
+    return dsk
+
+
+def _topological_order(dependencies, dependents):
+    """Kahn's algorithm, iterative (graphs can be far deeper than the recursion limit)."""
+    remaining = {k: len(v) for k, v in dependencies.items()}
+    order = [k for k, n in remaining.items() if n == 0]
+    for key in order:  # order grows while we iterate
+        for child in dependents[key]:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                order.append(child)
+    return order
+
+
+def analyze_graph(*collections, costs=None, default_cost=DEFAULT_COST):
+    """
+    Analyze the task graph of one or more Dask collections without running it.
+
+    Args:
+        *collections: Delayed / Array / DataFrame / xarray objects
+        costs: {task name: seconds per task}; a name is `dask.utils.key_split(key)`
+        default_cost: Seconds for tasks whose name is not in costs
+
+    Returns:
+        GraphReport
+    """
+    dsk = _graph_of(collections)
+    if not dsk:
+        return GraphReport(0, {}, [], 0, 0.0, 0.0, [], [], [])
+    costs = costs or {}
+    dependencies, dependents = get_deps(dsk)
+    names = {k: key_split(k) for k in dsk}
+    cost = {k: costs.get(names[k], default_cost) for k in dsk}
+
+    # Longest path in cost (finish time with infinite workers) and in tasks (depth)
+    order = _topological_order(dependencies, dependents)
+    finish, level, via = {}, {}, {}
+    for key in order:
+        deps = dependencies[key]
+        prev = max(deps, key=finish.__getitem__) if deps else None
+        finish[key] = cost[key] + (finish[prev] if prev is not None else 0.0)
+        level[key] = 1 + max((level[d] for d in deps), default=-1)
+        via[key] = prev
+
+    layers = np.bincount(list(level.values())).tolist()
+    # On ties prefer the later task, so zero-cost tails (aggregates) stay on the path
+    last = end = max(reversed(order), key=finish.__getitem__)
+    path = []
+    while end is not None:
+        path.append(names[end])
+        end = via[end]
+    fan_in = {}
+    for key, deps in dependencies.items():
+        if len(deps) > 1:
+            fan_in[names[key]] = max(fan_in.get(names[key], 0), len(deps))
+    hotspots = sorted(fan_in.items(), key=lambda item: -item[1])[:N_HOTSPOTS]
+
+    report = GraphReport(
+        n_tasks=len(dsk),
+        task_types=dict(Counter(names.values()).most_common()),
+        layers=layers,
+        width=max(layers),
+        work=sum(cost.values()),
+        span=finish[last],
+        critical_path=path[::-1],
+        hotspots=hotspots,
+        warnings=[],
+    )
+    report.warnings.extend(_warnings(report))
+    return report
+
+
+def _warnings(report):
+    warnings = []
+    if report.n_tasks > LARGE_GRAPH_TASKS:
+        warnings.append(f"{report.n_tasks:,} tasks: the graph itself is expensive to build, "
+                        f"ship and schedule (~{report.scheduler_overhead():.0f}s of scheduler time)")
+    for name, count in report.task_types.items():
+        if count > LARGE_LAYER_TASKS:
+            warnings.append(f"{count:,} '{name}' tasks: chunks are probably too small; "
+                            f"rechunk so each task does more work")
+    if report.work and report.scheduler_overhead() > 0.1 * report.work:
+        warnings.append(f"scheduler overhead (~{report.scheduler_overhead():.1f}s) exceeds 10% "
+                        f"of the estimated work ({report.work:.1f}s): tasks are too fine-grained")
+    for name, n_inputs in report.hotspots[:1]:
+        if n_inputs > 100:
+            warnings.append(f"'{name}' has {n_inputs:,} inputs: one worker must hold them all; "
+                            f"use a tree reduction (reductions.tree_reduce)")
+    return warnings
+
+
+# ============================================================
+# Display
+# ============================================================
+
+def _pairs(items):
+    return ", ".join(f"{name} ({n:,})" for name, n in items)
+
+
+def _path(names):
+    # Collapse runs of the same task name: "load_and_validate -> analyze_file -> merge_results x2"
+    runs = []
+    for name in names:
+        if runs and runs[-1][0] == name:
+            runs[-1][1] += 1
+        else:
+            runs.append([name, 1])
+    return " -> ".join(name if n == 1 else f"{name} x{n}" for name, n in runs)
+
+
+def format_report(report, n_workers=None):
+    """
+    Human-readable report.
+
+    Args:
+        report: GraphReport
+        n_workers: Highlight this worker count in the speedup table
+    """
+    lines = [
+        f"Tasks: {report.n_tasks:,}   depth: {report.depth}   width: {report.width:,}",
+        f"Task types: {_pairs(report.task_types.items())}",
+        f"Tasks per layer: {', '.join(f'{n:,}' for n in report.layers)}",
+        f"Critical path ({len(report.critical_path)} tasks, {report.span:.2f}s): "
+        f"{_path(report.critical_path)}",
+    ]
+    if report.hotspots:
+        lines.append(f"Fan-in hotspots: {_pairs(report.hotspots)}")
+    lines.append(f"Estimated work: {report.work:.2f}s   "
+                 f"scheduler overhead: ~{report.scheduler_overhead():.2f}s")
+    lines.append("Best case by workers:")
+    counts = sorted(set(WORKER_COUNTS) | ({n_workers} if n_workers else set()))
+    for n in counts:
+        mark = "  <- this run" if n == n_workers else ""
+        lines.append(f"  {n:>4} workers: >= {report.best_time(n):7.2f}s  "
+                     f"speedup <= {report.speedup(n):5.1f}x{mark}")
+    for warning in report.warnings:
+        lines.append(f"WARNING: {warning}")
+    return "\n".join(lines)
+
+
+# ============================================================
+# Main: three graphs, analyzed without computing
+# ============================================================
+
+def main():
+    import dask.array as da
+    from dask import delayed
+
+    def load(i):
+        return i
+
+    def process(x):
+        return x
+
+    def aggregate(xs):
+        return sum(xs)
+
+    print("=" * 70)
+    print("1. delayed pipeline: 12 loads -> 12 analyses -> one flat aggregate")
+    print("=" * 70)
+    loaded = [delayed(load)(i) for i in range(12)]
+    final = delayed(aggregate)([delayed(process)(x) for x in loaded])
+    print(format_report(analyze_graph(final, costs={'load': 2.0, 'process': 3.0, 'aggregate': 0.2}),
+                        n_workers=8))
+
+    print("\n" + "=" * 70)
+    print("2. One year of hourly fields, one time step per chunk: time mean")
+    print("=" * 70)
+    hourly = da.zeros((8760, 121, 161), chunks=(1, -1, -1))
+    print(format_report(analyze_graph(hourly.mean(axis=0), costs={'mean_chunk': 0.005}), n_workers=8))
+
+    print("\n" + "=" * 70)
+    print("3. xarray: the same data, 24 time steps per chunk")
+    print("=" * 70)
+    try:
+        import xarray as xr
+    except ImportError:
+        print("xarray not installed")
+        return
+    field = xr.DataArray(da.zeros((8760, 121, 161), chunks=(24, -1, -1)), dims=('time', 'lat', 'lon'))
+    print(format_report(analyze_graph(field.mean('time'), costs={'mean_chunk': 0.1}), n_workers=8))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Ch3.4b (helper) - Tree Reductions for Delayed Graphs
+
+A fan-in like `aggregate(results)` is ONE task that receives every input:
+with 10k files, one worker must hold all 10k results in memory and merge
+them serially while the rest of the cluster sits idle.
+
+`tree_reduce()` combines the inputs `fanout` at a time, level by level:
+
+    level 0:  r0 r1 r2 r3 r4 r5 r6 r7 r8 ...      (n inputs)
+    level 1:  combine(r0..r3) combine(r4..r7) ... (n / fanout tasks)
+    ...
+    top:      one task, ceil(log_fanout(n)) levels deep
+
+so every task holds at most `fanout` inputs and the combines of one level
+run in parallel on many workers. `combine` must be associative and accept
+a list (e.g. `sensor_stats.merge_partials`).
+
+操作說明：
+uv run python w0-foundations/ch3_dask_intro/reductions.py          (flat fan-in vs tree, graph shape)
+uv run python w0-foundations/ch3_dask_intro/reductions.py 10000    (n inputs)
+"""
+import sys
+
+from dask import delayed
+from dask.core import get_dependencies
+
+# ============================================================
+# Configuration
+# ============================================================
+
+DEFAULT_FANOUT = 8
+
+
+# ============================================================
+# Tree reduction
+# ============================================================
+
+def tree_depth(n, fanout=DEFAULT_FANOUT):
+    """
+    Number of combine levels tree_reduce() builds for n inputs.
+
+    Counted with integers: math.log(125, 5) is 3.0000000000000004, so
+    ceil(log(n, fanout)) is one level too many for exact powers.
+    """
+    depth = 0
+    while n > 1:
+        n = -(-n // fanout)
+        depth += 1
+    return depth
+
+
+def tree_reduce(items, combine, fanout=DEFAULT_FANOUT, **kwargs):
+    """
+    Reduce delayed items with a tree of combine tasks.
+
+    Args:
+        items: Delayed objects (or plain values) to combine
+        combine: Function list -> item; wrapped in delayed() unless it already is
+        fanout: Inputs per combine task (>= 2)
+        **kwargs: Passed to every combine call
+
+    Returns:
+        Delayed: The single top-level result
+    """
+    if fanout < 2:
+        raise ValueError("fanout must be at least 2")
+    level = list(items)
+    if not level:
+        raise ValueError("tree_reduce() of an empty sequence")
+    if not hasattr(combine, 'dask'):
+        combine = delayed(combine, pure=True)
+    while len(level) > 1:
+        level = [combine(level[i:i + fanout], **kwargs) for i in range(0, len(level), fanout)]
+    return level[0]
+
+
+# ============================================================
+# Main: graph shape of a flat fan-in vs a tree
+# ============================================================
+
+def _combine(values):
+    return sum(values)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    leaves = [delayed(i, name=f"leaf-{i}") for i in range(n)]
+    print("=" * 60)
+    print(f"Reducing {n:,} inputs")
+    print("=" * 60)
+    print(f"  {'plan':<16} {'tasks':>8} {'depth':>6} {'max inputs/task':>16} {'result':>12}")
+    for label, obj, depth in [
+        ("flat fan-in", delayed(_combine)(leaves), 1),
+        *[(f"tree fanout={f}", tree_reduce(leaves, _combine, f), tree_depth(n, f)) for f in (4, 8, 32)],
+    ]:
+        graph = dict(obj.__dask_graph__())
+        widest = max(len(get_dependencies(graph, k)) for k in graph)
+        print(f"  {label:<16} {len(graph):>8,} {depth:>6} {widest:>16,} {obj.compute(scheduler='sync'):>12,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""
+Ch3.4c (helper) - Content-addressed Result Cache for Delayed Functions
+
+Rerunning a pipeline recomputes every task, even when nothing changed.
+`ResultCache` wraps a function (plain or `@delayed`) so that each call is
+keyed by WHAT it computes:
+
+    key = sha256(function source, argument tokens, input-file mtime + size)
+
+- function source: editing the function invalidates its results
+- argument tokens: `dask.base.tokenize` (DataFrames and arrays by content),
+  so a downstream task recomputes exactly when its upstream result changed
+- str / Path arguments that name a file add (mtime_ns, size): rewriting a
+  file invalidates the tasks that read it
+
+Results are pickled to one file per key on local disk. Every hit bumps the
+file's mtime, and old entries are evicted least-recently-used first once the
+cache exceeds `max_bytes`. Hits and misses are appended to a log in the cache
+directory, so counts cover every worker process, not only the client.
+
+Usage:
+    cache = ResultCache()
+    load = cache(load_and_validate)         # a @delayed function stays delayed
+    analyze = cache(analyze_file)
+    partials = [analyze(load(f), i) for i, f in enumerate(files)]
+    print(cache.format_stats())
+
+操作說明：
+uv run python w0-foundations/ch3_dask_intro/result_cache.py     (run, rerun, change one file, rerun)
+"""
+import hashlib
+import inspect
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from functools import wraps
+from pathlib import Path
+
+import dask
+from dask import delayed
+from dask.base import tokenize
+from dask.delayed import DelayedLeaf
+
+from reductions import tree_reduce
+from sensor_stats import SensorPartial, merge_partials
+from sensor_storage import make_sensor_frame, read_sensor_file, sensor_filename, write_sensor_file
+
+# ============================================================
+# Configuration
+# ============================================================
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / ".result_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+EVENTS_LOG = "events.log"
+SUFFIX = ".pkl"
+
+MB = 1024 ** 2
+
+
+# ============================================================
+# Keys
+# ============================================================
+
+def code_hash(func):
+    """Hash of a function's source (bytecode when the source is unavailable)."""
+    try:
+        source = inspect.getsource(func).encode()
+    except (OSError, TypeError):
+        code = func.__code__
+        source = code.co_code + repr(code.co_consts).encode()
+    return hashlib.sha256(source).hexdigest()
+
+
+def _file_state(arg):
+    """(path, mtime_ns, size) for arguments that name an existing file, else None."""
+    if not isinstance(arg, (str, Path)):
+        return None
+    try:
+        st = os.stat(arg)
+    except (OSError, ValueError):
+        return None
+    return (str(arg), st.st_mtime_ns, st.st_size) if os.path.isfile(arg) else None
+
+
+def result_key(func, args, kwargs, func_hash=None):
+    """
+    Content address of func(*args, **kwargs).
+
+    Raises:
+        RuntimeError: An argument cannot be tokenized deterministically
+    """
+    files = [_file_state(a) for a in (*args, *kwargs.values())]
+    with dask.config.set({'tokenize.ensure-deterministic': True}):
+        token = tokenize(args, kwargs, files)
+    return hashlib.sha256(f"{func.__qualname__}:{func_hash or code_hash(func)}:{token}".encode()).hexdigest()
+
+
+# ============================================================
+# Cache
+# ============================================================
+
+class ResultCache:
+    """
+    On-disk cache of function results, LRU-evicted under a size cap.
+
+    Only the directory and the cap are kept on the object, so it pickles
+    cheaply into worker processes together with the wrapped functions.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    # --- Entries ---
+    def _path(self, key):
+        return self.directory / f"{key}{SUFFIX}"
+
+    def get(self, key):
+        """
+        Returns:
+            tuple: (hit, value)
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return False, None
+        os.utime(path)  # mark as recently used
+        return True, value
+
+    def put(self, key, value):
+        path = self._path(key)
+        # Write under a private name, then rename: readers never see partial files
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.evict()
+
+    def entries(self):
+        """(mtime, size, path) of every entry, least recently used first."""
+        entries = []
+        for path in self.directory.glob(f"*{SUFFIX}"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue  # evicted by another process
+            entries.append((st.st_mtime_ns, st.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    # --- Hit rates ---
+    def _record(self, name, event):
+        # One short O_APPEND write per lookup: safe across processes
+        with open(self.directory / EVENTS_LOG, 'a') as f:
+            f.write(f"{name}\t{event}\n")
+
+    def stats(self):
+        """
+        Returns:
+            dict: {function name: {'hits', 'misses', 'hit_rate'}}
+        """
+        counts = Counter()
+        try:
+            with open(self.directory / EVENTS_LOG) as f:
+                counts.update(tuple(line.rstrip('\n').split('\t')) for line in f)
+        except FileNotFoundError:
+            pass
+        names = sorted({name for name, _ in counts})
+        result = {}
+        for name in names:
+            hits, misses = counts[name, 'hit'], counts[name, 'miss']
+            result[name] = {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses)}
+        return result
+
+    def reset_stats(self):
+        (self.directory / EVENTS_LOG).unlink(missing_ok=True)
+
+    def format_stats(self):
+        entries = self.entries()
+        lines = [f"Cache {self.directory}: {len(entries)} entries, "
+                 f"{sum(size for _, size, _ in entries) / MB:.1f} / {self.max_bytes / MB:.0f} MB"]
+        for name, s in self.stats().items():
+            lines.append(f"  {name:<20} {s['hits']:>4} hits {s['misses']:>4} misses  "
+                         f"hit rate {s['hit_rate']:6.1%}")
+        return "\n".join(lines)
+
+    # --- Decorator ---
+    def __call__(self, func):
+        """
+        Wrap func so its results are cached; a @delayed function stays delayed
+        (with the same pure / nout options).
+        """
+        if isinstance(func, DelayedLeaf):
+            return delayed(self(func._obj), pure=func._pure, nout=func._nout)
+
+        func_hash = code_hash(func)
+        name = func.__name__
+        cache = self
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                key = result_key(func, args, kwargs, func_hash)
+            except RuntimeError:
+                return func(*args, **kwargs)  # not content-addressable: always run
+            hit, value = cache.get(key)
+            cache._record(name, 'hit' if hit else 'miss')
+            if not hit:
+                value = func(*args, **kwargs)
+                cache.put(key, value)
+            return value
+
+        wrapper.cache = self
+        return wrapper
+
+
+# ============================================================
+# Main: rerun with one changed file
+# ============================================================
+
+@delayed
+def load(path):
+    """I/O: read one sensor file"""
+    time.sleep(0.2)
+    return read_sensor_file(path)
+
+
+@delayed
+def analyze(df):
+    """CPU: per-file partial statistics"""
+    time.sleep(0.5)
+    return SensorPartial.from_frame(df)
+
+
+def build(cache, paths):
+    cached_load, cached_analyze = cache(load), cache(analyze)
+    partials = [cached_analyze(cached_load(str(p))) for p in paths]
+    return tree_reduce(partials, merge_partials, 4)
+
+
+def main():
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    if n_files < 1:
+        print("錯誤：檔案數必須至少為 1")
+        sys.exit(1)
+    changed = min(5, n_files - 1)  # the file rewritten before the last run
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = ResultCache(Path(tmpdir) / "cache")
+        paths = [sensor_filename(tmpdir, i) for i in range(n_files)]
+        for p in paths:
+            write_sensor_file(make_sensor_frame(5000), p)
+
+        print("=" * 70)
+        print(f"{n_files}-file pipeline, cached load + analyze")
+        print("=" * 70)
+        for label in ("cold run", "rerun, nothing changed", f"rerun, file {changed} rewritten"):
+            if label.endswith("rewritten"):
+                write_sensor_file(make_sensor_frame(5000), paths[changed])
+            cache.reset_stats()
+            start = time.perf_counter()
+            total = build(cache, paths).compute(scheduler='threads', num_workers=n_files)
+            print(f"\n{label}: {time.perf_counter() - start:.2f}s, "
+                  f"mean_temp {total.statistics()['mean_temp']:.4f}")
+            print(cache.format_stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Ch3.4b (helper) - Sensor Files as One dask.dataframe
+
+`dashboard_demo.demo_realistic_pipeline` analyzes one pandas DataFrame per
+file: per-sensor questions and rolling windows stop at file boundaries.
+This module reads all files as the partitions of ONE dask DataFrame:
+
+- indexed by timestamp, with KNOWN divisions taken from the Parquet footer
+  statistics (other formats read only the timestamp column), so dask knows
+  which partition holds which time range without loading the data
+- per-sensor statistics by partial aggregation: every partition is grouped
+  locally, then the small per-sensor partials are combined in a tree
+  (`split_every`). No shuffle, and no worker ever holds more than one
+  partition plus a few partials, so months of data larger than one worker's
+  memory are fine
+- time-windowed rolling means via `map_overlap`: each partition borrows the
+  last `window` of rows from its predecessor, so the rolling window is
+  correct across file boundaries
+
+操作說明：
+uv run python w0-foundations/ch3_dask_intro/sensor_frames.py              (check against pandas, show results)
+uv run python w0-foundations/ch3_dask_intro/sensor_frames.py 30 10000     (n_files, rows per file)
+"""
+import sys
+import tempfile
+
+import dask
+import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from sensor_storage import (DEFAULT_FORMAT, format_of, make_sensor_frame, read_sensor_file,
+                            read_sensor_table, sensor_filename, write_sensor_file)
+
+# ============================================================
+# Configuration
+# ============================================================
+
+ROLLING_WINDOW = '24h'
+SPLIT_EVERY = 8  # partials combined per aggregation task
+
+SENSOR_AGGREGATIONS = {
+    'temperature': ['count', 'mean', 'std', 'min', 'max'],
+    'humidity': ['mean', 'std'],
+    'pressure': ['mean', 'std'],
+}
+
+
+# ============================================================
+# Read: one partition per file, known divisions
+# ============================================================
+
+def file_time_range(path):
+    """
+    (first, last) timestamp of a sensor file.
+
+    Parquet: from the footer statistics, without reading any data.
+    CSV / Feather: from the timestamp column alone.
+    """
+    if format_of(path) == 'parquet':
+        metadata = pq.ParquetFile(path).metadata
+        index = [metadata.schema.column(i).name for i in range(metadata.num_columns)].index('timestamp')
+        stats = [metadata.row_group(rg).column(index).statistics for rg in range(metadata.num_row_groups)]
+        if all(s is not None and s.has_min_max for s in stats):
+            return pd.Timestamp(min(s.min for s in stats)), pd.Timestamp(max(s.max for s in stats))
+    timestamps = read_sensor_table(path, ['timestamp'], validate=False).column('timestamp')
+    return pd.Timestamp(timestamps[0].as_py()), pd.Timestamp(timestamps[-1].as_py())
+
+
+def _load_partition(path, columns):
+    """One sensor file as a partition: timestamp index, sorted."""
+    df = read_sensor_file(path, ['timestamp', *columns]).set_index('timestamp')
+    return df if df.index.is_monotonic_increasing else df.sort_index()
+
+
+def read_sensor_dataframe(paths, columns=None):
+    """
+    Read sensor files as one dask DataFrame indexed by timestamp.
+
+    Args:
+        paths: Sensor files; each must cover its own time range
+        columns: Data columns to read (default: all but timestamp)
+
+    Returns:
+        dask.dataframe.DataFrame: One partition per file, known divisions
+    """
+    columns = list(columns or ['sensor_id', 'temperature', 'humidity', 'pressure'])
+    ranges = sorted((file_time_range(p), p) for p in paths)
+    if not ranges:
+        raise ValueError("read_sensor_dataframe() needs at least one file")
+    for ((_, prev_last), prev), ((first, _), path) in zip(ranges, ranges[1:]):
+        if first <= prev_last:
+            raise ValueError(f"Time ranges overlap: {prev} and {path}")
+
+    paths = [p for _, p in ranges]
+    divisions = [first for (first, _), _ in ranges] + [ranges[-1][0][1]]
+    meta = _load_partition(paths[0], columns).iloc[:0]
+    return dd.from_map(_load_partition, paths, columns=columns, meta=meta, divisions=divisions)
+
+
+# ============================================================
+# Per-sensor analytics
+# ============================================================
+
+def per_sensor_statistics(ddf, split_every=SPLIT_EVERY):
+    """
+    Per-sensor statistics by partial aggregation (no shuffle).
+
+    Returns:
+        dask DataFrame: one row per sensor, (column, statistic) columns
+    """
+    aggregations = {c: a for c, a in SENSOR_AGGREGATIONS.items() if c in ddf.columns}
+    return ddf.groupby('sensor_id', observed=True).agg(
+        aggregations, split_every=split_every, split_out=1)
+
+
+def _rolling_per_sensor(df, column, window):
+    return df.groupby('sensor_id', observed=True)[column].transform(
+        lambda s: s.rolling(window).mean())
+
+
+def rolling_mean(ddf, column='temperature', window=ROLLING_WINDOW):
+    """
+    Time-windowed rolling mean of column per sensor, across file boundaries.
+
+    Each partition is extended by `window` of rows from the previous
+    partition (map_overlap), which needs known divisions.
+
+    Returns:
+        dask Series: aligned with ddf
+    """
+    if not ddf.known_divisions:
+        raise ValueError("rolling_mean() needs known divisions (timestamp index)")
+    return ddf.map_overlap(_rolling_per_sensor, before=pd.Timedelta(window), after=0,
+                           column=column, window=window, meta=(column, 'f8'))
+
+
+def per_sensor_summary(ddf, window=ROLLING_WINDOW):
+    """
+    Per-sensor statistics plus the peak rolling mean, computed in one pass.
+
+    Returns:
+        DataFrame: one row per sensor
+    """
+    stats = per_sensor_statistics(ddf)
+    stats.columns = [f"{c}_{s}" for c, s in stats.columns]
+    rolling = rolling_mean(ddf, 'temperature', window).to_frame('rolling')
+    rolling['sensor_id'] = ddf['sensor_id']
+    peaks = rolling.groupby('sensor_id', observed=True)['rolling'].max(split_every=SPLIT_EVERY)
+    stats, peaks = dask.compute(stats, peaks)
+    stats[f'peak_rolling_temp_{window}'] = peaks
+    stats.index = stats.index.astype(str)  # sort by name, not category order
+    return stats.sort_index()
+
+
+# ============================================================
+# Main: check against pandas on the concatenated data
+# ============================================================
+
+def _reference(paths, window):
+    df = pd.concat([read_sensor_file(p).set_index('timestamp') for p in paths]).sort_index()
+    stats = df.groupby('sensor_id', observed=True).agg(SENSOR_AGGREGATIONS)
+    rolling = _rolling_per_sensor(df, 'temperature', window)
+    return stats, rolling
+
+
+def main():
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = []
+        for i in range(n_files):
+            start = pd.Timestamp('2024-01-01') + pd.Timedelta(minutes=i * rows)
+            paths.append(sensor_filename(tmpdir, i, DEFAULT_FORMAT))
+            write_sensor_file(make_sensor_frame(rows, rng, start=start), paths[-1])
+
+        ddf = read_sensor_dataframe(paths)
+        print("=" * 70)
+        print(f"{n_files} files x {rows:,} rows as one dask DataFrame")
+        print("=" * 70)
+        print(f"  partitions:      {ddf.npartitions}")
+        print(f"  known divisions: {ddf.known_divisions} "
+              f"({ddf.divisions[0]} .. {ddf.divisions[-1]})")
+
+        stats = per_sensor_statistics(ddf)
+        keys = [str(k) for k in dict(stats.__dask_graph__())]
+        print(f"  groupby tasks:   {len(keys)} ({sum('shuffle' in k for k in keys)} shuffle)")
+
+        ref_stats, ref_rolling = _reference(paths, ROLLING_WINDOW)
+        stats_diff = np.abs(stats.compute().sort_index() - ref_stats.sort_index()).max().max()
+        rolling_diff = np.abs(rolling_mean(ddf).compute() - ref_rolling).max()
+        print(f"  max |dask - pandas|: statistics {stats_diff:.2e}, "
+              f"rolling {ROLLING_WINDOW} {rolling_diff:.2e}")
+
+        print("\nPer-sensor summary:")
+        print(per_sensor_summary(ddf).round(3).T.to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,354 @@
+"""
+Ch3.4b (helper) - Fused Sensor Statistics Kernel
+
+`dashboard_demo` used to run two CPU tasks per file, and each one scanned
+the same DataFrame again: a full `sort_values` plus a rolling mean for the
+trend, a dozen separate `.mean()`/`.std()`/`.min()`/`.corr()` passes, and a
+pandas groupby after writing an `hour` column into the shared input.
+
+`file_statistics()` computes every per-file number in one vectorized NumPy
+pass over the column arrays, without copying or mutating the DataFrame:
+
+- means, stds and correlations from one Gram matrix (X @ X.T) of the three
+  measurement columns, shifted by their first row for numerical stability
+- the hourly groupby as `np.bincount` over hour codes derived arithmetically
+  from the int64 timestamps
+- sensor shares from `np.bincount` over the dictionary codes
+- the 24h trend from the last 1440 rows (no sort when already in time order)
+
+The accumulators live in `SensorPartial`, which merges (Chan et al.
+pairwise moments, per-hour accumulators, bounded trend tail), so files can
+be combined in a tree reduction instead of one fan-in task.
+
+`reference_statistics()` / `reference_hourly_patterns()` are the original
+pandas implementations, kept to check the kernel and measure the speedup.
+
+操作說明：
+uv run python w0-foundations/ch3_dask_intro/sensor_stats.py            (verify + time, 5,000 rows)
+uv run python w0-foundations/ch3_dask_intro/sensor_stats.py 100000
+"""
+import functools
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from sensor_storage import make_sensor_frame
+
+# ============================================================
+# Configuration
+# ============================================================
+
+MEASUREMENTS = ('temperature', 'humidity', 'pressure')
+TREND_WINDOW = 60 * 24          # rows in the 24h moving average (1 row per minute)
+NS_PER_HOUR = 3_600 * 10**9
+HOURS = 24
+
+
+# ============================================================
+# Fused kernel
+# ============================================================
+
+def _sensor_counts(sensor):
+    """Rows per sensor id, from the dictionary codes."""
+    if isinstance(sensor.dtype, pd.CategoricalDtype):
+        codes, categories = sensor.cat.codes.to_numpy(), sensor.cat.categories
+    else:
+        codes, categories = pd.factorize(sensor)
+    counts = np.bincount(codes, minlength=len(categories))
+    return {str(c): int(k) for c, k in zip(categories, counts) if k}
+
+
+def _merge_moments(n_a, mean_a, m2_a, n_b, mean_b, m2_b):
+    """
+    Chan et al. pairwise update of (count, mean, centered second moments).
+
+    Works elementwise on arrays (per-hour accumulators) and on a mean vector
+    with a co-moment matrix (m2 as outer products).
+    """
+    n = n_a + n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(n > 0, n_b / np.where(n > 0, n, 1), 0.0)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * w
+    if np.ndim(m2_a) == 2:
+        m2 = m2_a + m2_b + np.outer(delta, delta) * (n_a * w)
+    else:
+        m2 = m2_a + m2_b + delta * delta * (n_a * w)
+    return n, mean, m2
+
+
+class SensorPartial:
+    """
+    Mergeable partial aggregate of sensor rows (one file, or many merged).
+
+    Holds only fixed-size accumulators, so merging 10k files costs the same
+    memory as merging two:
+    - count, mean vector and co-moment matrix of temperature/humidity/pressure
+    - temperature min/max
+    - per-hour count, mean and M2 of temperature
+    - rows per sensor id
+    - first reading and the last TREND_WINDOW readings (for the 24h trend)
+
+    Usage:
+        partial = SensorPartial.from_frame(df)
+        total = functools.reduce(SensorPartial.merge, partials)
+        total.statistics(), total.hourly_pattern()
+    """
+
+    def __init__(self, n, mean, m2, t_min, t_max, hour_n, hour_mean, hour_m2,
+                 sensors, first, tail_ts, tail_temp, n_files=1):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+        self.t_min = t_min
+        self.t_max = t_max
+        self.hour_n = hour_n
+        self.hour_mean = hour_mean
+        self.hour_m2 = hour_m2
+        self.sensors = sensors
+        self.first = first            # (timestamp ns, temperature) of the earliest row
+        self.tail_ts = tail_ts        # timestamps of the latest TREND_WINDOW rows, in time order
+        self.tail_temp = tail_temp
+        self.n_files = n_files
+
+    @classmethod
+    def empty(cls, n_files=1):
+        """Partial of no rows (an empty file or partition); merging it changes nothing."""
+        k = len(MEASUREMENTS)
+        return cls(n=0, mean=np.zeros(k), m2=np.zeros((k, k)), t_min=np.inf, t_max=-np.inf,
+                   hour_n=np.zeros(HOURS, dtype=np.int64), hour_mean=np.zeros(HOURS), hour_m2=np.zeros(HOURS),
+                   sensors={}, first=(np.iinfo(np.int64).max, np.nan),
+                   tail_ts=np.empty(0, dtype=np.int64), tail_temp=np.empty(0), n_files=n_files)
+
+    @classmethod
+    def from_frame(cls, df):
+        """One vectorized pass over the column arrays; df is not copied or modified."""
+        n = len(df)
+        if n == 0:
+            return cls.empty()
+        # int64 nanoseconds (no copy when the column is already datetime64[ns])
+        timestamps = df['timestamp'].to_numpy().astype('datetime64[ns]', copy=False).view('i8')
+        columns = [df[c].to_numpy(dtype=np.float64) for c in MEASUREMENTS]
+
+        # --- Moments of the three measurements: one Gram matrix ---
+        x = np.stack(columns)              # (3, n) scratch array; the DataFrame is untouched
+        shift = x[:, 0].copy()
+        x -= shift[:, None]
+        sums = x.sum(axis=1)
+        m2 = x @ x.T - np.outer(sums, sums) / n
+        t = x[0]                           # shifted temperature
+
+        # --- Hourly groupby: bincount over hour codes ---
+        hour = (timestamps // NS_PER_HOUR) % HOURS
+        hour_n = np.bincount(hour, minlength=HOURS)
+        h_sum = np.bincount(hour, weights=t, minlength=HOURS)
+        h_sumsq = np.bincount(hour, weights=t * t, minlength=HOURS)
+        safe_n = np.maximum(hour_n, 1)
+        hour_m2 = np.where(hour_n > 0, h_sumsq - h_sum * h_sum / safe_n, 0.0)
+        hour_mean = np.where(hour_n > 0, h_sum / safe_n + shift[0], 0.0)
+
+        # --- Time order only for the trend (no sort when already ordered) ---
+        temperature = columns[0]
+        if n > 1 and not np.all(timestamps[1:] >= timestamps[:-1]):
+            order = np.argsort(timestamps, kind='stable')
+            timestamps, temperature = timestamps[order], temperature[order]
+
+        return cls(n=n, mean=shift + sums / n, m2=m2,
+                   t_min=float(t.min() + shift[0]), t_max=float(t.max() + shift[0]),
+                   hour_n=hour_n, hour_mean=hour_mean, hour_m2=hour_m2,
+                   sensors=_sensor_counts(df['sensor_id']),
+                   first=(int(timestamps[0]), float(temperature[0])),
+                   tail_ts=timestamps[-TREND_WINDOW:].copy(),
+                   tail_temp=temperature[-TREND_WINDOW:].copy())
+
+    def merge(self, other):
+        """Combine two partials (associative and commutative); returns a new partial."""
+        n, mean, m2 = _merge_moments(self.n, self.mean, self.m2, other.n, other.mean, other.m2)
+        hour_n, hour_mean, hour_m2 = _merge_moments(self.hour_n, self.hour_mean, self.hour_m2,
+                                                    other.hour_n, other.hour_mean, other.hour_m2)
+        sensors = dict(self.sensors)
+        for sensor_id, count in other.sensors.items():
+            sensors[sensor_id] = sensors.get(sensor_id, 0) + count
+        tail_ts = np.concatenate([self.tail_ts, other.tail_ts])
+        tail_temp = np.concatenate([self.tail_temp, other.tail_temp])
+        keep = np.argsort(tail_ts, kind='stable')[-TREND_WINDOW:]
+        return SensorPartial(n, mean, m2, min(self.t_min, other.t_min), max(self.t_max, other.t_max),
+                             hour_n, hour_mean, hour_m2, sensors,
+                             min(self.first, other.first, key=lambda f: f[0]),
+                             tail_ts[keep], tail_temp[keep], self.n_files + other.n_files)
+
+    # --- Results ---
+    def statistics(self, file_id=None):
+        """Statistics dict (same keys as reference_statistics())."""
+        cov = self.m2 / (self.n - 1)
+        std = np.sqrt(np.diag(cov))
+        trend = float(self.tail_temp.mean() - self.first[1]) if self.n > 1 else 0
+        return {
+            'file_id': file_id,
+            'row_count': self.n,
+
+            'mean_temp': float(self.mean[0]),
+            'std_temp': float(std[0]),
+            'min_temp': self.t_min,
+            'max_temp': self.t_max,
+
+            'mean_humidity': float(self.mean[1]),
+            'std_humidity': float(std[1]),
+
+            'mean_pressure': float(self.mean[2]),
+            'std_pressure': float(std[2]),
+
+            'temp_range': self.t_max - self.t_min,
+            'temp_trend': trend,
+
+            'temp_humidity_corr': float(cov[0, 1] / (std[0] * std[1])),
+            'temp_pressure_corr': float(cov[0, 2] / (std[0] * std[2])),
+
+            'sensor_a_pct': self.sensors.get('A', 0) / self.n * 100,
+            'sensor_b_pct': self.sensors.get('B', 0) / self.n * 100,
+        }
+
+    def hourly_pattern(self, file_id=None):
+        """Hourly pattern dict (same keys as reference_hourly_patterns())."""
+        present = self.hour_n > 0
+        h_mean = np.where(present, self.hour_mean, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            h_std = np.sqrt(np.where(self.hour_n > 1, self.hour_m2 / (self.hour_n - 1), np.nan))
+        peak_hour = int(np.nanargmax(h_mean))
+        lowest_hour = int(np.nanargmin(h_mean))
+        return {
+            'file_id': file_id,
+            'peak_temp_hour': peak_hour,
+            'peak_temp_value': float(h_mean[peak_hour]),
+            'lowest_temp_hour': lowest_hour,
+            'lowest_temp_value': float(h_mean[lowest_hour]),
+            'daily_temp_variation': float(np.nanmax(h_mean) - np.nanmin(h_mean)),
+            'avg_hourly_std': float(np.nanmean(h_std)),
+        }
+
+
+def merge_partials(partials):
+    """
+    Merge a list of SensorPartial (one combine step of a tree reduction).
+
+    Empty partials are skipped; only their file count is kept. An empty list
+    gives an empty partial of 0 files.
+    """
+    partials = list(partials)
+    if partials and all(p.n for p in partials):
+        return functools.reduce(SensorPartial.merge, partials)
+    skipped = SensorPartial.empty(n_files=sum(p.n_files for p in partials if not p.n))
+    return functools.reduce(SensorPartial.merge, [p for p in partials if p.n], skipped)
+
+
+def file_statistics(df, file_id):
+    """
+    Per-file statistics and hourly patterns in one pass.
+
+    Args:
+        df: Sensor DataFrame (timestamp, sensor_id, temperature, humidity, pressure);
+            read only, never modified
+        file_id: File identifier
+
+    Returns:
+        tuple: (stats dict, hourly pattern dict), with the same keys as
+               reference_statistics() and reference_hourly_patterns()
+    """
+    partial = SensorPartial.from_frame(df)
+    return partial.statistics(file_id), partial.hourly_pattern(file_id)
+
+
+# ============================================================
+# Reference: the original pandas implementations
+# ============================================================
+
+def reference_statistics(df, file_id):
+    """Original compute_statistics body (several passes + full sort)."""
+    df_sorted = df.sort_values('timestamp')
+    ma_24h = df_sorted['temperature'].rolling(window=TREND_WINDOW, min_periods=1).mean()
+    return {
+        'file_id': file_id,
+        'row_count': len(df),
+        'mean_temp': df['temperature'].mean(),
+        'std_temp': df['temperature'].std(),
+        'min_temp': df['temperature'].min(),
+        'max_temp': df['temperature'].max(),
+        'mean_humidity': df['humidity'].mean(),
+        'std_humidity': df['humidity'].std(),
+        'mean_pressure': df['pressure'].mean(),
+        'std_pressure': df['pressure'].std(),
+        'temp_range': df['temperature'].max() - df['temperature'].min(),
+        'temp_trend': ma_24h.iloc[-1] - ma_24h.iloc[0] if len(ma_24h) > 1 else 0,
+        'temp_humidity_corr': df['temperature'].corr(df['humidity']),
+        'temp_pressure_corr': df['temperature'].corr(df['pressure']),
+        'sensor_a_pct': (df['sensor_id'] == 'A').sum() / len(df) * 100,
+        'sensor_b_pct': (df['sensor_id'] == 'B').sum() / len(df) * 100,
+    }
+
+
+def reference_hourly_patterns(df, file_id):
+    """Original analyze_hourly_patterns body (on a copy, so the input is not modified)."""
+    df = df.assign(hour=pd.to_datetime(df['timestamp']).dt.hour)
+    hourly_temp = df.groupby('hour')['temperature'].agg(['mean', 'std', 'count'])
+    peak_hour = hourly_temp['mean'].idxmax()
+    lowest_hour = hourly_temp['mean'].idxmin()
+    return {
+        'file_id': file_id,
+        'peak_temp_hour': int(peak_hour),
+        'peak_temp_value': float(hourly_temp.loc[peak_hour, 'mean']),
+        'lowest_temp_hour': int(lowest_hour),
+        'lowest_temp_value': float(hourly_temp.loc[lowest_hour, 'mean']),
+        'daily_temp_variation': float(hourly_temp['mean'].max() - hourly_temp['mean'].min()),
+        'avg_hourly_std': float(hourly_temp['std'].mean()),
+    }
+
+
+def max_abs_difference(expected, actual):
+    """Largest absolute difference over the numeric keys of two result dicts."""
+    return max(abs(float(expected[k]) - float(actual[k])) for k in expected if k != 'file_id')
+
+
+def _check_merge(df, n_parts=7):
+    """Max |difference| between merging row blocks in a tree and one pass over all rows."""
+    blocks = np.array_split(np.arange(len(df)), max(1, min(n_parts, len(df))))
+    partials = [SensorPartial.from_frame(df.iloc[b]) for b in blocks]
+    merged = merge_partials([merge_partials(partials[:3]), merge_partials(partials[3:])])
+    whole = SensorPartial.from_frame(df)
+    return max(max_abs_difference(whole.statistics(), merged.statistics()),
+               max_abs_difference(whole.hourly_pattern(), merged.hourly_pattern()))
+
+
+# ============================================================
+# Main: verify against the reference and time both
+# ============================================================
+
+def _best_of(func, *args, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    df = make_sensor_frame(rows, np.random.default_rng(0))
+    df['sensor_id'] = df['sensor_id'].astype('category')  # as read by sensor_storage
+
+    stats, pattern = file_statistics(df, 0)
+    diff = max(max_abs_difference(reference_statistics(df, 0), stats),
+               max_abs_difference(reference_hourly_patterns(df, 0), pattern))
+
+    t_ref = _best_of(lambda: (reference_statistics(df, 0), reference_hourly_patterns(df, 0)))
+    t_fused = _best_of(file_statistics, df, 0)
+    print(f"{rows:,} rows: max |difference| vs pandas = {diff:.2e}")
+    print(f"  pandas (2 functions): {t_ref * 1e3:8.3f} ms")
+    print(f"  fused kernel:         {t_fused * 1e3:8.3f} ms  ({t_ref / t_fused:.1f}x faster)")
+    print(f"Merged partials ({min(7, rows)} blocks, 2 levels) vs one pass: max |difference| = {_check_merge(df):.2e}")
+
+
+if __name__ == '__main__':
+    main()
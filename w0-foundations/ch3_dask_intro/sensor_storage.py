@@ -0,0 +1,254 @@
+"""
+Ch3.4b (helper) - Sensor File Storage: CSV, Parquet or Arrow IPC (Feather)
+
+`dashboard_demo.load_and_validate` used to spend its time parsing text:
+`pd.read_csv` infers every column type, `pd.to_datetime` parses the
+timestamps a second time, and `isnull().any().any()` scans every cell.
+This module writes and reads sensor files in a pluggable format:
+
+- csv:      text, parsed by pyarrow's CSV reader with the column types given
+            up front (no inference, timestamps parsed once)
+- parquet:  columnar, compressed; null counts live in the footer statistics
+- feather:  Arrow IPC, memory-mapped; columns are read without decoding
+
+Every reader is typed by SCHEMA, dictionary-encodes `sensor_id` (pandas
+gets a category, not millions of Python strings), reads only the requested
+columns, and validates from column statistics (Parquet footer, Arrow null
+counts) instead of a full null scan.
+
+操作說明：
+uv run python w0-foundations/ch3_dask_intro/sensor_storage.py              (compare load time per format)
+uv run python w0-foundations/ch3_dask_intro/sensor_storage.py 200 20000    (n_files, rows per file)
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# ============================================================
+# Configuration
+# ============================================================
+
+FORMATS = ('csv', 'parquet', 'feather')
+DEFAULT_FORMAT = 'parquet'
+EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+
+SCHEMA = pa.schema([
+    ('timestamp', pa.timestamp('ns')),
+    ('sensor_id', pa.dictionary(pa.int32(), pa.string())),
+    ('temperature', pa.float64()),
+    ('humidity', pa.float64()),
+    ('pressure', pa.float64()),
+])
+COLUMNS = tuple(SCHEMA.names)
+
+
+# ============================================================
+# Format helpers
+# ============================================================
+
+def format_of(path):
+    """Storage format from the file extension."""
+    suffix = Path(path).suffix
+    for fmt, ext in EXTENSIONS.items():
+        if ext == suffix:
+            return fmt
+    raise ValueError(f"Unknown sensor file format: {path}")
+
+
+def sensor_filename(directory, index, fmt=DEFAULT_FORMAT):
+    """Path of the index-th sensor file in the given format."""
+    return Path(directory) / f"sensor_data_{index}{EXTENSIONS[fmt]}"
+
+
+def pop_format_arg(argv, default=DEFAULT_FORMAT):
+    """
+    Remove `--format <name>` from an argument list.
+
+    Returns:
+        tuple: (format, remaining arguments)
+    """
+    args = list(argv)
+    if '--format' not in args:
+        return default, args
+    i = args.index('--format')
+    if i + 1 >= len(args) or args[i + 1] not in FORMATS:
+        print(f"錯誤：--format 必須是 {', '.join(FORMATS)} 之一")
+        sys.exit(1)
+    fmt = args[i + 1]
+    del args[i:i + 2]
+    return fmt, args
+
+
+def _schema_for(columns):
+    return pa.schema([SCHEMA.field(c) for c in columns])
+
+
+# ============================================================
+# Generate + write
+# ============================================================
+
+def make_sensor_frame(rows, rng=None, start='2024-01-01'):
+    """
+    Time-series sensor data: one row per minute, daily temperature cycle plus noise.
+
+    Args:
+        rows: Number of rows (minutes)
+        rng: numpy Generator (default: fresh, unseeded)
+        start: First timestamp
+
+    Returns:
+        DataFrame: SCHEMA columns
+    """
+    rng = rng or np.random.default_rng()
+    timestamps = pd.date_range(start, periods=rows, freq='1min')
+    return pd.DataFrame({
+        'timestamp': timestamps,
+        'sensor_id': rng.choice(['A', 'B', 'C', 'D'], rows),
+        'temperature': 25 + 5 * np.sin(2 * np.pi * timestamps.hour / 24) + rng.normal(0, 2, rows),
+        'humidity': 60 + rng.normal(0, 5, rows),
+        'pressure': 1013 + rng.normal(0, 10, rows),
+    })
+
+
+def write_sensor_file(df, path, fmt=None):
+    """
+    Write a sensor DataFrame (SCHEMA columns) to path.
+
+    Args:
+        df: DataFrame with the SCHEMA columns
+        path: Output path
+        fmt: 'csv', 'parquet' or 'feather' (default: from the extension)
+    """
+    fmt = fmt or format_of(path)
+    if fmt == 'csv':
+        df.to_csv(path, index=False)
+        return
+    table = pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False)
+    if fmt == 'parquet':
+        pq.write_table(table, path)
+    else:
+        feather.write_feather(table, path)
+
+
+# ============================================================
+# Read + validate
+# ============================================================
+
+def _validate_table(table, path):
+    if table.num_rows == 0:
+        raise ValueError(f"Empty dataframe: {Path(path).name}")
+    for name in table.column_names:
+        # Arrow keeps the null count with each chunk: no per-cell scan
+        if table.column(name).null_count:
+            raise ValueError(f"Found null values in '{name}': {Path(path).name}")
+
+
+def _validate_parquet_metadata(parquet_file, path, columns):
+    """
+    Validate from the Parquet footer alone.
+
+    Returns:
+        bool: True if every requested column had null-count statistics
+    """
+    metadata = parquet_file.metadata
+    if metadata.num_rows == 0:
+        raise ValueError(f"Empty dataframe: {Path(path).name}")
+    index = {metadata.schema.column(i).name: i for i in range(metadata.num_columns)}
+    for rg in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg)
+        for name in columns:
+            stats = row_group.column(index[name]).statistics
+            if stats is None or not stats.has_null_count:
+                return False
+            if stats.null_count:
+                raise ValueError(f"Found null values in '{name}': {Path(path).name}")
+    return True
+
+
+def read_sensor_table(path, columns=None, validate=True):
+    """
+    Read a sensor file as a typed Arrow table.
+
+    Args:
+        path: Sensor file (.csv, .parquet or .feather)
+        columns: Columns to read (default: all SCHEMA columns)
+        validate: Check row count and nulls (from statistics where available)
+
+    Returns:
+        pyarrow.Table: Columns typed as in SCHEMA
+    """
+    columns = list(columns or COLUMNS)
+    schema = _schema_for(columns)
+    fmt = format_of(path)
+    checked = False
+    if fmt == 'csv':
+        table = pa_csv.read_csv(path, convert_options=pa_csv.ConvertOptions(
+            column_types=schema, include_columns=columns))
+    elif fmt == 'parquet':
+        parquet_file = pq.ParquetFile(path)
+        checked = validate and _validate_parquet_metadata(parquet_file, path, columns)
+        table = parquet_file.read(columns=columns)
+    else:
+        table = feather.read_table(path, columns=columns, memory_map=True)
+    table = table.cast(schema)
+    if validate and not checked:
+        _validate_table(table, path)
+    return table
+
+
+def read_sensor_file(path, columns=None, validate=True):
+    """read_sensor_table() as a pandas DataFrame (sensor_id as a category)."""
+    return read_sensor_table(path, columns, validate).to_pandas()
+
+
+def read_csv_baseline(path):
+    """The original load path, for comparison: infer, re-parse, full null scan."""
+    df = pd.read_csv(path)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    assert not df.isnull().any().any(), "Found null values"
+    assert len(df) > 0, "Empty dataframe"
+    return df
+
+
+# ============================================================
+# Main: load time per format
+# ============================================================
+
+def main():
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    rng = np.random.default_rng(0)
+    df = make_sensor_frame(rows, rng)
+
+    print("=" * 70)
+    print(f"Load + validate {n_files} sensor files x {rows:,} rows")
+    print("=" * 70)
+    print(f"  {'reader':<22} {'size/file':>10} {'total':>9} {'per file':>10}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for fmt in FORMATS:
+            paths = [sensor_filename(tmpdir, i, fmt) for i in range(n_files)]
+            for p in paths:
+                write_sensor_file(df, p)
+            size_kb = paths[0].stat().st_size / 1024
+
+            readers = [(fmt, read_sensor_file)]
+            if fmt == 'csv':
+                readers.insert(0, ('csv (pd.read_csv)', read_csv_baseline))
+            for name, reader in readers:
+                start = time.perf_counter()
+                for p in paths:
+                    reader(p)
+                elapsed = time.perf_counter() - start
+                print(f"  {name:<22} {size_kb:>7.0f} KB {elapsed:>8.3f}s {elapsed / n_files * 1e3:>8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
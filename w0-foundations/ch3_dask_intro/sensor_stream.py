@@ -0,0 +1,255 @@
+"""
+Ch3.4b (helper) - Streaming: Process Sensor Files as They Arrive
+
+`demo_realistic_pipeline` builds one graph from a fixed file list and shows
+nothing until `compute()` returns. Here files land in a directory over time
+and every file is handled the moment it is seen:
+
+    watch DATA_DIR ──> client.submit(load) ──> client.submit(stats) ──> as_completed
+                                                                          │
+                               running aggregate  <── merge (SensorPartial)
+
+- `DirectoryWatcher` polls for new sensor files (writers must create them
+  atomically: write under another name, then rename)
+- `as_completed` accepts futures added while it is being iterated, so new
+  files join the same loop
+- the running aggregate is a `SensorPartial`: merging one file's partial is
+  O(1), independent of how many files came before
+
+Reported: time-to-first-result (first landing -> first merged result) and
+end-to-end latency per file (landed on disk -> merged into the aggregate).
+
+操作說明：
+uv run python w0-foundations/ch3_dask_intro/sensor_stream.py             (files land every 0.5s)
+uv run python w0-foundations/ch3_dask_intro/sensor_stream.py 20 0.2      (n_files, seconds between files)
+"""
+import contextlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+from dask.base import tokenize
+from dask.distributed import Client, LocalCluster, as_completed, wait
+
+from sensor_stats import SensorPartial
+from sensor_storage import (DEFAULT_FORMAT, EXTENSIONS, make_sensor_frame, read_sensor_file,
+                            sensor_filename, write_sensor_file)
+
+# ============================================================
+# Configuration
+# ============================================================
+
+POLL_INTERVAL = 0.1   # seconds between directory scans
+IDLE_TIMEOUT = 3.0    # stop after this long without new files or running tasks
+
+
+class FileResult(NamedTuple):
+    path: str
+    landed: float      # file mtime (time.time() clock)
+    submitted: float
+    done: float
+
+    @property
+    def latency(self):
+        """End-to-end: landed on disk -> merged into the running aggregate."""
+        return self.done - self.landed
+
+
+# ============================================================
+# Watch
+# ============================================================
+
+class DirectoryWatcher:
+    """Poll a directory for sensor files not seen before."""
+
+    def __init__(self, directory, suffixes=tuple(EXTENSIONS.values()), skip_existing=False):
+        self.directory = Path(directory)
+        self.suffixes = suffixes
+        self.seen = set()
+        if skip_existing:
+            self.poll()
+
+    def poll(self):
+        """
+        New files since the last poll, oldest first.
+
+        Returns:
+            list: (path, mtime) tuples
+        """
+        new = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name in self.seen or not entry.name.endswith(self.suffixes):
+                    continue
+                self.seen.add(entry.name)
+                new.append((entry.path, entry.stat().st_mtime))
+        return sorted(new, key=lambda item: item[1])
+
+
+# ============================================================
+# Stream
+# ============================================================
+
+def file_key(prefix, path):
+    """
+    Task key for one version of a file: 'load-sensor_0001.csv-<token>'.
+
+    The token covers mtime and size, so a file rewritten (or streamed again)
+    under the same name gets a new key instead of the result a long-lived
+    Client still holds for the old one.
+    """
+    try:
+        st = os.stat(path)
+        token = tokenize(path, st.st_mtime_ns, st.st_size)
+    except OSError:
+        token = tokenize(path, time.time_ns())  # gone already: the load reports the error
+    return f"{prefix}-{Path(path).name}-{token}"
+
+
+def stream_directory(client, directory, expected=None, idle_timeout=IDLE_TIMEOUT,
+                     poll_interval=POLL_INTERVAL, on_update=None, skip_existing=False):
+    """
+    Process sensor files as they land in directory.
+
+    Args:
+        client: Dask client
+        directory: Directory to watch
+        expected: Stop after this many files (default: stop when idle)
+        idle_timeout: Stop after this long with no new files and nothing running
+        poll_interval: Seconds between directory scans
+        on_update: Called as on_update(aggregate, result) after every merge
+        skip_existing: Ignore files already in directory when the stream starts
+
+    Returns:
+        tuple: (aggregate SensorPartial or None, list of FileResult, list of failed paths)
+    """
+    watcher = DirectoryWatcher(directory, skip_existing=skip_existing)
+    pending = as_completed()
+    running = {}
+    info = {}
+    aggregate = None
+    results, failed = [], []
+    last_activity = time.time()
+
+    while True:
+        for path, landed in watcher.poll():
+            frame = client.submit(read_sensor_file, path, key=file_key("load", path))
+            partial = client.submit(SensorPartial.from_frame, frame, key=file_key("stats", path))
+            info[partial.key] = (path, landed, time.time())
+            running[partial.key] = partial
+            pending.add(partial)
+            last_activity = time.time()
+
+        for future in pending.next_batch(block=False) if pending.has_ready() else []:
+            path, landed, submitted = info.pop(future.key)
+            del running[future.key]
+            if future.status == 'error':
+                print(f"  [error] {Path(path).name}: {future.exception()!r}")
+                failed.append(path)
+                continue
+            partial = future.result()
+            aggregate = partial if aggregate is None else aggregate.merge(partial)
+            results.append(FileResult(path, landed, submitted, time.time()))
+            last_activity = time.time()
+            if on_update:
+                on_update(aggregate, results[-1])
+
+        if expected is not None and len(results) + len(failed) >= expected:
+            break
+        if not info and time.time() - last_activity > idle_timeout:
+            break
+        if running:
+            # Wake up as soon as a task finishes, or rescan the directory after poll_interval
+            with contextlib.suppress(TimeoutError):
+                wait(list(running.values()), timeout=poll_interval, return_when='FIRST_COMPLETED')
+        else:
+            time.sleep(poll_interval)
+
+    return aggregate, results, failed
+
+
+def print_update(aggregate, result):
+    """One line per merged file: running totals."""
+    stats = aggregate.statistics()
+    print(f"  + {Path(result.path).name:<24} latency {result.latency * 1e3:7.1f} ms | "
+          f"{aggregate.n_files:3d} files {stats['row_count']:>9,} rows | "
+          f"mean {stats['mean_temp']:.3f} std {stats['std_temp']:.3f}")
+
+
+def print_latency_report(results):
+    """Time-to-first-result and latency distribution."""
+    if not results:
+        print("No files processed.")
+        return
+    first_landed = min(r.landed for r in results)
+    latencies = np.array([r.latency for r in results]) * 1e3
+    print(f"\nTime to first result: {(min(r.done for r in results) - first_landed) * 1e3:.1f} ms "
+          f"(first file landed -> first merged result)")
+    print(f"Latency per file (landed -> merged), {len(results)} files:")
+    print(f"  min {latencies.min():.1f} ms | median {np.median(latencies):.1f} ms | "
+          f"p95 {np.percentile(latencies, 95):.1f} ms | max {latencies.max():.1f} ms")
+
+
+# ============================================================
+# Producer: simulate files landing over time
+# ============================================================
+
+def produce_files(directory, n_files, interval, fmt=DEFAULT_FORMAT, rows=5000):
+    """
+    Write n_files consecutive sensor files into directory, one every `interval` seconds
+    (the first after `interval`, so a watcher started alongside is ready).
+
+    Each file is written under a temporary name and renamed into place,
+    so a watcher never sees a half-written file.
+    """
+    rng = np.random.default_rng()
+    for i in range(n_files):
+        time.sleep(interval)
+        start = pd.Timestamp('2024-01-01') + pd.Timedelta(minutes=i * rows)
+        final = sensor_filename(directory, i, fmt)
+        partial = final.with_name(final.name + '.part')
+        write_sensor_file(make_sensor_frame(rows, rng, start=start), partial, fmt)
+        os.replace(partial, final)
+
+
+def start_producer(directory, n_files, interval, fmt=DEFAULT_FORMAT, rows=5000):
+    """produce_files() in a background thread; returns the thread."""
+    thread = threading.Thread(target=produce_files, args=(directory, n_files, interval, fmt, rows),
+                              name="sensor-producer", daemon=True)
+    thread.start()
+    return thread
+
+
+# ============================================================
+# Main
+# ============================================================
+
+def main():
+    n_files = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+
+    with LocalCluster(n_workers=2, threads_per_worker=2, dashboard_address=':0') as cluster, \
+            Client(cluster) as client, tempfile.TemporaryDirectory() as tmpdir:
+        print("=" * 70)
+        print(f"Streaming {n_files} files, one every {interval}s")
+        print("=" * 70)
+        producer = start_producer(tmpdir, n_files, interval)
+        aggregate, results, failed = stream_directory(client, tmpdir, expected=n_files,
+                                                      on_update=print_update)
+        producer.join()
+        print_latency_report(results)
+        if failed:
+            print(f"Failed: {len(failed)} file(s)")
+        if aggregate is not None:
+            print("\nFinal aggregate:")
+            print(pd.Series(aggregate.statistics()).drop('file_id').to_string())
+
+
+if __name__ == '__main__':
+    main()
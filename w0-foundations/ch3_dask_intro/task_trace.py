@@ -0,0 +1,374 @@
+"""
+Ch3.4c (helper) - Headless Task Tracing: Chrome Trace / Perfetto Export
+
+The Bokeh dashboard needs a browser and someone watching. `TaskTracer` is a
+scheduler plugin that records every task of a run instead:
+
+- compute start / end, worker and thread
+- transfers of its inputs from other workers (time and bytes)
+- spill events: disk-read / disk-write time on the worker (SpillBuffer)
+- dependency wait: submitted -> all inputs in memory (scheduler clock)
+- start gap: all inputs in memory -> compute start (queueing + transfer)
+
+`trace_tasks()` writes the run as a Chrome trace (open it in
+https://ui.perfetto.dev or chrome://tracing: one row per worker thread, like
+the dashboard's Task Stream) and keeps a per-task-name summary, also stored
+in the trace file so runs can be compared later.
+
+Usage:
+    with trace_tasks(client, "trace.json") as trace:
+        result = final.compute()
+    print(trace.format_summary())
+
+操作說明：
+uv run python w0-foundations/ch3_dask_intro/task_trace.py                       (trace a demo run -> task_trace.json)
+uv run python w0-foundations/ch3_dask_intro/task_trace.py compare a.json b.json (per-task-name comparison)
+"""
+import json
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from dask.utils import key_split
+from distributed.diagnostics.plugin import SchedulerPlugin
+
+# ============================================================
+# Configuration
+# ============================================================
+
+PLUGIN_NAME = "task-tracer"
+DEFAULT_TRACE_PATH = "task_trace.json"
+SPILL_ACTIONS = ('disk-read', 'disk-write')
+
+MB = 1024 ** 2
+
+
+# ============================================================
+# Scheduler plugin
+# ============================================================
+
+class TaskTracer(SchedulerPlugin):
+    """
+    Record per-task timings on the scheduler.
+
+    Records are plain dicts (times are `time.time()` seconds; workers on one
+    host share that clock), fetched with `collect_records(client)`.
+    """
+
+    name = PLUGIN_NAME
+
+    def __init__(self):
+        self.records = []
+        self._pending = {}
+
+    async def start(self, scheduler):
+        self.scheduler = scheduler
+
+    def transition(self, key, start, finish, *args, stimulus_id=None, **kwargs):
+        now = time.time()
+        info = self._pending.get(key)
+        if info is None and finish in ('waiting', 'queued', 'no-worker', 'processing'):
+            info = self._pending[key] = {'submitted': now}
+        if start == 'waiting' and finish in ('queued', 'no-worker', 'processing'):
+            info['ready'] = now  # every input is in memory
+        if finish == 'processing':
+            ts = self.scheduler.tasks[key]
+            # Inputs not yet on the chosen worker will be transferred to it
+            worker = ts.processing_on
+            info['transfer_bytes'] = sum(dep.nbytes for dep in ts.dependencies
+                                         if worker is not None and worker not in dep.who_has)
+        if finish in ('memory', 'erred') and start == 'processing':
+            info = self._pending.pop(key, {'submitted': now})
+            self.records.append(_record(key, finish, info, kwargs))
+        elif finish in ('released', 'forgotten'):
+            self._pending.pop(key, None)
+
+
+def _record(key, state, info, kwargs):
+    startstops = kwargs.get('startstops') or ()
+    compute = [s for s in startstops if s['action'] == 'compute']
+    transfers = [s for s in startstops if s['action'] == 'transfer']
+    spills = [s for s in startstops if s['action'] in SPILL_ACTIONS]
+    ready = info.get('ready', info['submitted'])
+    start = compute[0]['start'] if compute else ready
+    return {
+        'key': str(key),
+        'name': key_split(key),
+        'state': state,
+        'worker': kwargs.get('worker'),
+        'thread': kwargs.get('thread'),
+        'submitted': info['submitted'],
+        'ready': ready,
+        'start': start,
+        'stop': compute[-1]['stop'] if compute else start,
+        'nbytes': kwargs.get('nbytes') or 0,
+        'transfer_bytes': info.get('transfer_bytes', 0) if transfers else 0,
+        'transfers': [(s['start'], s['stop'], s.get('source')) for s in transfers],
+        'spills': [(s['action'], s['start'], s['stop']) for s in spills],
+    }
+
+
+def _plugin_records(dask_scheduler, name=PLUGIN_NAME):
+    plugin = dask_scheduler.plugins[name]
+    records, plugin.records = plugin.records, []
+    return records
+
+
+def collect_records(client, name=PLUGIN_NAME):
+    """Fetch (and clear) the records gathered so far on the scheduler."""
+    return client.run_on_scheduler(_plugin_records, name=name)
+
+
+# ============================================================
+# Chrome trace
+# ============================================================
+
+def to_chrome_trace(records, summary=None):
+    """
+    Chrome trace (JSON object format): one process per worker, one thread row
+    per worker thread; compute, transfer and spill slices. Dependency wait and
+    start gap are in the args of each compute slice.
+    """
+    if not records:
+        return {'traceEvents': [], 'displayTimeUnit': 'ms', 'otherData': {'summary': summary or {}}}
+    t0 = min(r['submitted'] for r in records)
+    workers = {w: i for i, w in enumerate(sorted({str(r['worker']) for r in records}))}
+    threads = {}
+    events = []
+
+    def us(t):
+        return round((t - t0) * 1e6, 1)
+
+    def slice_(name, cat, start, stop, pid, tid, args=None):
+        events.append({'name': name, 'cat': cat, 'ph': 'X', 'ts': us(start),
+                       'dur': max(round((stop - start) * 1e6, 1), 0.1), 'pid': pid, 'tid': tid,
+                       'args': args or {}})
+
+    for r in records:
+        pid = workers[str(r['worker'])]
+        tid = threads.setdefault((pid, r['thread']), len([k for k in threads if k[0] == pid]))
+        slice_(r['name'], 'compute' if r['state'] == 'memory' else 'erred', r['start'], r['stop'], pid, tid, {
+            'key': r['key'],
+            'nbytes': r['nbytes'],
+            'transfer_bytes': r['transfer_bytes'],
+            'dependency_wait_ms': round((r['ready'] - r['submitted']) * 1e3, 3),
+            'start_gap_ms': round((r['start'] - r['ready']) * 1e3, 3),
+        })
+        for start, stop, source in r['transfers']:
+            slice_(f"transfer {r['name']}", 'transfer', start, stop, pid, tid, {'source': source})
+        for action, start, stop in r['spills']:
+            slice_(f"{action} {r['name']}", 'spill', start, stop, pid, tid)
+
+    for worker, pid in workers.items():
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': worker}})
+    for (pid, thread), tid in threads.items():
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                       'args': {'name': f"thread {tid} ({thread})"}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'summary': summary or {}}}
+
+
+def write_chrome_trace(records, path, summary=None):
+    with open(path, 'w') as f:
+        json.dump(to_chrome_trace(records, summary), f)
+    return str(path)
+
+
+# ============================================================
+# Summary
+# ============================================================
+
+def summarize(records):
+    """
+    Per-task-name totals plus run totals.
+
+    Returns:
+        dict: {'run': {...}, 'tasks': {name: {...}}}
+    """
+    tasks = {}
+    for r in records:
+        s = tasks.setdefault(r['name'], {
+            'count': 0, 'erred': 0, 'compute_s': 0.0, 'transfer_s': 0.0, 'transfer_mb': 0.0,
+            'spill_events': 0, 'spill_s': 0.0, 'dependency_wait_s': 0.0, 'start_gap_s': 0.0})
+        s['count'] += 1
+        s['erred'] += r['state'] != 'memory'
+        s['compute_s'] += r['stop'] - r['start']
+        s['transfer_s'] += sum(stop - start for start, stop, _ in r['transfers'])
+        s['transfer_mb'] += r['transfer_bytes'] / MB
+        s['spill_events'] += len(r['spills'])
+        s['spill_s'] += sum(stop - start for _, start, stop in r['spills'])
+        s['dependency_wait_s'] += r['ready'] - r['submitted']
+        s['start_gap_s'] += r['start'] - r['ready']
+
+    if not records:
+        return {'run': {}, 'tasks': tasks}
+    wall = max(r['stop'] for r in records) - min(r['submitted'] for r in records)
+    compute = sum(s['compute_s'] for s in tasks.values())
+    busy, threads = {}, {}
+    for r in records:
+        busy[r['worker']] = busy.get(r['worker'], 0.0) + r['stop'] - r['start']
+        threads.setdefault(r['worker'], set()).add(r['thread'])
+    return {
+        'run': {
+            'tasks': len(records),
+            'wall_s': wall,
+            'compute_s': compute,
+            'parallelism': compute / wall if wall else 0.0,
+            'transfer_mb': sum(s['transfer_mb'] for s in tasks.values()),
+            'spill_events': sum(s['spill_events'] for s in tasks.values()),
+            'worker_busy_s': {str(w): b for w, b in sorted(busy.items(), key=lambda item: str(item[0]))},
+            'worker_threads': {str(w): len(t) for w, t in threads.items()},
+        },
+        'tasks': tasks,
+    }
+
+
+def format_summary(summary):
+    run, tasks = summary['run'], summary['tasks']
+    if not run:
+        return "No tasks recorded."
+    lines = [
+        f"{run['tasks']} tasks in {run['wall_s']:.2f}s wall, {run['compute_s']:.2f}s compute "
+        f"(parallelism {run['parallelism']:.1f}), {run['transfer_mb']:.1f} MB transferred, "
+        f"{run['spill_events']} spill events",
+        f"  {'task':<24} {'count':>6} {'compute':>9} {'mean':>9} {'dep wait':>9} {'gap':>8} "
+        f"{'xfer MB':>8} {'spill':>6}",
+    ]
+    for name, s in sorted(tasks.items(), key=lambda item: -item[1]['compute_s']):
+        n = s['count']
+        lines.append(f"  {name:<24} {n:>6} {s['compute_s']:>8.2f}s {s['compute_s'] / n * 1e3:>7.1f}ms "
+                     f"{s['dependency_wait_s'] / n * 1e3:>7.1f}ms {s['start_gap_s'] / n * 1e3:>6.1f}ms "
+                     f"{s['transfer_mb']:>8.2f} {s['spill_events']:>6}")
+    for worker, b in run['worker_busy_s'].items():
+        n = run['worker_threads'][worker]
+        lines.append(f"  {worker}: busy {b:.2f}s on {n} thread(s), "
+                     f"{b / (n * run['wall_s']):.0%} utilization")
+    return "\n".join(lines)
+
+
+def compare_summaries(baseline, current):
+    """Per-task-name compute and wall differences between two summaries."""
+    lines = [f"  {'task':<24} {'baseline':>10} {'current':>10} {'change':>8}"]
+    rows = [('(wall)', baseline['run'].get('wall_s', 0.0), current['run'].get('wall_s', 0.0))]
+    for name in sorted(set(baseline['tasks']) | set(current['tasks'])):
+        rows.append((name, baseline['tasks'].get(name, {}).get('compute_s', 0.0),
+                     current['tasks'].get(name, {}).get('compute_s', 0.0)))
+    for name, a, b in rows:
+        change = f"{(b - a) / a:+.0%}" if a else "new"
+        lines.append(f"  {name:<24} {a:>9.2f}s {b:>9.2f}s {change:>8}")
+    return "\n".join(lines)
+
+
+def load_summary(path):
+    """Summary stored in a trace file written by write_chrome_trace()."""
+    with open(path) as f:
+        return json.load(f)['otherData']['summary']
+
+
+def _union(intervals):
+    merged = []
+    for start, stop in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], stop)
+        else:
+            merged.append([start, stop])
+    return merged
+
+
+def stage_overlap(records, first, second):
+    """
+    Seconds during which at least one `first` task and one `second` task were
+    computing at the same time (e.g. 'load_and_validate' and 'analyze_file').
+    """
+    a = _union((r['start'], r['stop']) for r in records if r['name'] == first)
+    b = _union((r['start'], r['stop']) for r in records if r['name'] == second)
+    total, i, j = 0.0, 0, 0
+    while i < len(a) and j < len(b):
+        total += max(0.0, min(a[i][1], b[j][1]) - max(a[i][0], b[j][0]))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return total
+
+
+# ============================================================
+# Context manager
+# ============================================================
+
+class TraceResult:
+    """Records of one traced block, filled in when the block exits."""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = []
+        self.summary = summarize([])
+
+    def format_summary(self):
+        return format_summary(self.summary)
+
+
+@contextmanager
+def trace_tasks(client, path=DEFAULT_TRACE_PATH):
+    """
+    Trace every task the client's scheduler runs inside the block.
+
+    Args:
+        client: dask.distributed Client
+        path: Chrome trace output (None: keep the records only)
+    """
+    client.register_plugin(TaskTracer(), name=PLUGIN_NAME)
+    result = TraceResult(path)
+    try:
+        yield result
+    finally:
+        result.records = collect_records(client)
+        client.unregister_scheduler_plugin(PLUGIN_NAME)
+        result.summary = summarize(result.records)
+        if path:
+            write_chrome_trace(result.records, path, result.summary)
+
+
+# ============================================================
+# Main
+# ============================================================
+
+def _demo_run(path):
+    import numpy as np
+    from dask import delayed
+    from dask.distributed import Client, LocalCluster
+
+    @delayed
+    def load(i):
+        time.sleep(0.2)
+        return np.random.default_rng(i).random(1_000_000)
+
+    @delayed
+    def analyze(x):
+        return float(x.mean()), float(x.std())
+
+    @delayed
+    def combine(results):
+        return np.mean([mean for mean, _ in results])
+
+    with LocalCluster(n_workers=2, threads_per_worker=2, dashboard_address=':0') as cluster, \
+            Client(cluster) as client:
+        with trace_tasks(client, path) as trace:
+            combine([analyze(load(i)) for i in range(12)]).compute()
+    print(trace.format_summary())
+    print(f"\nChrome trace: {path} (open in https://ui.perfetto.dev or chrome://tracing)")
+
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ['compare']:
+        if len(args) != 3:
+            print("用法：task_trace.py compare BASELINE.json CURRENT.json")
+            sys.exit(1)
+        print(compare_summaries(load_summary(args[1]), load_summary(args[2])))
+        return
+    _demo_run(Path(args[0]) if args else Path(DEFAULT_TRACE_PATH))
+
+
+if __name__ == '__main__':
+    main()
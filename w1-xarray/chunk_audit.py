@@ -0,0 +1,378 @@
+"""
+W1 (tool) - Chunk Layout Auditor and Rechunk Planner for the Catalog's Zarr Stores
+
+The (1, 121, 161) chunks of era5_2019 (docs/rechunk_fix_suggestion.md) were
+only noticed when the dashboard turned yellow: 8760 chunks of 76 KB per
+variable, one `get-item` task each. This tool finds such layouts before
+anything is computed. For every zarr store in catalog.yaml it reads only the
+metadata (.zmetadata, or .zarray / .zattrs per variable; zarr.json for zarr
+v3) and the sizes of the chunk files, and reports per variable:
+
+- chunk shape, bytes per chunk (uncompressed) and number of chunks
+- chunks written, and compression ratio over those chunks only (zarr skips
+  chunks that hold only the fill value)
+- projected tasks (= chunks touched) for typical access patterns:
+    map slice     one time step, whole domain
+    time series   every time step at one grid point
+    region        one month over a 4x4 degree box (17 x 17 points at 0.25 deg)
+
+Variables whose chunks fall outside the target range (10-100 MB, the range
+recommended in the fix suggestion) get a proposed layout: whole spatial
+domain per chunk, as many whole days of time steps as fit the target size.
+For each such store a ready-to-run rechunker script is written.
+
+操作說明：
+uv run python w1-xarray/chunk_audit.py                                   (catalog next to the notebooks)
+uv run python w1-xarray/chunk_audit.py path/to/catalog.yaml --plan-dir plans --max-mem 4GB
+"""
+import json
+import math
+import os
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+import typer
+import yaml
+
+# ============================================================
+# Configuration
+# ============================================================
+
+DEFAULT_CATALOG = Path(__file__).resolve().parent / "notebooks" / "catalog.yaml"
+MIN_CHUNK_MB = 10
+MAX_CHUNK_MB = 100
+TARGET_CHUNK_MB = 28         # proposed layouts aim here: 360 hourly steps of 121 x 161 float32
+TIME_DIM = 'time'
+TIME_STEP_MULTIPLE = 24      # proposed time chunks are whole days of hourly data
+DEFAULT_MAX_MEM = '4GB'      # rechunker memory budget per worker in generated plans
+
+# Access patterns: {dim: extent} for the named dims ('full' = whole dimension),
+# and the extent of every other dim
+ACCESS_PATTERNS = {
+    'map slice': ({TIME_DIM: 1}, 'full'),
+    'time series': ({TIME_DIM: 'full'}, 1),
+    'region': ({TIME_DIM: 744, 'latitude': 17, 'longitude': 17}, 'full'),
+}
+
+MB = 1024 ** 2
+METADATA_FILES = {'.zarray', '.zattrs', '.zgroup', '.zmetadata', 'zarr.json'}
+
+app = typer.Typer(add_completion=False, help="Audit the chunk layout of the catalog's zarr stores.")
+
+
+class ArrayMeta(NamedTuple):
+    name: str
+    dims: tuple
+    shape: tuple
+    chunks: tuple
+    dtype: str
+    compressor: Optional[str]
+
+
+class VariableReport(NamedTuple):
+    store: str
+    meta: ArrayMeta
+    chunk_bytes: int
+    n_chunks: int
+    stored_chunks: int           # chunk files on disk
+    stored_bytes: int            # their size (0: none found)
+    tasks: dict                  # {access pattern: chunks touched}
+    status: str                  # 'ok' | 'too small' | 'too large'
+    proposed: Optional[dict]     # {dim: chunk} when status is not 'ok'
+
+    @property
+    def compression_ratio(self):
+        """Uncompressed / stored bytes of the chunks on disk (edge chunks are stored full size)."""
+        return self.stored_chunks * self.chunk_bytes / self.stored_bytes if self.stored_bytes else None
+
+
+# ============================================================
+# Catalog and metadata (no array data is read)
+# ============================================================
+
+def catalog_stores(catalog_path):
+    """
+    Zarr stores referenced by an intake catalog.
+
+    Returns:
+        list: (source name, store path) tuples; a multi-file source gives one per path
+    """
+    catalog_path = Path(catalog_path)
+    with open(catalog_path) as f:
+        catalog = yaml.safe_load(f) or {}
+    stores = []
+    for name, source in (catalog.get('sources') or {}).items():
+        urlpath = (source.get('args') or {}).get('urlpath')
+        if urlpath is None or 'zarr' not in source.get('driver', '').lower():
+            continue
+        for path in [urlpath] if isinstance(urlpath, str) else urlpath:
+            path = Path(os.path.expanduser(path))
+            stores.append((name, (catalog_path.parent / path).resolve()))
+    return stores
+
+
+def _v2_meta(name, zarray, zattrs):
+    compressor = zarray.get('compressor')
+    return ArrayMeta(name, tuple(zattrs.get('_ARRAY_DIMENSIONS', [])), tuple(zarray['shape']),
+                     tuple(zarray['chunks']), zarray['dtype'],
+                     compressor.get('cname', compressor.get('id')) if compressor else None)
+
+
+def _v3_meta(name, node):
+    codecs = [c['name'] for c in node.get('codecs', []) if c['name'] not in ('bytes', 'transpose')]
+    return ArrayMeta(name, tuple(node.get('dimension_names') or []), tuple(node['shape']),
+                     tuple(node['chunk_grid']['configuration']['chunk_shape']), node['data_type'],
+                     ",".join(codecs) or None)
+
+
+def read_store_metadata(store):
+    """
+    Array metadata of every variable in a zarr store, from the JSON files only.
+
+    Returns:
+        dict: {variable name: ArrayMeta}
+    """
+    store = Path(store)
+    consolidated = store / '.zmetadata'
+    if consolidated.exists():
+        with open(consolidated) as f:
+            entries = json.load(f)['metadata']
+        return {key[:-len('/.zarray')]: _v2_meta(key[:-len('/.zarray')], zarray,
+                                                 entries.get(key.replace('.zarray', '.zattrs'), {}))
+                for key, zarray in entries.items() if key.endswith('/.zarray')}
+
+    arrays = {}
+    for entry in sorted(os.scandir(store), key=lambda e: e.name):
+        if not entry.is_dir():
+            continue
+        path = Path(entry.path)
+        if (path / '.zarray').exists():
+            with open(path / '.zarray') as f:
+                zarray = json.load(f)
+            zattrs = {}
+            if (path / '.zattrs').exists():
+                with open(path / '.zattrs') as f:
+                    zattrs = json.load(f)
+            arrays[entry.name] = _v2_meta(entry.name, zarray, zattrs)
+        elif (path / 'zarr.json').exists():
+            with open(path / 'zarr.json') as f:
+                node = json.load(f)
+            if node.get('node_type') == 'array':
+                arrays[entry.name] = _v3_meta(entry.name, node)
+    return arrays
+
+
+def stored_chunks(store, name):
+    """
+    Chunk files of one variable (metadata files excluded).
+
+    Returns:
+        tuple: (number of chunk files, their total bytes)
+    """
+    count = total = 0
+    for root, _, files in os.walk(Path(store) / name):
+        chunks = [f for f in files if f not in METADATA_FILES]
+        count += len(chunks)
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in chunks)
+    return count, total
+
+
+# ============================================================
+# Analysis
+# ============================================================
+
+def n_chunks(shape, chunks):
+    return math.prod(math.ceil(s / c) for s, c in zip(shape, chunks))
+
+
+def projected_tasks(meta, pattern):
+    """Chunks touched by an access pattern (one task each), for an aligned selection."""
+    named, default = ACCESS_PATTERNS[pattern]
+    count = 1
+    for dim, size, chunk in zip(meta.dims, meta.shape, meta.chunks):
+        extent = named.get(dim, default)
+        extent = size if extent == 'full' else min(extent, size)
+        count *= math.ceil(extent / chunk)
+    return count
+
+
+def propose_chunks(meta, target_mb=TARGET_CHUNK_MB, max_mb=MAX_CHUNK_MB):
+    """
+    Whole spatial domain per chunk and as many whole days of time steps as fit
+    target_mb; if one time step alone exceeds max_mb, the largest other
+    dimension is halved until it fits.
+
+    Returns:
+        dict: {dim: chunk}
+    """
+    itemsize = np.dtype(meta.dtype).itemsize
+    chunks = {dim: size for dim, size in zip(meta.dims, meta.shape)}
+    if TIME_DIM not in chunks:
+        return chunks
+    chunks[TIME_DIM] = 1
+    while math.prod(chunks.values()) * itemsize > max_mb * MB:
+        dim = max((d for d in chunks if d != TIME_DIM), key=chunks.get)
+        chunks[dim] = math.ceil(chunks[dim] / 2)
+    step_bytes = math.prod(chunks.values()) * itemsize
+    steps = max(1, int(target_mb * MB // step_bytes))
+    if steps >= TIME_STEP_MULTIPLE:
+        steps -= steps % TIME_STEP_MULTIPLE
+    chunks[TIME_DIM] = min(steps, dict(zip(meta.dims, meta.shape))[TIME_DIM])
+    return chunks
+
+
+def audit_variable(store, meta, min_mb=MIN_CHUNK_MB, max_mb=MAX_CHUNK_MB):
+    chunk_bytes = math.prod(meta.chunks) * np.dtype(meta.dtype).itemsize
+    total_bytes = math.prod(meta.shape) * np.dtype(meta.dtype).itemsize
+    n_stored, size_stored = stored_chunks(store, meta.name)
+    if chunk_bytes > max_mb * MB:
+        status = 'too large'
+    # Arrays smaller than the minimum (coordinates) cannot have larger chunks
+    elif chunk_bytes < min_mb * MB and chunk_bytes < total_bytes:
+        status = 'too small'
+    else:
+        status = 'ok'
+    return VariableReport(
+        store=str(store),
+        meta=meta,
+        chunk_bytes=chunk_bytes,
+        n_chunks=n_chunks(meta.shape, meta.chunks),
+        stored_chunks=n_stored,
+        stored_bytes=size_stored,
+        tasks={p: projected_tasks(meta, p) for p in ACCESS_PATTERNS},
+        status=status,
+        proposed=propose_chunks(meta, max_mb=max_mb) if status != 'ok' and meta.dims else None,
+    )
+
+
+def audit_store(store, min_mb=MIN_CHUNK_MB, max_mb=MAX_CHUNK_MB):
+    """
+    Returns:
+        list of VariableReport, multi-dimensional variables first
+    """
+    metas = read_store_metadata(store)
+    reports = [audit_variable(store, m, min_mb, max_mb) for m in metas.values()]
+    return sorted(reports, key=lambda r: (len(r.meta.shape) < 2, r.meta.name))
+
+
+# ============================================================
+# Rechunk plan
+# ============================================================
+
+def rechunk_plan(store, reports, max_mem=DEFAULT_MAX_MEM, target_store=None):
+    """
+    Python source of a rechunker run that gives every out-of-range variable
+    its proposed layout (other variables keep their chunks).
+    """
+    store = Path(store)
+    target_store = Path(target_store) if target_store else store.with_name(f"{store.stem}_rechunked.zarr")
+    temp_store = target_store.with_name(f"{target_store.stem}.tmp.zarr")
+    consolidated = (store / '.zmetadata').exists()
+    lines = []
+    for r in reports:
+        chunks = r.proposed or dict(zip(r.meta.dims, r.meta.chunks))
+        lines.append(f"    {r.meta.name!r}: {chunks!r},")
+    changed = ", ".join(r.meta.name for r in reports if r.proposed)
+    return f'''"""
+Rechunk plan for {store}
+(generated by w1-xarray/chunk_audit.py; rechunked: {changed})
+"""
+import shutil
+
+import xarray as xr
+import zarr
+from rechunker import rechunk
+
+SOURCE = {str(store)!r}
+TARGET = {str(target_store)!r}
+TEMP = {str(temp_store)!r}
+
+target_chunks = {{
+{chr(10).join(lines)}
+}}
+
+source = xr.open_zarr(SOURCE, consolidated={consolidated})
+for var in source.variables.values():
+    # the source layout must not leak into the target encoding
+    var.encoding.pop('chunks', None)
+    var.encoding.pop('preferred_chunks', None)
+
+shutil.rmtree(TEMP, ignore_errors=True)
+plan = rechunk(source, target_chunks, max_mem={max_mem!r}, target_store=TARGET, temp_store=TEMP)
+plan.execute()
+zarr.consolidate_metadata(TARGET)
+shutil.rmtree(TEMP, ignore_errors=True)
+print(f"Rechunked {{SOURCE}} -> {{TARGET}}")
+'''
+
+
+# ============================================================
+# Display
+# ============================================================
+
+def _mb(n):
+    return f"{n / MB:.2f} MB" if n < 10 * MB else f"{n / MB:.0f} MB"
+
+
+def format_report(reports):
+    patterns = list(ACCESS_PATTERNS)
+    lines = [f"  {'variable':<40} {'chunks':<18} {'chunk':>10} {'n chunks':>9} {'written':>9} {'ratio':>6} "
+             + " ".join(f"{p:>12}" for p in patterns) + "  status"]
+    for r in reports:
+        ratio = f"{r.compression_ratio:.1f}x" if r.compression_ratio else "-"
+        status = r.status if not r.proposed else f"{r.status} -> {tuple(r.proposed.values())}"
+        lines.append(f"  {r.meta.name:<40} {str(r.meta.chunks):<18} {_mb(r.chunk_bytes):>10} "
+                     f"{r.n_chunks:>9,} {r.stored_chunks:>9,} {ratio:>6} "
+                     + " ".join(f"{r.tasks[p]:>12,}" for p in patterns) + f"  {status}")
+    return "\n".join(lines)
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+@app.command()
+def audit(catalog: Path = typer.Argument(DEFAULT_CATALOG, help="intake catalog (YAML)"),
+          min_mb: float = typer.Option(MIN_CHUNK_MB, help="Smallest acceptable chunk (MB, uncompressed)"),
+          max_mb: float = typer.Option(MAX_CHUNK_MB, help="Largest acceptable chunk (MB, uncompressed)"),
+          plan_dir: Optional[Path] = typer.Option(None, help="Write one rechunker script per store here "
+                                                             "(default: print them)"),
+          max_mem: str = typer.Option(DEFAULT_MAX_MEM, help="rechunker max_mem in the generated plans")):
+    """Report chunk layouts of every zarr store in the catalog and plan fixes."""
+    stores = catalog_stores(catalog)
+    print(f"{len(stores)} zarr store(s) in {catalog}; target chunk size {min_mb:g}-{max_mb:g} MB")
+    n_bad = 0
+    seen = set()
+    for source, store in stores:
+        if store in seen:
+            continue
+        seen.add(store)
+        print(f"\n[{source}] {store}")
+        if not store.exists():
+            print("  not found (skipped)")
+            continue
+        reports = audit_store(store, min_mb, max_mb)
+        if not reports:
+            print("  no arrays found")
+            continue
+        print(format_report(reports))
+        bad = [r for r in reports if r.proposed]
+        n_bad += len(bad)
+        if not bad:
+            continue
+        plan = rechunk_plan(store, reports, max_mem)
+        if plan_dir:
+            plan_dir.mkdir(parents=True, exist_ok=True)
+            path = plan_dir / f"rechunk_{store.stem}.py"
+            path.write_text(plan)
+            print(f"  plan: {path}  (run: python {path})")
+        else:
+            print(f"\n  --- rechunk plan ---\n{plan}")
+    if n_bad:
+        print(f"\n{n_bad} variable(s) outside {min_mb:g}-{max_mb:g} MB")
+        raise typer.Exit(1)
+
+
+if __name__ == '__main__':
+    app()
@@ -0,0 +1,459 @@
+"""
+W1 (tool) - Resumable, Parallel Multi-year Rechunk of the ERA5 Archive
+
+The per-year `rechunk_year` of docs/rechunk_fix_suggestion.md rechunks one
+year per call, and an interrupted run starts over: for the whole 2019-2023
+archive, one dead node means hours of I/O repeated. This tool rechunks every
+year in one command:
+
+- Work unit = one target chunk of one variable of one year. The units of all
+  years are interleaved and run in a process pool behind a global memory
+  budget (MemoryBudgetExecutor, ch2_native_tools/multi_processing): a unit is
+  admitted only if its source read + target chunk fits in max_mem.
+- Checkpoints: every written chunk is fsync'ed, then appended to
+  `<target>.progress` (one JSON line per chunk). A rerun skips the logged
+  chunks; if the plan changed (layout, compressor, source shape) the year
+  starts over.
+- Explicit encoding: each target array is created from an `encoding` dict
+  ({var: {'chunks', 'compressor'}}, the same form `to_zarr(encoding=...)`
+  takes), so the source layout never leaks into the output. Target chunks
+  come from chunk_audit.propose_chunks: whole domain, 360 hourly steps.
+- When every chunk of a year is written: consolidate metadata, then verify
+  stored shape / chunks / compressor against the plan and compare the
+  first and last chunk of every data variable with the source.
+
+Values are copied as stored (scale_factor, _FillValue etc. stay in the
+attributes), so no decoding / re-encoding happens on the way.
+
+操作說明：
+uv run python w1-xarray/era5_rechunk.py                                  (every year found in --era5-dir)
+uv run python w1-xarray/era5_rechunk.py --years 2023 --dry-run           (plan and progress only)
+uv run python w1-xarray/era5_rechunk.py --years 2019 2020 --max-mem 8GB --workers 8
+uv run python w1-xarray/era5_rechunk.py --restart                        (ignore checkpoints)
+"""
+import hashlib
+import itertools
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import dask.utils
+import numpy as np
+import typer
+import zarr
+from numcodecs import Blosc
+
+from chunk_audit import propose_chunks, read_store_metadata
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "w0-foundations" / "ch2_native_tools" / "multi_processing"))
+from memory_budget import MemoryBudgetExecutor
+
+# ============================================================
+# Configuration
+# ============================================================
+
+ERA5_DIR = Path("/home/sungche/NAS/dataset/era5")
+OUTPUT_DIR = Path("/home/sungche/NAS/dataset/era5_rechunked")
+REGION = "10N40N_100E140E"
+SOURCE_NAME = "era5_{year}_{region}.zarr"
+TARGET_NAME = "era5_{year}_{region}_rechunked.zarr"
+
+DEFAULT_MAX_MEM = '4GB'      # global: all running chunk copies together
+COMPRESSOR = Blosc(cname='zstd', clevel=3, shuffle=Blosc.SHUFFLE)
+N_VERIFY_CHUNKS = 2          # first and last chunk of every data variable
+
+MB = 1024 ** 2
+
+app = typer.Typer(add_completion=False, help="Rechunk the ERA5 archive, year by year, resumably.")
+
+
+class ChunkTask(NamedTuple):
+    year: int
+    source: str
+    target: str
+    name: str                    # variable
+    index: tuple                 # chunk index in the target grid
+    mem_bytes: int               # projected peak memory of the copy
+
+    @property
+    def key(self):
+        return ".".join(map(str, self.index))
+
+
+class YearPlan(NamedTuple):
+    year: int
+    source: Path
+    target: Path
+    encoding: dict               # {var: {'chunks': tuple, 'compressor': codec}}
+    token: str                   # plan_hash: the checkpoint is only valid for this plan
+    n_chunks: int
+    done: set                    # {(var, chunk key)} from the checkpoint
+    pending: list                # ChunkTask still to copy
+
+
+class YearResult(NamedTuple):
+    year: int
+    target: Path
+    n_chunks: int
+    n_copied: int
+    n_resumed: int               # chunks skipped thanks to the checkpoint
+    n_failed: int
+    problems: list               # verification failures (empty: ok)
+
+
+# ============================================================
+# Plan: encoding and chunk tasks
+# ============================================================
+
+def find_years(era5_dir, region=REGION):
+    """Years with a source store in era5_dir (so future years are picked up)."""
+    pattern = re.compile(re.escape(SOURCE_NAME.format(year='@', region=region)).replace('@', r'(\d{4})'))
+    return sorted(int(m.group(1)) for p in Path(era5_dir).iterdir() if (m := pattern.fullmatch(p.name)))
+
+
+def target_encoding(metas, time_chunk=None, compressor=COMPRESSOR):
+    """
+    Explicit zarr encoding for every variable of a store.
+
+    Multi-dimensional variables get the proposed layout (chunk_audit) with
+    `time_chunk` steps if given; coordinates are stored as one chunk.
+
+    Returns:
+        dict: {var: {'chunks': tuple, 'compressor': codec}}
+    """
+    encoding = {}
+    for name, meta in metas.items():
+        if len(meta.shape) < 2:
+            chunks = tuple(meta.shape)
+        else:
+            proposed = propose_chunks(meta)
+            if time_chunk and 'time' in proposed:
+                proposed['time'] = min(time_chunk, dict(zip(meta.dims, meta.shape))['time'])
+            chunks = tuple(proposed.values())
+        encoding[name] = {'chunks': chunks, 'compressor': compressor}
+    return encoding
+
+
+def chunk_slices(index, chunks, shape):
+    return tuple(slice(i * c, min((i + 1) * c, s)) for i, c, s in zip(index, chunks, shape))
+
+
+def copy_bytes(region, source_chunks, target_chunks, itemsize):
+    """
+    Projected peak memory of one chunk copy: every source chunk the region
+    touches is decompressed whole, plus the target chunk and its compressed copy.
+    """
+    read = 1
+    for sl, c in zip(region, source_chunks):
+        first, last = sl.start // c, (sl.stop - 1) // c
+        read *= (last - first + 1) * c
+    return (read + 2 * math.prod(target_chunks)) * itemsize
+
+
+def plan_hash(source, metas, encoding):
+    """Identifies a plan: a checkpoint only counts for the same source layout and target encoding."""
+    plan = {name: [list(metas[name].shape), metas[name].dtype, list(enc['chunks']), enc['compressor'].get_config()]
+            for name, enc in sorted(encoding.items())}
+    return hashlib.sha1(json.dumps([str(source), plan]).encode()).hexdigest()
+
+
+def progress_path(target):
+    return Path(f"{target}.progress")
+
+
+def read_progress(target, token):
+    """
+    Chunks already written for this plan.
+
+    Returns:
+        set of (var, chunk key), or None when there is no checkpoint for this plan
+    """
+    path = progress_path(target)
+    if not path.exists() or not Path(target).exists():
+        return None
+    done = set()
+    with open(path) as f:
+        lines = f.read().splitlines()
+    try:
+        header = json.loads(lines[0]) if lines else {}
+    except json.JSONDecodeError:
+        return None
+    if header.get('plan') != token:
+        return None
+    for line in lines[1:]:
+        try:
+            entry = json.loads(line)
+        except json.JSONDecodeError:
+            continue  # last line cut short by a crash: that chunk is copied again
+        done.add((entry['var'], entry['chunk']))
+    return done
+
+
+def create_target(source, target, encoding, token):
+    """Empty target store with the explicit encoding, and a fresh checkpoint."""
+    target = Path(target)
+    shutil.rmtree(target, ignore_errors=True)
+    progress_path(target).unlink(missing_ok=True)
+    src = zarr.open_group(str(source), mode='r')
+    dst = zarr.open_group(str(target), mode='w')
+    dst.attrs.update(src.attrs.asdict())
+    for name, enc in encoding.items():
+        arr = src[name]
+        out = dst.create(name, shape=arr.shape, chunks=enc['chunks'], dtype=arr.dtype,
+                         compressor=enc['compressor'], filters=arr.filters, fill_value=arr.fill_value,
+                         order=arr.order)
+        out.attrs.update(arr.attrs.asdict())
+    # Header last: a crash before this point leaves no checkpoint, so the next run starts over
+    with open(progress_path(target), 'w') as f:
+        f.write(json.dumps({'plan': token, 'source': str(source)}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def plan_year(year, era5_dir, output_dir, region=REGION, time_chunk=None, restart=False):
+    """Encoding, checkpoint state and pending chunk copies of one year."""
+    source = Path(era5_dir) / SOURCE_NAME.format(year=year, region=region)
+    target = Path(output_dir) / TARGET_NAME.format(year=year, region=region)
+    metas = read_store_metadata(source)
+    if not metas:
+        raise FileNotFoundError(f"No zarr arrays in {source}")
+    encoding = target_encoding(metas, time_chunk)
+    token = plan_hash(source, metas, encoding)
+    done = None if restart else read_progress(target, token)
+
+    src = zarr.open_group(str(source), mode='r')
+    tasks, n_chunks = [], 0
+    for name, enc in encoding.items():
+        meta, chunks = metas[name], enc['chunks']
+        itemsize = np.dtype(meta.dtype).itemsize
+        grid = [range(math.ceil(s / c)) for s, c in zip(meta.shape, chunks)]
+        for index in itertools.product(*grid):
+            n_chunks += 1
+            task = ChunkTask(year, str(source), str(target), name, index,
+                             copy_bytes(chunk_slices(index, chunks, meta.shape), src[name].chunks, chunks, itemsize))
+            if done is None or (name, task.key) not in done:
+                tasks.append(task)
+    return YearPlan(year, source, target, encoding, token, n_chunks, done if done is not None else set(), tasks)
+
+
+# ============================================================
+# Chunk copy (runs in the worker processes)
+# ============================================================
+
+def copy_chunk(task):
+    """Copy one target chunk from the source and make it durable before it is checkpointed."""
+    src = zarr.open_array(task.source, path=task.name, mode='r')
+    dst = zarr.open_array(task.target, path=task.name, mode='r+')
+    region = chunk_slices(task.index, dst.chunks, dst.shape)
+    dst[region] = src[region]
+    chunk_file = Path(task.target) / task.name / task.key
+    if chunk_file.exists():  # an all-fill chunk may not be written at all
+        fd = os.open(chunk_file, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    return task
+
+
+class Checkpoint:
+    """Appends finished chunks to the `.progress` files; called from pool callbacks."""
+
+    def __init__(self, targets):
+        self._lock = threading.Lock()
+        self._files = {t: open(progress_path(t), 'a') for t in targets}
+
+    def record(self, task):
+        with self._lock:
+            f = self._files[task.target]
+            f.write(json.dumps({'var': task.name, 'chunk': task.key}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+
+# ============================================================
+# Finalize: consolidate and verify
+# ============================================================
+
+def verify_year(plan, n_samples=N_VERIFY_CHUNKS):
+    """
+    Check the target against the plan and spot-check values against the source.
+
+    Returns:
+        list of problems (empty: ok)
+    """
+    problems = []
+    if not (plan.target / '.zmetadata').exists():
+        problems.append("no consolidated metadata (.zmetadata)")
+    stored = read_store_metadata(plan.target)
+    source = read_store_metadata(plan.source)
+    src = zarr.open_group(str(plan.source), mode='r')
+    dst = zarr.open_group(str(plan.target), mode='r')
+    for name, enc in plan.encoding.items():
+        meta = stored.get(name)
+        if meta is None:
+            problems.append(f"{name}: missing")
+            continue
+        if meta.shape != source[name].shape or meta.dtype != source[name].dtype:
+            problems.append(f"{name}: shape/dtype {meta.shape} {meta.dtype} != source "
+                            f"{source[name].shape} {source[name].dtype}")
+        if meta.chunks != tuple(enc['chunks']):
+            problems.append(f"{name}: chunks {meta.chunks} != planned {tuple(enc['chunks'])}")
+        if meta.compressor != enc['compressor'].cname:
+            problems.append(f"{name}: compressor {meta.compressor} != planned {enc['compressor'].cname}")
+        grid = [math.ceil(s / c) for s, c in zip(meta.shape, meta.chunks)]
+        samples = {tuple(0 for _ in grid), tuple(n - 1 for n in grid)} if len(meta.shape) > 1 else {(0,)}
+        for index in list(samples)[:n_samples]:
+            region = chunk_slices(index, meta.chunks, meta.shape)
+            a, b = src[name][region], dst[name][region]
+            if not np.array_equal(a, b, equal_nan=np.issubdtype(a.dtype, np.inexact)):
+                problems.append(f"{name}: chunk {index} differs from the source")
+    missing = plan.n_chunks - len(read_progress(plan.target, plan.token) or ())
+    if missing:
+        problems.append(f"{missing} chunk(s) not checkpointed")
+    return problems
+
+
+def finalize_year(plan):
+    zarr.consolidate_metadata(str(plan.target))
+    return verify_year(plan)
+
+
+# ============================================================
+# Run
+# ============================================================
+
+def _interleave(plans):
+    """Round-robin over the years' pending chunks, so every year progresses concurrently."""
+    for batch in itertools.zip_longest(*(p.pending for p in plans)):
+        yield from (t for t in batch if t is not None)
+
+
+def largest_copy(plans):
+    """Projected memory of the largest pending chunk copy (must fit max_mem on its own)."""
+    return max((t.mem_bytes for p in plans for t in p.pending), default=0)
+
+
+def rechunk_years(plans, max_mem=DEFAULT_MAX_MEM, workers=None):
+    """
+    Copy every pending chunk of every year under the global memory budget,
+    then consolidate and verify each completed year.
+
+    Returns:
+        list of YearResult
+    """
+    budget = dask.utils.parse_bytes(max_mem)
+    largest = largest_copy(plans)
+    if largest > budget:
+        raise ValueError(f"One chunk copy needs {largest / MB:.0f} MB, more than max_mem={max_mem}; "
+                         f"use a smaller --time-chunk")
+    copied = {p.year: 0 for p in plans}
+    failed = {p.year: 0 for p in plans}
+    checkpoint = Checkpoint([str(p.target) for p in plans])
+
+    def on_done(future):
+        if future.exception() is not None:
+            failed[future.task.year] += 1
+            print(f"  {future.task.year} {future.task.name}[{future.task.key}] failed: {future.exception()!r}")
+            return
+        checkpoint.record(future.result())
+        copied[future.task.year] += 1
+
+    workers = workers or os.cpu_count()
+    try:
+        with MemoryBudgetExecutor(max_workers=workers, budget_bytes=budget, baseline_bytes=0) as executor:
+            for task in _interleave(plans):
+                future = executor.submit(copy_chunk, task, mem_bytes=task.mem_bytes)
+                future.task = task
+                future.add_done_callback(on_done)
+        print(f"  admission: {executor.report()}")
+    finally:
+        checkpoint.close()
+
+    results = []
+    for p in plans:
+        problems = [f"{failed[p.year]} chunk copy(ies) failed; rerun to resume"] if failed[p.year] else finalize_year(p)
+        results.append(YearResult(p.year, p.target, p.n_chunks, copied[p.year], len(p.done),
+                                  failed[p.year], problems))
+    return results
+
+
+# ============================================================
+# Display
+# ============================================================
+
+def format_plan(plan):
+    lines = [f"[{plan.year}] {plan.source}\n    -> {plan.target}",
+             f"    {plan.n_chunks:,} chunks, {len(plan.done):,} checkpointed, {len(plan.pending):,} to copy"]
+    for name, enc in plan.encoding.items():
+        lines.append(f"    {name:<40} chunks={enc['chunks']}")
+    return "\n".join(lines)
+
+
+def format_results(results, elapsed):
+    lines = [f"  {'year':<6} {'chunks':>8} {'copied':>8} {'resumed':>8} {'failed':>7}  status"]
+    for r in results:
+        status = "ok" if not r.problems else "; ".join(r.problems)
+        lines.append(f"  {r.year:<6} {r.n_chunks:>8,} {r.n_copied:>8,} {r.n_resumed:>8,} {r.n_failed:>7,}  {status}")
+    lines.append(f"  total {elapsed:.1f}s")
+    return "\n".join(lines)
+
+
+# ============================================================
+# CLI
+# ============================================================
+
+@app.command()
+def rechunk(years: Optional[List[int]] = typer.Option(None, help="Years to rechunk (default: every year in --era5-dir)"),
+            era5_dir: Path = typer.Option(ERA5_DIR, help="Directory of the source stores"),
+            output_dir: Path = typer.Option(OUTPUT_DIR, help="Directory of the rechunked stores"),
+            region: str = typer.Option(REGION, help="Region part of the store names"),
+            time_chunk: Optional[int] = typer.Option(None, help="Time steps per chunk (default: proposed, 360)"),
+            max_mem: str = typer.Option(DEFAULT_MAX_MEM, help="Memory budget for all running chunk copies"),
+            workers: Optional[int] = typer.Option(None, help="Worker processes (default: CPU count)"),
+            restart: bool = typer.Option(False, help="Ignore checkpoints and start every year over"),
+            dry_run: bool = typer.Option(False, help="Print the plan and checkpoint state only")):
+    """Rechunk every year under one memory budget, resuming from checkpoints."""
+    years = years or find_years(era5_dir, region)
+    if not years:
+        print(f"No {SOURCE_NAME.format(year='YYYY', region=region)} stores in {era5_dir}")
+        raise typer.Exit(1)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    plans = []
+    for year in years:
+        plan = plan_year(year, era5_dir, output_dir, region, time_chunk, restart)
+        print(format_plan(plan))
+        plans.append(plan)
+    if dry_run:
+        return
+    # Before anything is written: a target is only replaced if the run can go ahead
+    if largest_copy(plans) > dask.utils.parse_bytes(max_mem):
+        raise typer.BadParameter(f"one chunk copy needs {largest_copy(plans) / MB:.0f} MB; "
+                                 f"raise it or use a smaller --time-chunk", param_hint='--max-mem')
+    for plan in plans:
+        if restart or read_progress(plan.target, plan.token) is None:
+            print(f"[{plan.year}] no checkpoint for this plan: starting over")
+            create_target(plan.source, plan.target, plan.encoding, plan.token)
+
+    print(f"\nCopying {sum(len(p.pending) for p in plans):,} chunk(s) of {len(plans)} year(s), max_mem={max_mem}")
+    start = time.perf_counter()
+    results = rechunk_years(plans, max_mem, workers)
+    print(format_results(results, time.perf_counter() - start))
+    if any(r.problems for r in results):
+        raise typer.Exit(1)
+
+
+if __name__ == '__main__':
+    app()